@@ -2,9 +2,146 @@ import os
 
 class Settings:
     DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./recruitment.db")
+    # Pool kết nối CSDL (PostgreSQL; SQLite dùng pool mặc định)
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+    DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", 30))
+    DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", 1800))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
   
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+    OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo-0125")
+    # Backend LLM: "openai" (mặc định) hoặc "fake" (máy chủ giả lập cục bộ, dùng cho kiểm thử tải)
+    LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+    LLM_BASE_URL = os.getenv("LLM_BASE_URL") # Endpoint tương thích OpenAI tùy chỉnh (ghi đè mặc định của backend)
+
+    # Kết nối HTTP dùng chung cho mọi cuộc gọi LLM
+    LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 20))
+    LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", 10))
+    LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 60))
+
+    # True: lấy điểm, phản hồi và gợi ý trong MỘT cuộc gọi GPT thay vì hai cuộc gọi song song
+    CV_JD_FUSED_ANALYSIS = os.getenv("CV_JD_FUSED_ANALYSIS", "false").lower() == "true"
+
+    # Bộ nhớ đệm kết quả LLM (theo hash nội dung đầu vào + phiên bản prompt + model)
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 1024))
+    LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", 3600))
+    LLM_CACHE_PERSIST = os.getenv("LLM_CACHE_PERSIST", "true").lower() == "true"
+    LLM_CACHE_DB_TTL_SECONDS = int(os.getenv("LLM_CACHE_DB_TTL_SECONDS", 7 * 24 * 3600))
   
+    # Pool trích xuất văn bản PDF/DOCX ("process" hoặc "thread")
+    EXTRACTION_POOL = os.getenv("EXTRACTION_POOL", "process")
+    EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", min(4, os.cpu_count() or 1)))
+    EXTRACTION_MAX_PENDING = int(os.getenv("EXTRACTION_MAX_PENDING", 16))
+    EXTRACTION_TIMEOUT_SECONDS = float(os.getenv("EXTRACTION_TIMEOUT_SECONDS", 20))
+    EXTRACTION_MAX_BYTES = int(os.getenv("EXTRACTION_MAX_BYTES", 10 * 1024 * 1024))
+    EXTRACTION_MAX_PAGES = int(os.getenv("EXTRACTION_MAX_PAGES", 50))
+    EXTRACTION_MAX_DOCX_PARAGRAPHS = int(os.getenv("EXTRACTION_MAX_DOCX_PARAGRAPHS", 5000))
+
+    JD_EXTRACTION_CACHE_SIZE = int(os.getenv("JD_EXTRACTION_CACHE_SIZE", 256))
+    # True: tóm tắt mỗi JD một lần thành yêu cầu có cấu trúc và chỉ gửi bản tóm tắt trong prompt chấm điểm
+    JD_REQUIREMENTS_ENABLED = os.getenv("JD_REQUIREMENTS_ENABLED", "true").lower() == "true"
+
+    # Ngân sách token cho từng tài liệu trong prompt (vượt quá thì tóm tắt theo đoạn rồi mới chấm điểm)
+    PROMPT_CV_TOKEN_BUDGET = int(os.getenv("PROMPT_CV_TOKEN_BUDGET", 3000))
+    PROMPT_JD_TOKEN_BUDGET = int(os.getenv("PROMPT_JD_TOKEN_BUDGET", 2000))
+    PROMPT_ANSWER_TOKEN_BUDGET = int(os.getenv("PROMPT_ANSWER_TOKEN_BUDGET", 1500))
+    PROMPT_CHUNK_TOKENS = int(os.getenv("PROMPT_CHUNK_TOKENS", 2000))
+    # Thời gian tối đa tải bảng mã tiktoken lúc khởi động (lần đầu có thể phải tải file BPE qua mạng)
+    TOKENIZER_LOAD_TIMEOUT_SECONDS = float(os.getenv("TOKENIZER_LOAD_TIMEOUT_SECONDS", 10))
+
+    # Sàng lọc nhiều CV với một JD
+    BATCH_SCREENING_CONCURRENCY = int(os.getenv("BATCH_SCREENING_CONCURRENCY", 5))
+    BATCH_SCREENING_MAX_FILES = int(os.getenv("BATCH_SCREENING_MAX_FILES", 500))
+    # Tổng dung lượng CV của một lô (tính cả các file đã giải nén từ zip)
+    BATCH_SCREENING_MAX_TOTAL_BYTES = int(os.getenv("BATCH_SCREENING_MAX_TOTAL_BYTES", 200 * 1024 * 1024))
+    BATCH_INSERT_SIZE = int(os.getenv("BATCH_INSERT_SIZE", 50))
+
+    # Chỉ mục BM25 cục bộ trên CV để xếp hạng sơ bộ trước khi gọi GPT
+    CV_INDEX_DIM = int(os.getenv("CV_INDEX_DIM", 2 ** 18))
+    CV_INDEX_REBUILD_SECONDS = int(os.getenv("CV_INDEX_REBUILD_SECONDS", 600))
+
+    # Hàng đợi phân tích CV bất đồng bộ (202 Accepted + theo dõi trạng thái)
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+    JOB_QUEUE_MAX_DEPTH = int(os.getenv("JOB_QUEUE_MAX_DEPTH", 200))
+    JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", 600))
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+    JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", 5)) # Chờ trước lần thử lại: 5s, 10s, 20s...
+
+    # Cổng LLM dùng chung: giới hạn tốc độ, số cuộc gọi đồng thời thích ứng, thử lại và cầu dao
+    LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", 500))
+    LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", 160000))
+    LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", 1))
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 16))
+    LLM_TARGET_LATENCY_SECONDS = float(os.getenv("LLM_TARGET_LATENCY_SECONDS", 20))
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+    LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", 1))
+    LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", 30))
+    LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", 5))
+    LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", 30))
+
+    # Máy chủ LLM giả lập (LLM_BACKEND=fake): phản hồi tất định, độ trễ log-normal và tỷ lệ lỗi cấu hình được
+    FAKE_LLM_HOST = os.getenv("FAKE_LLM_HOST", "127.0.0.1")
+    FAKE_LLM_PORT = int(os.getenv("FAKE_LLM_PORT", 8099))
+    FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", 800)) # Độ trễ trung vị
+    FAKE_LLM_LATENCY_SIGMA = float(os.getenv("FAKE_LLM_LATENCY_SIGMA", 0.5)) # Độ phân tán (log-normal)
+    FAKE_LLM_LATENCY_PER_1K_TOKENS_MS = float(os.getenv("FAKE_LLM_LATENCY_PER_1K_TOKENS_MS", 0)) # Thêm theo độ dài prompt
+    FAKE_LLM_TOKEN_INTERVAL_MS = float(os.getenv("FAKE_LLM_TOKEN_INTERVAL_MS", 30)) # Khoảng cách giữa các token khi stream
+    FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", 0.0)) # Tỷ lệ trả về 429/500
+    FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", 42))
+
+    # Lịch sử trò chuyện phỏng vấn: "db" (bảng InterviewMessage, dùng chung giữa các worker) hoặc "memory"
+    CHAT_HISTORY_BACKEND = os.getenv("CHAT_HISTORY_BACKEND", "db")
+    CHAT_HISTORY_CACHE_SIZE = int(os.getenv("CHAT_HISTORY_CACHE_SIZE", 1000))
+    CHAT_HISTORY_CACHE_TTL_SECONDS = int(os.getenv("CHAT_HISTORY_CACHE_TTL_SECONDS", 1800))
+
+    # Giới hạn các phiên phỏng vấn đang mở trong bộ nhớ mỗi worker
+    INTERVIEW_SESSION_IDLE_TTL_SECONDS = int(os.getenv("INTERVIEW_SESSION_IDLE_TTL_SECONDS", 3600))
+    INTERVIEW_MAX_ACTIVE_SESSIONS = int(os.getenv("INTERVIEW_MAX_ACTIVE_SESSIONS", 1000))
+    INTERVIEW_SESSION_MEMORY_BUDGET_MB = float(os.getenv("INTERVIEW_SESSION_MEMORY_BUDGET_MB", 64))
+    INTERVIEW_SWEEP_INTERVAL_SECONDS = int(os.getenv("INTERVIEW_SWEEP_INTERVAL_SECONDS", 60))
+    # Phiên WebSocket: chu kỳ đọc lại Interview.end_time trong DB (phát hiện phiên kết thúc ở worker khác)
+    INTERVIEW_WS_RECHECK_SECONDS = int(os.getenv("INTERVIEW_WS_RECHECK_SECONDS", 30))
+
+    # Lịch sử đưa vào prompt phỏng vấn: "full" (toàn bộ), "window" (N lượt gần nhất)
+    # hoặc "summary" (N lượt gần nhất + bản tóm tắt các lượt cũ, cập nhật dần)
+    INTERVIEW_HISTORY_STRATEGY = os.getenv("INTERVIEW_HISTORY_STRATEGY", "summary")
+    INTERVIEW_HISTORY_WINDOW_TURNS = int(os.getenv("INTERVIEW_HISTORY_WINDOW_TURNS", 4))
+    INTERVIEW_SUMMARY_BATCH_TURNS = int(os.getenv("INTERVIEW_SUMMARY_BATCH_TURNS", 2))
+    INTERVIEW_SUMMARY_MAX_TOKENS = int(os.getenv("INTERVIEW_SUMMARY_MAX_TOKENS", 400))
+
+    # Chấm điểm cả buổi phỏng vấn: số câu trả lời được chấm đồng thời
+    INTERVIEW_SCORING_CONCURRENCY = int(os.getenv("INTERVIEW_SCORING_CONCURRENCY", 5))
+
+    # Cache người dùng đã xác thực theo user id (tránh truy vấn DB ở mỗi request cần đăng nhập)
+    AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", 10000))
+    AUTH_USER_CACHE_TTL_SECONDS = int(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", 60))
+
+    # Mã hóa mật khẩu bcrypt: độ khó (đổi giá trị thì hash cũ được mã hóa lại khi đăng nhập) và pool thread riêng
+    PASSWORD_BCRYPT_ROUNDS = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", 12))
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 64))
+
+    # Đo SQL theo request: log toàn bộ câu lệnh (SQL_ECHO), header X-DB-* trên response (chế độ debug),
+    # ngưỡng truy vấn chậm, số lần lặp một câu lệnh bị coi là N+1 và số câu lệnh chậm nhất được giữ lại
+    SQL_ECHO = os.getenv("SQL_ECHO", "false").lower() == "true"
+    SQL_DEBUG_HEADERS = os.getenv("SQL_DEBUG_HEADERS", "false").lower() == "true"
+    SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", 100))
+    SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", 5))
+    SQL_TOP_STATEMENTS = int(os.getenv("SQL_TOP_STATEMENTS", 10))
+
+    # Ngân hàng câu hỏi trong bộ nhớ theo danh mục (câu hỏi đã giải mã, payload công khai, bảng đáp án).
+    # Phiên bản trong DB được kiểm tra tối đa mỗi QUESTION_BANK_VERSION_CHECK_SECONDS giây để nhận thay đổi từ worker khác
+    QUESTION_BANK_CACHE_SIZE = int(os.getenv("QUESTION_BANK_CACHE_SIZE", 256))
+    QUESTION_BANK_CACHE_TTL_SECONDS = int(os.getenv("QUESTION_BANK_CACHE_TTL_SECONDS", 3600))
+    QUESTION_BANK_VERSION_CHECK_SECONDS = float(os.getenv("QUESTION_BANK_VERSION_CHECK_SECONDS", 5))
+
+    # Nhập/xuất ngân hàng câu hỏi hàng loạt: số dòng mỗi lô ghi/đọc và số lỗi tối đa được trả về
+    QUESTION_IMPORT_BATCH_SIZE = int(os.getenv("QUESTION_IMPORT_BATCH_SIZE", 1000))
+    QUESTION_IMPORT_MAX_ERRORS = int(os.getenv("QUESTION_IMPORT_MAX_ERRORS", 100))
+    QUESTION_EXPORT_BATCH_SIZE = int(os.getenv("QUESTION_EXPORT_BATCH_SIZE", 1000))
+
     EMAIL_HOST = os.getenv("EMAIL_HOST")        
     EMAIL_PORT = int(os.getenv("EMAIL_PORT", 587)) 
     EMAIL_USERNAME = os.getenv("EMAIL_USERNAME") 
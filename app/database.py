@@ -1,17 +1,59 @@
 import os
+from sqlalchemy import event
 from sqlmodel import create_engine, SQLModel, Session
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 from dotenv import load_dotenv
+from app.config import settings
+from app.services.sql_metrics import instrument_engine
 
-load_dotenv() 
+load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./recruitment.db")
 
-connection_string = DATABASE_URL
-if connection_string.startswith("postgresql://"):
-    connection_string = connection_string.replace("postgresql://", "postgresql+asyncpg://")
-elif connection_string.startswith("postgres://"): # Đề phòng nếu Render dùng postgres://
-    connection_string = connection_string.replace("postgres://", "postgresql+asyncpg://")
-engine = create_engine(connection_string, echo=True)
+def _with_driver(url: str, async_driver: bool) -> str:
+    """Chọn driver theo URL: asyncpg/aiosqlite cho engine bất đồng bộ, psycopg2/sqlite3 cho engine đồng bộ."""
+    if url.startswith("postgres://"): # Đề phòng nếu Render dùng postgres://
+        url = url.replace("postgres://", "postgresql://", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://" if async_driver else "postgresql+psycopg2://", 1)
+    if url.startswith("sqlite://") and async_driver:
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return url
+
+def _pool_options(url: str) -> dict:
+    """Cấu hình pool kết nối cho máy chủ CSDL; SQLite (chạy cục bộ) dùng pool mặc định của SQLAlchemy."""
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS, # Tránh dùng kết nối đã bị máy chủ/proxy đóng do để lâu
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+# Engine đồng bộ: tạo bảng, migration và các tác vụ nền chạy trong thread (asyncio.to_thread)
+engine = create_engine(_with_driver(DATABASE_URL, async_driver=False), echo=settings.SQL_ECHO, **_pool_options(DATABASE_URL))
+# Engine bất đồng bộ: dùng cho các request API, chờ CSDL không chặn event loop
+async_engine = create_async_engine(_with_driver(DATABASE_URL, async_driver=True), echo=settings.SQL_ECHO, **_pool_options(DATABASE_URL))
+
+def _enable_sqlite_wal(dbapi_connection, connection_record):
+    """
+    SQLite: chế độ WAL để người đọc không bị chặn bởi người ghi (và ngược lại). Engine đồng bộ (thread nền)
+    và engine bất đồng bộ (request) dùng chung một file nên nếu không có WAL, một giao dịch ghi dở dang có thể chặn cả hai phía.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
+
+if DATABASE_URL.startswith("sqlite"):
+    event.listen(engine, "connect", _enable_sqlite_wal)
+    event.listen(async_engine.sync_engine, "connect", _enable_sqlite_wal)
+
+# Đo số truy vấn/thời gian CSDL theo request (thay cho echo=True: bật lại log SQL đầy đủ bằng SQL_ECHO)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
 
 def create_db_and_tables():
     print("Running startup event: Creating database and tables if they don't exist.")
@@ -20,8 +62,20 @@ def create_db_and_tables():
         print("Database and tables checked/created successfully.")
     except Exception as e:
         print(f"Error during database startup: {e}")
-        raise 
+        raise
 
 def get_session():
     with Session(engine) as session:
-            yield session
\ No newline at end of file
+            yield session
+
+async def get_async_session():
+    """
+    Phiên CSDL bất đồng bộ cho mỗi request. expire_on_commit=False: đối tượng vẫn đọc được sau commit
+    mà không phải tải lại (tải lười không dùng được với AsyncSession).
+    """
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+async def close_async_engine():
+    """Đóng pool kết nối của engine bất đồng bộ khi ứng dụng dừng."""
+    await async_engine.dispose()
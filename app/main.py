@@ -7,8 +7,16 @@ from fastapi.templating import Jinja2Templates
 from dotenv import load_dotenv 
 import os 
 
-from app.database import create_db_and_tables
-from app.routers import candidates, interview, tests, auth 
+from app.database import create_db_and_tables, close_async_engine
+from app.routers import candidates, interview, tests, auth, metrics
+from app.migrations import run_migrations
+from app.services.llm_client import close_llm_client
+from app.services.cv_jd_processor import shutdown_extraction_pool
+from app.services.job_queue import get_job_queue
+from app.services.interview_sessions import get_session_manager
+from app.services.password_hashing import shutdown_password_hasher
+from app.services.sql_metrics import SQLMetricsMiddleware
+from app.services.prompt_builder import load_tokenizer
 
 load_dotenv() 
 
@@ -26,12 +34,35 @@ app.include_router(auth.router, prefix="/api/auth", tags=["Xác thực"])
 app.include_router(candidates.router, prefix="/api/candidates", tags=["Ứng viên & So khớp CV/JD"]) # API quản lý ứng viên, tải CV/JD
 app.include_router(interview.router, prefix="/api/interview", tags=["Phỏng vấn AI"]) # API cho chatbot phỏng vấn
 app.include_router(tests.router, prefix="/api/tests", tags=["Kiểm tra kỹ năng"]) # API cho kiểm tra kỹ năng
+app.include_router(metrics.router, prefix="/api/metrics", tags=["Giám sát hiệu năng"]) # API thống kê cache, hiệu năng
 
 
 @app.on_event("startup")
 def on_startup():
     """Hàm này sẽ chạy khi ứng dụng khởi động."""
     create_db_and_tables() # Đảm bảo các bảng cơ sở dữ liệu được tạo
+    run_migrations() # Chuyển đổi dữ liệu cũ sang cấu trúc bảng mới (nếu cần)
+
+@app.on_event("startup")
+async def start_background_workers():
+    """Khởi động các worker chạy nền (sau khi bảng đã được tạo)."""
+    await get_job_queue().start() # Worker phân tích CV/JD, tiếp tục các job dở dang
+    get_session_manager().start() # Quét và kết thúc các phiên phỏng vấn bỏ dở
+
+@app.on_event("startup")
+async def load_prompt_tokenizer():
+    """Nạp bảng mã tiktoken một lần (có giới hạn thời gian) để việc đếm token không phải tải bảng mã giữa request."""
+    await load_tokenizer()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    """Hàm này sẽ chạy khi ứng dụng tắt."""
+    await get_job_queue().stop()
+    await get_session_manager().stop()
+    await close_llm_client() # Đóng pool kết nối HTTP dùng chung tới OpenAI
+    shutdown_extraction_pool() # Dừng các tiến trình trích xuất văn bản
+    shutdown_password_hasher() # Dừng pool mã hóa mật khẩu
+    await close_async_engine() # Đóng pool kết nối CSDL bất đồng bộ
 
 @app.get("/", response_class=HTMLResponse, include_in_schema=False)
 async def read_root():
@@ -59,6 +90,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Đo số truy vấn/thời gian CSDL của mỗi request (xem /api/metrics/sql, header X-DB-* khi bật SQL_DEBUG_HEADERS)
+app.add_middleware(SQLMetricsMiddleware)
 # ----------------------------------------
 
 # --- THÊM ĐOẠN CODE NÀY ĐỂ TẠO BẢNG KHI ỨNG DỤNG KHỞI ĐỘNG ---
@@ -0,0 +1,121 @@
+import json
+from collections import defaultdict
+
+from sqlalchemy import inspect, text
+from sqlmodel import Session, select
+from app.database import engine
+from app.models import Candidate, JobDescription, Question
+from app.services.jd_store import jd_content_hash
+from app.services.question_import import question_content_hash
+
+def _add_missing_column(table: str, column: str, ddl: str):
+    """Thêm cột vào bảng đã tồn tại (create_all không tự thêm cột mới vào bảng cũ)."""
+    columns = {c["name"] for c in inspect(engine).get_columns(table)}
+    if column not in columns:
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+        print(f"Migration: đã thêm cột {table}.{column}.")
+
+def migrate_jd_texts(batch_size: int = 500):
+    """
+    Chuyển các bản sao `candidate.jd_text` sang bảng JobDescription:
+    mỗi nội dung JD (theo hash) chỉ được lưu một lần, ứng viên trỏ tới JD qua `jd_id`
+    và cột `jd_text` cũ được xóa trắng. Chạy lại nhiều lần vẫn an toàn.
+    """
+    _add_missing_column("candidate", "jd_id", "INTEGER REFERENCES jobdescription(id)")
+
+    migrated = 0
+    with Session(engine) as session:
+        while True:
+            candidates = session.exec(
+                select(Candidate).where(Candidate.jd_text != None).limit(batch_size)
+            ).all()
+            if not candidates:
+                break
+
+            by_hash = defaultdict(list)
+            for candidate in candidates:
+                by_hash[jd_content_hash(candidate.jd_text)].append(candidate)
+            existing = {
+                jd.content_hash: jd for jd in session.exec(
+                    select(JobDescription).where(JobDescription.content_hash.in_(by_hash.keys()))
+                ).all()
+            }
+            for content_hash, group in by_hash.items():
+                jd = existing.get(content_hash)
+                if jd is None:
+                    jd = JobDescription(content_hash=content_hash, title=group[0].applied_position, text=group[0].jd_text)
+                    session.add(jd)
+                    session.flush()
+                    existing[content_hash] = jd
+                for candidate in group:
+                    if candidate.jd_id is None:
+                        candidate.jd_id = jd.id
+                    candidate.jd_text = None
+                    session.add(candidate)
+            session.commit()
+            migrated += len(candidates)
+    if migrated:
+        print(f"Migration: đã chuyển JD của {migrated} ứng viên sang bảng JobDescription.")
+
+def backfill_question_hashes(batch_size: int = 1000):
+    """
+    Tính content_hash cho các câu hỏi tạo trước khi có cột này và chuyển index của cột sang unique (mỗi nội dung
+    câu hỏi chỉ có một bản ghi mang hash). Câu trùng nội dung đã có từ trước vẫn được giữ (bài kiểm tra cũ còn
+    trỏ tới) nhưng không mang hash: hash thuộc về câu có id nhỏ nhất. Chỉ chạy một lần, khi index chưa unique.
+    """
+    _add_missing_column("question", "content_hash", "VARCHAR")
+    index = next((i for i in inspect(engine).get_indexes("question") if i["name"] == "ix_question_content_hash"), None)
+    if index is not None and index["unique"]:
+        return
+
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX IF EXISTS ix_question_content_hash"))
+        deduplicated = conn.execute(text(
+            "UPDATE question SET content_hash = NULL WHERE content_hash IS NOT NULL AND id NOT IN "
+            "(SELECT MIN(id) FROM question WHERE content_hash IS NOT NULL GROUP BY content_hash)"
+        )).rowcount
+
+    updated, last_id = 0, 0
+    with Session(engine) as session:
+        while True:
+            questions = session.exec(
+                select(Question).where(Question.content_hash == None, Question.id > last_id).order_by(Question.id).limit(batch_size)
+            ).all()
+            if not questions:
+                break
+            last_id = questions[-1].id
+            hashes = {
+                question.id: question_content_hash(
+                    question.skill_category, question.question_text, json.loads(question.options), question.correct_answer
+                )
+                for question in questions
+            }
+            taken = set(session.exec(select(Question.content_hash).where(Question.content_hash.in_(set(hashes.values())))).all())
+            for question in questions:
+                if hashes[question.id] in taken: # Trùng nội dung với câu đã mang hash
+                    deduplicated += 1
+                    continue
+                taken.add(hashes[question.id])
+                question.content_hash = hashes[question.id]
+                session.add(question)
+                updated += 1
+            session.commit()
+
+    with engine.begin() as conn:
+        conn.execute(text("CREATE UNIQUE INDEX ix_question_content_hash ON question (content_hash)"))
+    if updated:
+        print(f"Migration: đã tính content_hash cho {updated} câu hỏi.")
+    if deduplicated:
+        print(f"Migration: {deduplicated} câu hỏi trùng nội dung được giữ lại nhưng không mang content_hash.")
+
+def run_migrations():
+    """Chạy các bước chuyển đổi dữ liệu sau khi tạo bảng."""
+    _add_missing_column("jobdescription", "requirements", "TEXT")
+    _add_missing_column("interview", "history_summary", "TEXT")
+    _add_missing_column("interview", "summarized_messages", "INTEGER NOT NULL DEFAULT 0")
+    _add_missing_column("skilltestresult", "skill_category", "VARCHAR")
+    _add_missing_column("skilltestresult", "question_ids", "TEXT")
+    _add_missing_column("question", "difficulty", "VARCHAR")
+    migrate_jd_texts()
+    backfill_question_hashes()
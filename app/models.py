@@ -1,4 +1,3 @@
-from __future__ import annotations
 from sqlmodel import Field, SQLModel, Relationship
 from typing import Optional, List
 from datetime import datetime
@@ -13,6 +12,17 @@ class User(SQLModel, table=True):
 
     candidates: List["Candidate"] = Relationship(back_populates="user")
 
+class JobDescription(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    content_hash: str = Field(unique=True, index=True)
+    title: Optional[str] = None
+    text: str
+    requirements: Optional[str] = None # Yêu cầu đã trích xuất từ JD (chuỗi JSON), tính một lần cho mỗi JD
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+    candidates: List["Candidate"] = Relationship(back_populates="job_description")
+    match_results: List["MatchResult"] = Relationship(back_populates="job_description")
+
 class Candidate(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: Optional[int] = Field(default=None, foreign_key="user.id")
@@ -23,7 +33,9 @@ class Candidate(SQLModel, table=True):
     phone_number: Optional[str] = None
     applied_position: Optional[str] = None
     cv_text: Optional[str] = None
-    jd_text: Optional[str] = None
+    jd_text: Optional[str] = None # Cột cũ, chỉ còn để chuyển dữ liệu sang JobDescription
+    jd_id: Optional[int] = Field(default=None, foreign_key="jobdescription.id", index=True)
+    job_description: Optional[JobDescription] = Relationship(back_populates="candidates")
 
     interviews: List["Interview"] = Relationship(back_populates="candidate")
     skill_tests: List["SkillTestResult"] = Relationship(back_populates="candidate")
@@ -34,12 +46,26 @@ class MatchResult(SQLModel, table=True):
     candidate_id: int = Field(foreign_key="candidate.id")
     candidate: Optional[Candidate] = Relationship(back_populates="match_results")
 
-    jd_id: Optional[int] = None
+    jd_id: Optional[int] = Field(default=None, foreign_key="jobdescription.id", index=True)
+    job_description: Optional[JobDescription] = Relationship(back_populates="match_results")
     match_score: int
     feedback: str
     suggestions: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+class AnalysisJob(SQLModel, table=True):
+    id: str = Field(primary_key=True)
+    status: str = Field(default="pending", index=True) # pending, running, succeeded, failed
+    stage: Optional[str] = None # Bước đang xử lý, để báo tiến độ
+    candidate_id: int = Field(foreign_key="candidate.id")
+    jd_id: int = Field(foreign_key="jobdescription.id")
+    match_result_id: Optional[int] = Field(default=None, foreign_key="matchresult.id")
+    error: Optional[str] = None
+    attempts: int = Field(default=0)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
 class Interview(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     candidate_id: int = Field(foreign_key="candidate.id")
@@ -50,6 +76,16 @@ class Interview(SQLModel, table=True):
     end_time: Optional[datetime] = None
     overall_score: Optional[int] = None
     overall_feedback: Optional[str] = None
+    history_summary: Optional[str] = None # Tóm tắt các lượt cũ, dùng thay cho lịch sử đầy đủ trong prompt
+    summarized_messages: int = Field(default=0) # Số tin nhắn đầu tiên đã được gộp vào history_summary
+
+class InterviewMessage(SQLModel, table=True):
+    """Một tin nhắn trong cuộc trò chuyện phỏng vấn (chỉ ghi thêm), thứ tự theo id."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    session_id: str = Field(foreign_key="interview.session_id", index=True)
+    role: str # "human", "ai" hoặc "system"
+    content: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class Question(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -57,6 +93,8 @@ class Question(SQLModel, table=True):
     options: str
     correct_answer: str
     skill_category: str
+    difficulty: Optional[str] = None # Độ khó (ví dụ easy/medium/hard), dùng để chọn câu hỏi phân tầng
+    content_hash: Optional[str] = Field(default=None, unique=True, index=True) # Hash nội dung: mỗi câu hỏi chỉ lưu một lần
 
     test_results: List["SkillTestResultItem"] = Relationship(back_populates="question")
 
@@ -64,6 +102,8 @@ class SkillTestResult(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     candidate_id: int = Field(foreign_key="candidate.id")
     candidate: Optional[Candidate] = Relationship(back_populates="skill_tests")
+    skill_category: Optional[str] = None # Danh mục câu hỏi của bài kiểm tra (để chấm bằng bảng đáp án của danh mục)
+    question_ids: Optional[str] = None # Chuỗi JSON: id các câu hỏi đã giao (để không lặp lại câu ứng viên đã gặp)
 
     start_time: datetime = Field(default_factory=datetime.utcnow)
     end_time: Optional[datetime] = None
@@ -83,6 +123,18 @@ class SkillTestResultItem(SQLModel, table=True):
     selected_answer: Optional[str]
     is_correct: Optional[bool]
 
+class QuestionBankVersion(SQLModel, table=True):
+    # Tăng mỗi khi câu hỏi của danh mục thay đổi: các worker so sánh để biết cache ngân hàng câu hỏi đã cũ
+    skill_category: str = Field(primary_key=True)
+    version: int = Field(default=0)
+
+class LLMCacheEntry(SQLModel, table=True):
+    key: str = Field(primary_key=True)
+    namespace: str = Field(index=True)
+    model: str
+    value: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
 class MatchResultBase(SQLModel):
     match_score: int
     feedback: str
@@ -94,10 +146,3 @@ class MatchResultCreate(MatchResultBase):
 
 class MatchResultPublic(MatchResultBase):
     id: int
-
-class User(BaseModel):
-    email: str
-
-
-user = User(email="test@example.com")
-print(user.email)
\ No newline at end of file
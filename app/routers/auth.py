@@ -3,14 +3,17 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm # H
 from datetime import datetime, timedelta # Để làm việc với thời gian hết hạn của token
 from typing import Annotated # Hỗ trợ kiểu dữ liệu mới trong Python
 
-from passlib.context import CryptContext # Để mã hóa và kiểm tra mật khẩu
 from jose import JWTError, jwt # Để tạo và giải mã JWT (JSON Web Token)
 
-from sqlmodel import Session, select # Các công cụ của SQLModel
-from app.database import get_session # Lấy phiên làm việc với DB
+from sqlalchemy import event
+from sqlmodel import select # Các công cụ của SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession # Phiên DB bất đồng bộ
+from app.database import get_async_session # Lấy phiên làm việc với DB
 from app.models import User # Model User
 from app.schemas import UserCreate, UserPublic, Token, TokenData # Schemas cho User và Token
 from app.config import settings # Nhập cài đặt (có thể thêm SECRET_KEY vào config sau)
+from app.services.llm_cache import LRUTTLCache # Bộ nhớ đệm LRU + TTL dùng chung
+from app.services.password_hashing import pwd_context, get_password_hasher, PasswordHasherBusyError # bcrypt chạy trong pool thread riêng
 
 router = APIRouter()
 
@@ -21,17 +24,15 @@ SECRET_KEY = "day_la_mot_khoa_bi_mat_rat_manh_me_va_dai_de_bao_mat_token_cua_ban
 ALGORITHM = "HS256" # Thuật toán mã hóa JWT
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 # Thời gian hết hạn của token (tính bằng phút)
 
-# Đối tượng để mã hóa/giải mã mật khẩu
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # Đối tượng để FastAPI hiểu cách lấy token từ Header (Authorization: Bearer <token>)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
 
 def verify_password(plain_password, hashed_password):
-    """Kiểm tra mật khẩu người dùng nhập vào có khớp với mật khẩu đã mã hóa không."""
+    """Kiểm tra mật khẩu người dùng nhập vào có khớp với mật khẩu đã mã hóa không (đồng bộ; trong handler async dùng get_password_hasher())."""
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    """Mã hóa mật khẩu."""
+    """Mã hóa mật khẩu (đồng bộ; trong handler async dùng get_password_hasher())."""
     return pwd_context.hash(password)
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
@@ -45,10 +46,29 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM) # Mã hóa token
     return encoded_jwt
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: Session = Depends(get_session)):
+# Cache người dùng theo user id: request có token hợp lệ không cần truy vấn DB nếu người dùng đã có trong cache.
+# Bản ghi bị xóa khỏi cache khi User thay đổi trong tiến trình này; TTL giới hạn độ trễ khi thay đổi ở worker khác.
+_user_cache = LRUTTLCache(settings.AUTH_USER_CACHE_SIZE, settings.AUTH_USER_CACHE_TTL_SECONDS)
+
+def invalidate_cached_user(user_id: int):
+    """Xóa người dùng khỏi cache xác thực (gọi khi thông tin người dùng thay đổi)."""
+    _user_cache.pop(user_id)
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user_on_change(mapper, connection, target: User):
+    invalidate_cached_user(target.id)
+
+def _cacheable_user(user: User) -> User:
+    """Bản sao không gắn với phiên DB, để dùng lại an toàn sau khi phiên của request hiện tại đã đóng."""
+    return User(**user.model_dump())
+
+async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: AsyncSession = Depends(get_async_session)):
     """
     Hàm này được dùng làm Dependency (phụ thuộc) cho các API cần xác thực.
     Nó giải mã token, kiểm tra tính hợp lệ và trả về thông tin người dùng hiện tại.
+    Token mới mang user id ("uid"): người dùng được lấy từ cache theo id, chỉ truy vấn DB khi cache trượt.
+    Token cũ chỉ có email vẫn được chấp nhận (tra cứu theo email như trước).
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -60,46 +80,84 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: Se
         email: str = payload.get("sub") # Lấy email từ payload
         if email is None:
             raise credentials_exception
-        token_data = TokenData(email=email)
+        token_data = TokenData(email=email, user_id=payload.get("uid"))
     except JWTError: # Nếu token không hợp lệ
         raise credentials_exception
-    user = db.exec(select(User).where(User.email == token_data.email)).first() # Tìm người dùng trong DB
+
+    if token_data.user_id is not None:
+        user = _user_cache.get(token_data.user_id)
+        if user is None:
+            user = await db.get(User, token_data.user_id)
+            if user is not None:
+                user = _cacheable_user(user)
+                _user_cache.set(user.id, user)
+        if user is None or user.email != token_data.email: # Người dùng đã bị xóa hoặc đổi email
+            raise credentials_exception
+        return user
+
+    user = (await db.exec(select(User).where(User.email == token_data.email))).first() # Tìm người dùng trong DB
     if user is None:
         raise credentials_exception
     return user
 
+def create_user_access_token(user: User) -> str:
+    """Access token cho một người dùng, mang các thông tin ổn định: email (sub), user id và quyền quản trị."""
+    return create_access_token(
+        data={"sub": user.email, "uid": user.id, "adm": user.is_admin},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    )
+
+def _password_hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Hệ thống đang quá tải, vui lòng thử lại sau.",
+        headers={"Retry-After": "1"},
+    )
+
 # --- API Endpoints cho Xác thực ---
 @router.post("/register", response_model=UserPublic)
-async def register_user(user: UserCreate, db: Session = Depends(get_session)):
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_async_session)):
     """API để đăng ký người dùng mới (ví dụ: nhà tuyển dụng)."""
-    existing_user = db.exec(select(User).where(User.email == user.email)).first()
+    existing_user = (await db.exec(select(User).where(User.email == user.email))).first()
     if existing_user:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email đã được đăng ký.")
-    
-    hashed_password = get_password_hash(user.password) # Mã hóa mật khẩu
+    await db.close() # Trả kết nối DB về pool trong lúc chờ bcrypt, để đăng nhập hàng loạt không giữ hết pool kết nối
+
+    try:
+        hashed_password = await get_password_hasher().hash(user.password) # Mã hóa mật khẩu (không chặn event loop)
+    except PasswordHasherBusyError:
+        raise _password_hasher_busy()
     new_user = User(email=user.email, hashed_password=hashed_password)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user) # Cập nhật đối tượng user với ID từ DB
+    await db.commit()
+    await db.refresh(new_user) # Cập nhật đối tượng user với ID từ DB
     return new_user
 
 @router.post("/token", response_model=Token)
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()], # Dữ liệu đăng nhập (username, password)
-    db: Session = Depends(get_session)
+    db: AsyncSession = Depends(get_async_session)
 ):
     """API để đăng nhập và lấy Access Token."""
-    user = db.exec(select(User).where(User.email == form_data.username)).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    user = (await db.exec(select(User).where(User.email == form_data.username))).first()
+    await db.close() # Trả kết nối DB về pool trong lúc chờ bcrypt (user vẫn giữ các thuộc tính đã tải)
+    valid = False
+    if user:
+        try:
+            valid, new_hash = await get_password_hasher().verify_and_update(form_data.password, user.hashed_password)
+        except PasswordHasherBusyError:
+            raise _password_hasher_busy()
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Sai email hoặc mật khẩu.",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
-    )
+    if new_hash is not None: # Hash cũ dùng độ khó khác cấu hình hiện tại: lưu lại hash mới
+        user.hashed_password = new_hash
+        db.add(user)
+        await db.commit()
+    access_token = create_user_access_token(user)
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/users/me/", response_model=UserPublic)
@@ -1,85 +1,103 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status # Các công cụ FastAPI
-from sqlmodel import Session, select # SQLModel để làm việc với DB
+from fastapi.responses import StreamingResponse # Trả kết quả dần dần (NDJSON/SSE)
+from sqlmodel import select # SQLModel để làm việc với DB
+from sqlmodel.ext.asyncio.session import AsyncSession # Phiên DB bất đồng bộ
 from sqlalchemy.orm import selectinload # Để tải các mối quan hệ (ví dụ: lấy ứng viên kèm theo kết quả phỏng vấn)
 from typing import List, Optional # Kiểu dữ liệu Python
 import json # Để xử lý JSON
+import asyncio # Để chấm điểm nhiều ứng viên đồng thời
+import zipfile # Để nhận CV dạng file nén
 from app.schemas import MatchResultPublic
-from app.database import get_session # Lấy phiên DB
-from app.models import Candidate, MatchResult, Interview, SkillTestResult # Các Model dữ liệu
-from app.schemas import CandidateCreate, CandidatePublic, CVJDUploadResponse, MatchResultPublic, SendOfferRequest # Các Schemas
-from app.services.cv_jd_processor import process_uploaded_file, get_cv_jd_matching_score_and_feedback, get_cv_improvement_suggestions # Dịch vụ xử lý CV/JD
+from app.database import get_async_session # Lấy phiên DB (bất đồng bộ)
+from app.config import settings # Cấu hình ứng dụng
+from app.models import Candidate, MatchResult, Interview, SkillTestResult, JobDescription, AnalysisJob # Các Model dữ liệu
+from app.schemas import CandidateCreate, CandidatePublic, CVJDUploadResponse, MatchResultPublic, SendOfferRequest, CandidateRankItem, CandidateRankResponse, CandidateMatchPublic, AnalysisJobPublic # Các Schemas
+from app.services.cv_jd_processor import process_uploaded_file, analyze_cv_jd # Dịch vụ xử lý CV/JD
+from app.services.jd_store import extract_jd_text, get_or_create_jd, get_jd_requirements # Lưu JD một lần theo hash nội dung
+from app.services.cv_index import get_cv_index, index_candidate_cv # Chỉ mục BM25 cục bộ trên CV
+from app.services.job_queue import get_job_queue, QueueFullError # Hàng đợi phân tích chạy nền
+from app.services.batch_screening import expand_cv_files, screen_cvs, BatchTooLargeError # Sàng lọc nhiều CV cùng lúc
 from app.services.email_service import send_offer_email # Dịch vụ gửi email
 from app.routers.auth import get_current_user # Dependency để bảo vệ các API (cần đăng nhập)
 
 router = APIRouter()
 
+# Các mối quan hệ có trong CandidatePublic: phải được tải sẵn vì AsyncSession không tải lười
+CANDIDATE_RELATIONSHIPS = ("match_results", "interviews", "skill_tests")
+
+def _candidate_relationship_loaders():
+    return [selectinload(getattr(Candidate, name)) for name in CANDIDATE_RELATIONSHIPS]
+
+def _decode_suggestions(candidate: Candidate):
+    """Chuyển đổi chuỗi JSON của suggestions thành List[str] để phù hợp với schema"""
+    for mr in candidate.match_results or []:
+        mr.suggestions = json.loads(mr.suggestions) if mr.suggestions else []
+
 @router.post("/", response_model=CandidatePublic, status_code=status.HTTP_201_CREATED)
 async def create_candidate(
     candidate: CandidateCreate, # Dữ liệu ứng viên từ yêu cầu
-    db: Session = Depends(get_session), # Phiên DB
+    db: AsyncSession = Depends(get_async_session), # Phiên DB
     current_user: dict = Depends(get_current_user) # Yêu cầu người dùng đã đăng nhập
 ):
     """Tạo một hồ sơ ứng viên mới."""
     db_candidate = Candidate.model_validate(candidate) # Chuyển schema thành model DB
     db.add(db_candidate) # Thêm vào DB
-    db.commit() # Lưu thay đổi
-    db.refresh(db_candidate) # Cập nhật đối tượng Python với dữ liệu mới từ DB (ví dụ: ID)
+    await db.commit() # Lưu thay đổi
+    # Cập nhật đối tượng Python với dữ liệu mới từ DB (ví dụ: ID) và các mối quan hệ cần cho phản hồi
+    await db.refresh(db_candidate, attribute_names=["id", *CANDIDATE_RELATIONSHIPS])
     return db_candidate
 
 @router.get("/", response_model=List[CandidatePublic])
 async def read_candidates(
     offset: int = 0, # Bỏ qua bao nhiêu bản ghi
     limit: int = 100, # Giới hạn số bản ghi trả về
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     current_user: dict = Depends(get_current_user)
 ):
     """Đọc danh sách các ứng viên."""
-    candidates = db.exec(select(Candidate).offset(offset).limit(limit)).all() # Truy vấn DB
+    candidates = (await db.exec( # Truy vấn DB, tải sẵn các mối quan hệ (không thể tải lười với AsyncSession)
+        select(Candidate).order_by(Candidate.id).offset(offset).limit(limit).options(*_candidate_relationship_loaders())
+    )).all()
+    for candidate in candidates:
+        _decode_suggestions(candidate)
     return candidates
 
 @router.get("/{candidate_id}", response_model=CandidatePublic)
 async def read_candidate(
     candidate_id: int, # ID của ứng viên muốn đọc
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     current_user: dict = Depends(get_current_user)
 ):
     """Đọc thông tin chi tiết của một ứng viên cùng với các kết quả liên quan."""
-    candidate = db.exec(
+    candidate = (await db.exec(
         select(Candidate)
         .where(Candidate.id == candidate_id)
-        .options( # Tải các mối quan hệ (MatchResult, Interview, SkillTestResult) cùng lúc
-            selectinload(Candidate.match_results),
-            selectinload(Candidate.interviews),
-            selectinload(Candidate.skill_tests)
-        )
-    ).first() # Lấy bản ghi đầu tiên (hoặc None nếu không tìm thấy)
+        .options(*_candidate_relationship_loaders()) # Tải các mối quan hệ (MatchResult, Interview, SkillTestResult) cùng lúc
+    )).first() # Lấy bản ghi đầu tiên (hoặc None nếu không tìm thấy)
     
     if not candidate:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Không tìm thấy ứng viên.")
     
-    # Chuyển đổi chuỗi JSON của suggestions thành List[str] để phù hợp với schema
-    if candidate.match_results:
-        for mr in candidate.match_results:
-            mr.suggestions = json.loads(mr.suggestions) if mr.suggestions else []
-            
+    _decode_suggestions(candidate)
     return candidate
 
-@router.post("/upload-cv-jd", response_model=CVJDUploadResponse)
-async def upload_cv_jd(
-    full_name: str = Form(...), # Dữ liệu từ form
-    email: str = Form(...),
-    applied_position: str = Form(...),
-    cv_file: UploadFile = File(...), # File CV được tải lên
-    jd_file: UploadFile = File(...), # File JD được tải lên
-    db: Session = Depends(get_session),
-    current_user: dict = Depends(get_current_user)
+async def _store_cv_and_jd(
+    db: AsyncSession,
+    full_name: str,
+    email: str,
+    applied_position: str,
+    cv_file: UploadFile,
+    jd_file: UploadFile,
 ):
-    """Tải lên CV và JD, sau đó xử lý và phân tích bằng AI."""
+    """
+    Trích xuất văn bản CV/JD, lưu JD (một lần) và cập nhật hồ sơ ứng viên. Trả về (candidate, jd, cv_text, jd_text).
+    Phiên DB được đóng trước khi trả về: nơi gọi sẽ gọi GPT mà không giữ kết nối trong pool.
+    """
     cv_content = await cv_file.read() # Đọc nội dung file CV
     jd_content = await jd_file.read() # Đọc nội dung file JD
 
     cv_text = await process_uploaded_file(cv_content, cv_file.filename) # Trích xuất văn bản từ CV
-    jd_text = await process_uploaded_file(jd_content, jd_file.filename) # Trích xuất văn bản từ JD
+    jd_text = await extract_jd_text(jd_content, jd_file.filename) # Trích xuất văn bản từ JD (có cache)
 
     if not cv_text:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Không thể trích xuất văn bản từ file CV. Vui lòng kiểm tra định dạng (PDF/DOCX) hoặc nội dung.")
@@ -87,37 +105,55 @@ async def upload_cv_jd(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Không thể trích xuất văn bản từ file JD. Vui lòng kiểm tra định dạng (PDF/DOCX) hoặc nội dung.")
 
     # Tìm ứng viên theo email hoặc tạo mới nếu chưa có
-    candidate = db.exec(select(Candidate).where(Candidate.email == email)).first()
+    candidate = (await db.exec(select(Candidate).where(Candidate.email == email))).first()
     if not candidate:
         candidate = Candidate(full_name=full_name, email=email, applied_position=applied_position)
     
-    # Cập nhật thông tin CV và JD cho ứng viên
+    # Cập nhật thông tin CV và JD cho ứng viên (JD được lưu một lần trong bảng JobDescription)
+    jd = await db.run_sync(get_or_create_jd, jd_text, applied_position)
     candidate.cv_text = cv_text
-    candidate.jd_text = jd_text
+    candidate.jd_id = jd.id
     db.add(candidate)
-    db.commit()
-    db.refresh(candidate)
+    await db.commit()
+    await db.refresh(candidate)
+    await db.close() # Trả kết nối về pool; candidate/jd vẫn đọc được (expire_on_commit=False), lần ghi sau mở kết nối mới
+    index_candidate_cv(candidate.id, cv_text) # Cập nhật chỉ mục xếp hạng sơ bộ
+    return candidate, jd, cv_text, jd_text
+
+@router.post("/upload-cv-jd", response_model=CVJDUploadResponse)
+async def upload_cv_jd(
+    full_name: str = Form(...), # Dữ liệu từ form
+    email: str = Form(...),
+    applied_position: str = Form(...),
+    cv_file: UploadFile = File(...), # File CV được tải lên
+    jd_file: UploadFile = File(...), # File JD được tải lên
+    db: AsyncSession = Depends(get_async_session),
+    current_user: dict = Depends(get_current_user)
+):
+    """Tải lên CV và JD, sau đó xử lý và phân tích bằng AI."""
+    candidate, jd, cv_text, jd_text = await _store_cv_and_jd(db, full_name, email, applied_position, cv_file, jd_file)
 
-    # Xử lý với GPT để lấy điểm phù hợp và gợi ý
-    matching_result_dict = await get_cv_jd_matching_score_and_feedback(cv_text, jd_text)
-    suggestions_dict = await get_cv_improvement_suggestions(cv_text, jd_text)
+    # Xử lý với GPT để lấy điểm phù hợp và gợi ý (hai cuộc gọi chạy song song, hoặc một cuộc gọi gộp)
+    # Prompt chỉ chứa bản tóm tắt yêu cầu của JD (trích xuất một lần cho mỗi JD)
+    jd_requirements = await get_jd_requirements(jd)
+    analysis = await analyze_cv_jd(cv_text, jd_text, jd_requirements=jd_requirements)
 
     # Lấy dữ liệu từ kết quả GPT
-    match_score = matching_result_dict.get("score", 0)
-    feedback = matching_result_dict.get("feedback", "Không có phản hồi từ AI.")
-    suggestions_list = suggestions_dict.get("suggestions", [])
+    match_score = analysis.get("score", 0)
+    feedback = analysis.get("feedback", "Không có phản hồi từ AI.")
+    suggestions_list = analysis.get("suggestions", [])
     
-    # Lưu kết quả so khớp vào cơ sở dữ liệu
+    # Lưu kết quả so khớp vào cơ sở dữ liệu (phiên lấy lại kết nối cho lần ghi này)
     new_match_result = MatchResult(
         candidate_id=candidate.id,
         match_score=match_score,
         feedback=feedback,
         suggestions=json.dumps(suggestions_list), # Lưu list gợi ý thành chuỗi JSON
-        jd_id=None # Có thể liên kết với JD nếu bạn quản lý riêng bảng JD
+        jd_id=jd.id
     )
     db.add(new_match_result)
-    db.commit()
-    db.refresh(new_match_result)
+    await db.commit()
+    await db.refresh(new_match_result)
     
     return CVJDUploadResponse(
         candidate_id=candidate.id,
@@ -129,14 +165,225 @@ async def upload_cv_jd(
         suggestions=suggestions_list # Trả về list cho frontend
     )
 
+@router.post("/jobs/upload-cv-jd", response_model=AnalysisJobPublic, status_code=status.HTTP_202_ACCEPTED)
+async def submit_cv_jd_analysis_job(
+    full_name: str = Form(...),
+    email: str = Form(...),
+    applied_position: str = Form(...),
+    cv_file: UploadFile = File(...),
+    jd_file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_async_session),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Tải lên CV và JD rồi trả về ngay (202 Accepted) với mã job; việc phân tích bằng AI chạy nền.
+    Theo dõi kết quả qua /jobs/{job_id} hoặc luồng tiến độ SSE /jobs/{job_id}/events.
+    """
+    queue = get_job_queue()
+    if queue.depth >= settings.JOB_QUEUE_MAX_DEPTH: # Kiểm tra trước khi tốn công trích xuất file
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Hệ thống đang quá tải, vui lòng thử lại sau.", headers={"Retry-After": "30"})
+    candidate, jd, _, _ = await _store_cv_and_jd(db, full_name, email, applied_position, cv_file, jd_file)
+    try:
+        job = await queue.submit(candidate.id, jd.id)
+    except QueueFullError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Hệ thống đang quá tải, vui lòng thử lại sau.", headers={"Retry-After": "30"})
+    return _job_public(job, None)
+
+@router.get("/jobs/{job_id}", response_model=AnalysisJobPublic)
+async def read_analysis_job(
+    job_id: str,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: dict = Depends(get_current_user)
+):
+    """Trạng thái và kết quả (khi đã xong) của một job phân tích CV/JD."""
+    job = await db.get(AnalysisJob, job_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Không tìm thấy job.")
+    match_result = await db.get(MatchResult, job.match_result_id) if job.match_result_id else None
+    return _job_public(job, match_result)
+
+@router.get("/jobs/{job_id}/events")
+async def stream_analysis_job_events(
+    job_id: str,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: dict = Depends(get_current_user)
+):
+    """Luồng tiến độ (Server-Sent Events) của một job phân tích, kết thúc khi job xong hoặc thất bại."""
+    if not await db.get(AnalysisJob, job_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Không tìm thấy job.")
+
+    async def event_stream():
+        async for event in get_job_queue().events(job_id):
+            yield f"event: {event['status']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+def _job_public(job: AnalysisJob, match_result: Optional[MatchResult]) -> AnalysisJobPublic:
+    """Chuyển bản ghi job (và kết quả so khớp nếu có) sang schema công khai."""
+    return AnalysisJobPublic(
+        job_id=job.id,
+        status=job.status,
+        stage=job.stage,
+        candidate_id=job.candidate_id,
+        jd_id=job.jd_id,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        error=job.error,
+        match_score=match_result.match_score if match_result else None,
+        feedback=match_result.feedback if match_result else None,
+        suggestions=json.loads(match_result.suggestions) if match_result else None
+    )
+
+@router.post("/screen-batch")
+async def screen_cv_batch(
+    applied_position: str = Form(...),
+    jd_file: UploadFile = File(...), # File JD dùng chung cho cả lô
+    cv_files: List[UploadFile] = File(...), # Nhiều file CV (PDF/DOCX) hoặc file .zip chứa CV
+    stream_format: str = Form("ndjson"), # "ndjson" hoặc "sse"
+    db: AsyncSession = Depends(get_async_session),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Sàng lọc nhiều CV với cùng một JD. JD chỉ được trích xuất một lần, các CV được xử lý đồng thời
+    (có giới hạn) và kết quả của từng ứng viên được trả về ngay khi xong dưới dạng NDJSON hoặc SSE.
+    """
+    if stream_format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="stream_format phải là 'ndjson' hoặc 'sse'.")
+
+    jd_text = await extract_jd_text(await jd_file.read(), jd_file.filename)
+    if not jd_text:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Không thể trích xuất văn bản từ file JD. Vui lòng kiểm tra định dạng (PDF/DOCX) hoặc nội dung.")
+    jd = await db.run_sync(get_or_create_jd, jd_text, applied_position)
+    await db.commit()
+    jd_id = jd.id
+    await db.close() # Không giữ kết nối DB trong lúc gọi GPT và trong suốt luồng kết quả
+
+    # Đọc hết nội dung file trước khi trả về response (file tải lên sẽ bị đóng sau đó)
+    uploaded = [(f.filename, await f.read()) for f in cv_files]
+    try:
+        files = expand_cv_files(uploaded)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="File zip không hợp lệ.")
+    except BatchTooLargeError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    if not files:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Không có file CV (PDF/DOCX) nào để xử lý.")
+    jd_requirements = await get_jd_requirements(jd) # Tóm tắt JD một lần cho cả lô (sau khi kiểm tra file CV)
+
+    async def event_stream():
+        async for event in screen_cvs(jd_id, jd_text, files, applied_position, jd_requirements):
+            payload = json.dumps(event, ensure_ascii=False)
+            if stream_format == "sse":
+                yield f"event: {event['event']}\ndata: {payload}\n\n"
+            else:
+                yield payload + "\n"
+
+    media_type = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+    return StreamingResponse(event_stream(), media_type=media_type)
+
+@router.post("/rank", response_model=CandidateRankResponse)
+async def rank_candidates_for_jd(
+    jd_file: Optional[UploadFile] = File(None), # File JD (PDF/DOCX)
+    jd_text: Optional[str] = Form(None), # Hoặc văn bản JD trực tiếp
+    top_k: int = Form(10), # Số ứng viên trả về
+    score_with_gpt: bool = Form(False), # True: chỉ gửi top_k ứng viên này cho GPT chấm điểm chi tiết
+    db: AsyncSession = Depends(get_async_session),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Xếp hạng sơ bộ các ứng viên cho một JD bằng chỉ mục BM25 cục bộ trên CV (không gọi GPT).
+    Tùy chọn chấm điểm chi tiết bằng GPT chỉ cho top_k ứng viên tốt nhất.
+    """
+    if jd_file is not None:
+        jd_text = await extract_jd_text(await jd_file.read(), jd_file.filename)
+    if not jd_text:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cần cung cấp file JD hoặc văn bản JD hợp lệ.")
+    if top_k <= 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="top_k phải lớn hơn 0.")
+
+    index = await get_cv_index()
+    ranked = index.search(jd_text, top_k)
+    candidates = {
+        c.id: c for c in (await db.exec(select(Candidate).where(Candidate.id.in_([cid for cid, _ in ranked])))).all()
+    }
+    cv_texts = {cid: c.cv_text for cid, c in candidates.items()}
+    results = [
+        CandidateRankItem(
+            candidate_id=cid,
+            full_name=candidates[cid].full_name,
+            email=candidates[cid].email,
+            relevance_score=round(score, 4)
+        ) for cid, score in ranked if cid in candidates
+    ]
+
+    if score_with_gpt and results:
+        jd = await db.run_sync(get_or_create_jd, jd_text)
+        await db.commit()
+        jd_id = jd.id
+        await db.close() # Không giữ kết nối DB trong lúc gọi GPT; lần ghi kết quả bên dưới mở kết nối mới
+        jd_requirements = await get_jd_requirements(jd)
+        semaphore = asyncio.Semaphore(settings.BATCH_SCREENING_CONCURRENCY)
+
+        async def score(item: CandidateRankItem):
+            async with semaphore:
+                return await analyze_cv_jd(cv_texts[item.candidate_id], jd_text, jd_requirements=jd_requirements)
+
+        analyses = await asyncio.gather(*(score(item) for item in results))
+        for item, analysis in zip(results, analyses):
+            item.match_score = analysis.get("score", 0)
+            item.feedback = analysis.get("feedback", "Không có phản hồi từ AI.")
+            item.suggestions = analysis.get("suggestions", [])
+        db.add_all([
+            MatchResult(
+                candidate_id=item.candidate_id,
+                match_score=item.match_score,
+                feedback=item.feedback,
+                suggestions=json.dumps(item.suggestions),
+                jd_id=jd_id
+            ) for item in results
+        ])
+        await db.commit()
+
+    return CandidateRankResponse(indexed_candidates=len(index), results=results)
+
+@router.get("/jd/{jd_id}/matches", response_model=List[CandidateMatchPublic])
+async def read_matches_for_jd(
+    jd_id: int,
+    offset: int = 0,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: dict = Depends(get_current_user)
+):
+    """Danh sách kết quả so khớp của một JD, sắp xếp theo điểm phù hợp giảm dần."""
+    if not await db.get(JobDescription, jd_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Không tìm thấy JD.")
+    rows = (await db.exec(
+        select(MatchResult, Candidate)
+        .join(Candidate, MatchResult.candidate_id == Candidate.id)
+        .where(MatchResult.jd_id == jd_id)
+        .order_by(MatchResult.match_score.desc())
+        .offset(offset).limit(limit)
+    )).all()
+    return [
+        CandidateMatchPublic(
+            candidate_id=candidate.id,
+            full_name=candidate.full_name,
+            email=candidate.email,
+            match_score=mr.match_score,
+            feedback=mr.feedback,
+            created_at=mr.created_at
+        ) for mr, candidate in rows
+    ]
+
 @router.post("/send-offer", status_code=status.HTTP_200_OK)
 async def send_offer_to_candidate(
     request: SendOfferRequest, # Dữ liệu yêu cầu gửi thư mời
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     current_user: dict = Depends(get_current_user)
 ):
     """Gửi thư mời làm việc đến ứng viên."""
-    candidate = db.get(Candidate, request.candidate_id)
+    candidate = await db.get(Candidate, request.candidate_id)
     if not candidate:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Không tìm thấy ứng viên.")
     
@@ -1,12 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 import uuid # Để tạo ID duy nhất cho phiên trò chuyện
 import json # Để xử lý JSON
+import time
+import logging
+from datetime import datetime
+from typing import Optional
 
-from app.database import get_session
-from app.models import Candidate, Interview
-from app.schemas import ChatbotMessage, ChatbotResponse, InterviewEvaluationRequest, InterviewEvaluationResponse
-from app.services.chatbot_service import start_interview, chat_with_chatbot, evaluate_candidate_response, store # Import 'store' để quản lý lịch sử
+from app.config import settings
+from app.database import async_engine, get_async_session
+from app.models import Candidate, Interview, JobDescription
+from app.schemas import ChatbotMessage, ChatbotResponse, InterviewEvaluationRequest, InterviewEvaluationResponse, InterviewScoreResponse
+from app.services.chatbot_service import start_interview, chat_with_chatbot, stream_chat_with_chatbot, evaluate_candidate_response, get_session_history, score_interview_transcript
+from app.services.interview_sessions import get_session_manager
+from app.services.llm_gateway import CircuitOpenError
 from app.routers.auth import get_current_user
 
 router = APIRouter()
@@ -14,59 +23,165 @@ router = APIRouter()
 @router.post("/start/{candidate_id}", response_model=ChatbotResponse)
 async def begin_interview(
     candidate_id: int, 
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     current_user: dict = Depends(get_current_user)
 ):
     """Bắt đầu một phiên phỏng vấn AI mới cho ứng viên."""
-    candidate = db.get(Candidate, candidate_id)
+    candidate = await db.get(Candidate, candidate_id)
     if not candidate:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Không tìm thấy ứng viên.")
     
     # Tạo một ID phiên ngẫu nhiên duy nhất
     session_id = str(uuid.uuid4())
     
-    # Khởi tạo hoặc xóa lịch sử trò chuyện cho phiên này
-    if session_id in store:
-        store[session_id].clear()
-
     # Tạo một bản ghi phỏng vấn mới trong cơ sở dữ liệu
     new_interview = Interview(candidate_id=candidate_id, session_id=session_id)
     db.add(new_interview)
-    db.commit()
-    db.refresh(new_interview)
+    await db.commit()
 
     # Lấy tin nhắn khởi tạo từ chatbot
     initial_message_text = await start_interview(session_id)
 
     return ChatbotResponse(response=initial_message_text, session_id=session_id, first_message=initial_message_text)
 
+async def _get_open_interview(db: AsyncSession, session_id: str) -> Interview:
+    """Lấy phiên phỏng vấn đang mở; 404 nếu không có, 400 nếu đã kết thúc (hoặc hết hạn do không hoạt động)."""
+    interview_record = (await db.exec(select(Interview).where(Interview.session_id == session_id))).first()
+    if not interview_record:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Không tìm thấy phiên phỏng vấn.")
+    if interview_record.end_time:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Phỏng vấn đã kết thúc.")
+    return interview_record
+
 @router.post("/chat/{session_id}", response_model=ChatbotResponse)
 async def continue_interview_chat(
     session_id: str, # ID phiên trò chuyện
     message: ChatbotMessage, # Tin nhắn từ người dùng
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     current_user: dict = Depends(get_current_user)
 ):
     """Tiếp tục cuộc trò chuyện phỏng vấn AI."""
-    interview_record = db.exec(select(Interview).where(Interview.session_id == session_id)).first()
-    if not interview_record:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Không tìm thấy phiên phỏng vấn.")
+    await _get_open_interview(db, session_id)
+    await db.close() # Không giữ kết nối DB trong lúc chờ LLM
     
     # Lấy phản hồi từ chatbot
-    chatbot_response_text = await chat_with_chatbot(session_id, message.message)
+    try:
+        chatbot_response_text = await chat_with_chatbot(session_id, message.message)
+    except CircuitOpenError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Dịch vụ AI đang tạm thời quá tải. Vui lòng gửi lại tin nhắn sau ít phút.",
+            headers={"Retry-After": str(int(settings.LLM_BREAKER_COOLDOWN_SECONDS))},
+        )
 
     return ChatbotResponse(response=chatbot_response_text, session_id=session_id)
 
+@router.post("/chat/{session_id}/stream")
+async def stream_interview_chat(
+    session_id: str,
+    message: ChatbotMessage,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Tiếp tục cuộc trò chuyện phỏng vấn, trả về câu trả lời dạng Server-Sent Events:
+    các sự kiện `token` (từng đoạn văn bản), rồi `done` (toàn bộ câu trả lời) hoặc `error`.
+    """
+    await _get_open_interview(db, session_id)
+    await db.close() # Không giữ kết nối DB trong suốt thời gian stream
+
+    async def event_stream():
+        parts = []
+        try:
+            async for chunk in stream_chat_with_chatbot(session_id, message.message):
+                parts.append(chunk)
+                yield f"event: token\ndata: {json.dumps({'content': chunk}, ensure_ascii=False)}\n\n"
+        except CircuitOpenError:
+            detail = "Dịch vụ AI đang tạm thời quá tải. Vui lòng gửi lại tin nhắn sau ít phút."
+            yield f"event: error\ndata: {json.dumps({'detail': detail}, ensure_ascii=False)}\n\n"
+            return
+        except Exception as e:
+            logging.error(f"Lỗi khi stream phản hồi phỏng vấn {session_id}: {e}")
+            yield f"event: error\ndata: {json.dumps({'detail': 'Không thể tạo phản hồi. Vui lòng thử lại.'}, ensure_ascii=False)}\n\n"
+            return
+        yield f"event: done\ndata: {json.dumps({'response': ''.join(parts), 'session_id': session_id}, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+@router.websocket("/ws/{session_id}")
+async def interview_websocket(websocket: WebSocket, session_id: str, token: str):
+    """
+    Phiên phỏng vấn qua WebSocket: xác thực token (query `?token=`) MỘT lần khi kết nối,
+    sau đó mỗi tin nhắn `{"message": "..."}` nhận về các khung `{"type": "token", "content": ...}`
+    và cuối cùng `{"type": "done", "response": ...}` (hoặc `{"type": "error", "detail": ...}`).
+    Trước mỗi lượt kiểm tra phiên đã kết thúc chưa (dấu kết thúc trong tiến trình; DB chỉ được đọc lại sau mỗi
+    INTERVIEW_WS_RECHECK_SECONDS giây để nhận phiên kết thúc ở worker khác) và đóng kết nối với mã 1008 nếu đã kết thúc.
+    """
+    async with AsyncSession(async_engine) as db: # Chỉ giữ kết nối DB trong lúc bắt tay, không giữ suốt buổi phỏng vấn
+        try:
+            await get_current_user(token, db)
+            await _get_open_interview(db, session_id)
+        except HTTPException as e:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(e.detail))
+            return
+    await websocket.accept()
+    sessions = get_session_manager()
+    checked_at = time.monotonic()
+
+    try:
+        while True:
+            data = await websocket.receive_json()
+            message = str(data.get("message", "")).strip() if isinstance(data, dict) else ""
+            if not message:
+                await websocket.send_json({"type": "error", "detail": "Tin nhắn trống."})
+                continue
+            if sessions.is_ended(session_id):
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Phỏng vấn đã kết thúc.")
+                return
+            if time.monotonic() - checked_at >= settings.INTERVIEW_WS_RECHECK_SECONDS:
+                async with AsyncSession(async_engine) as db:
+                    try:
+                        await _get_open_interview(db, session_id)
+                    except HTTPException as e:
+                        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(e.detail))
+                        return
+                checked_at = time.monotonic()
+            parts = []
+            try:
+                async for chunk in stream_chat_with_chatbot(session_id, message):
+                    parts.append(chunk)
+                    await websocket.send_json({"type": "token", "content": chunk})
+            except CircuitOpenError:
+                await websocket.send_json({"type": "error", "detail": "Dịch vụ AI đang tạm thời quá tải. Vui lòng gửi lại tin nhắn sau ít phút."})
+                continue
+            except Exception as e:
+                logging.error(f"Lỗi khi stream phản hồi phỏng vấn {session_id}: {e}")
+                await websocket.send_json({"type": "error", "detail": "Không thể tạo phản hồi. Vui lòng thử lại."})
+                continue
+            await websocket.send_json({"type": "done", "response": "".join(parts), "session_id": session_id})
+    except WebSocketDisconnect:
+        pass
+
+async def _candidate_jd_text(db: AsyncSession, candidate: Optional[Candidate]) -> str:
+    """Văn bản JD đã lưu của ứng viên (bảng JobDescription, hoặc cột jd_text cũ); chuỗi rỗng nếu không có."""
+    if candidate and candidate.jd_id:
+        jd = await db.get(JobDescription, candidate.jd_id)
+        return jd.text if jd else ""
+    if candidate and candidate.jd_text:
+        return candidate.jd_text
+    return ""
+
 @router.post("/evaluate", response_model=InterviewEvaluationResponse)
 async def evaluate_interview_response(
     request: InterviewEvaluationRequest, # Yêu cầu đánh giá
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     current_user: dict = Depends(get_current_user)
 ):
     """Đánh giá một câu trả lời cụ thể của ứng viên trong buổi phỏng vấn."""
     # Lấy JD text của ứng viên để AI có ngữ cảnh đánh giá
-    candidate = db.exec(select(Candidate).where(Candidate.id == request.candidate_id)).first() # Giả sử request có candidate_id
-    jd_text = candidate.jd_text if candidate and candidate.jd_text else "" # Lấy JD từ ứng viên hoặc để trống nếu không có
+    candidate = await db.get(Candidate, request.candidate_id) if request.candidate_id else None
+    jd_text = await _candidate_jd_text(db, candidate) # Lấy JD đã lưu của ứng viên hoặc để trống nếu không có
+    await db.close() # Không giữ kết nối DB trong lúc chờ LLM
 
     if not jd_text and not request.jd_text: # Nếu cả hai đều không có JD
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Văn bản JD là bắt buộc để đánh giá.")
@@ -78,14 +193,64 @@ async def evaluate_interview_response(
     return InterviewEvaluationResponse(**evaluation_result) # Trả về kết quả đánh giá
 
 
+@router.post("/score/{session_id}", response_model=InterviewScoreResponse)
+async def score_interview(
+    session_id: str,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Chấm điểm toàn bộ một buổi phỏng vấn đã kết thúc: chấm từng cặp hỏi/đáp trong biên bản (song song, có cache)
+    và lưu điểm, nhận xét chung vào Interview.overall_score/overall_feedback. Gọi lại nhiều lần cho cùng kết quả.
+    """
+    interview_record = (await db.exec(select(Interview).where(Interview.session_id == session_id))).first()
+    if not interview_record:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Không tìm thấy phiên phỏng vấn.")
+    if not interview_record.end_time:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Phỏng vấn chưa kết thúc.")
+
+    jd_text = await _candidate_jd_text(db, await db.get(Candidate, interview_record.candidate_id))
+    if not jd_text:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Ứng viên chưa có JD để đánh giá.")
+    messages = await get_session_history(session_id).aget_messages()
+    if not messages and settings.CHAT_HISTORY_BACKEND == "memory":
+        # Biên bản chỉ nằm trong bộ nhớ của worker đã chạy phỏng vấn và bị giải phóng sau thời gian nhàn rỗi
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Biên bản phỏng vấn không còn trong bộ nhớ (CHAT_HISTORY_BACKEND=memory): không thể chấm điểm.",
+        )
+    if not messages:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Không có biên bản phỏng vấn để chấm điểm.")
+
+    await db.close() # Không giữ kết nối DB trong lúc chấm điểm bằng LLM
+    result = await score_interview_transcript(messages, jd_text)
+    if result["overall_score"] is None:
+        if result["failed"]:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Không thể chấm điểm lúc này. Vui lòng thử lại sau.")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Biên bản không có câu trả lời nào của ứng viên.")
+
+    interview_record.overall_score = result["overall_score"]
+    interview_record.overall_feedback = result["overall_feedback"]
+    db.add(interview_record)
+    await db.commit()
+
+    return InterviewScoreResponse(
+        session_id=session_id,
+        overall_score=result["overall_score"],
+        overall_feedback=result["overall_feedback"],
+        evaluated=len(result["items"]),
+        failed=result["failed"],
+        items=result["items"],
+    )
+
 @router.post("/end/{session_id}", status_code=status.HTTP_200_OK)
 async def end_interview(
     session_id: str,
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     current_user: dict = Depends(get_current_user)
 ):
     """Kết thúc một phiên phỏng vấn AI."""
-    interview_record = db.exec(select(Interview).where(Interview.session_id == session_id)).first()
+    interview_record = (await db.exec(select(Interview).where(Interview.session_id == session_id))).first()
     if not interview_record:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Không tìm thấy phiên phỏng vấn.")
     
@@ -95,11 +260,9 @@ async def end_interview(
     # Cập nhật thời gian kết thúc phỏng vấn trong DB
     interview_record.end_time = datetime.utcnow()
     db.add(interview_record)
-    db.commit()
-    db.refresh(interview_record)
+    await db.commit()
 
-    # Xóa lịch sử trò chuyện trong bộ nhớ để giải phóng tài nguyên
-    if session_id in store:
-        del store[session_id]
+    # Giải phóng lịch sử trò chuyện trong bộ nhớ (biên bản vẫn được lưu trong DB; với backend "memory" giữ lại để chấm điểm)
+    get_session_manager().end(session_id)
 
     return {"message": "Phỏng vấn đã kết thúc thành công."}
\ No newline at end of file
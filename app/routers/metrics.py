@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Depends
+
+from app.services.llm_cache import get_cache_stats
+from app.services.llm_gateway import get_llm_gateway
+from app.services.interview_sessions import get_session_manager
+from app.services.prompt_builder import get_prompt_stats
+from app.services.password_hashing import get_password_hasher
+from app.services.sql_metrics import get_sql_stats
+from app.services.question_bank import get_question_bank_stats
+from app.routers.auth import get_current_user # Dependency xác thực
+
+router = APIRouter()
+
+@router.get("/llm-cache")
+async def read_llm_cache_stats(current_user: dict = Depends(get_current_user)):
+    """Thống kê cache kết quả LLM: số lần trúng (bộ nhớ/cơ sở dữ liệu), trượt và tỷ lệ trúng."""
+    return get_cache_stats()
+
+
+@router.get("/prompts")
+async def read_prompt_stats(current_user: dict = Depends(get_current_user)):
+    """Thống kê số token của tài liệu trước/sau khi làm sạch, tóm tắt và cắt theo ngân sách."""
+    return get_prompt_stats()
+
+
+@router.get("/llm-gateway")
+async def read_llm_gateway_stats(current_user: dict = Depends(get_current_user)):
+    """Trạng thái cổng LLM: số cuộc gọi, số lần thử lại/bị 429, giới hạn đồng thời hiện tại và trạng thái cầu dao."""
+    return get_llm_gateway().get_stats()
+
+
+@router.get("/interview-sessions")
+async def read_interview_session_stats(current_user: dict = Depends(get_current_user)):
+    """Số phiên phỏng vấn đang mở trong worker này, bộ nhớ ước lượng và số phiên đã bị loại/hết hạn."""
+    return get_session_manager().get_stats()
+
+
+@router.get("/password-hashing")
+async def read_password_hashing_stats(current_user: dict = Depends(get_current_user)):
+    """Pool mã hóa mật khẩu: số lần mã hóa/kiểm tra/mã hóa lại, số yêu cầu đang chờ, bị từ chối và thời gian trung bình."""
+    return get_password_hasher().get_stats()
+
+
+@router.get("/sql")
+async def read_sql_stats(current_user: dict = Depends(get_current_user)):
+    """Truy vấn SQL theo endpoint: số truy vấn và thời gian CSDL trung bình/lớn nhất, các câu lệnh chậm nhất và nghi vấn N+1."""
+    return get_sql_stats()
+
+
+@router.get("/question-bank")
+async def read_question_bank_stats(current_user: dict = Depends(get_current_user)):
+    """Ngân hàng câu hỏi trong bộ nhớ: số lần dùng cache, số lần tải lại, kiểm tra phiên bản, xóa cache và số danh mục đang giữ."""
+    return get_question_bank_stats()
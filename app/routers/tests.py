@@ -1,21 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select
+from fastapi import APIRouter, Depends, HTTPException, Response, UploadFile, File, status
+from fastapi.responses import StreamingResponse
+from sqlmodel import select
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.orm import selectinload
-from typing import List
+from typing import List, Literal, Optional, Set
 import json 
+import asyncio
 from datetime import datetime 
 
-from app.database import get_session
+from app.database import get_async_session
 from app.models import Question, SkillTestResult, SkillTestResultItem, Candidate # Các Model
-from app.schemas import QuestionCreate, QuestionPublic, AnswerSubmission, SkillTestStartResponse, SkillTestSubmitResponse, SkillTestResultPublic, SkillTestResultItemPublic # Các Schemas
+from app.schemas import QuestionCreate, QuestionPublic, QuestionImportResult, AnswerSubmission, SkillTestStartResponse, SkillTestSubmitResponse, SkillTestResultPublic, SkillTestResultItemPublic # Các Schemas
 from app.routers.auth import get_current_user # Dependency xác thực
+from app.services.question_bank import get_question_bank, get_correct_answers, bump_question_bank_version, invalidate_question_bank
+from app.services.question_sampling import sample_questions, parse_difficulty_mix
+from app.services.question_import import QuestionImportError, EXPORT_MEDIA_TYPES, detect_format, import_questions, export_questions, question_content_hash
 
 router = APIRouter()
 
 @router.post("/questions/", response_model=QuestionPublic, status_code=status.HTTP_201_CREATED)
 async def create_question(
     question: QuestionCreate, 
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     current_user: dict = Depends(get_current_user)
 ):
     """Tạo một câu hỏi trắc nghiệm mới."""
@@ -24,48 +32,111 @@ async def create_question(
         question_text=question.question_text,
         options=json.dumps(question.options), 
         correct_answer=question.correct_answer,
-        skill_category=question.skill_category
+        skill_category=question.skill_category,
+        difficulty=question.difficulty,
+        content_hash=question_content_hash(question.skill_category, question.question_text, question.options, question.correct_answer)
     )
     db.add(db_question)
-    db.commit()
-    db.refresh(db_question)
+    try:
+        await bump_question_bank_version(db, db_question.skill_category) # Câu hỏi được ghi (autoflush) tại đây
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        if "content_hash" not in str(e.orig): # Chỉ vi phạm unique của content_hash nghĩa là câu hỏi cùng nội dung đã có
+            raise
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Câu hỏi với nội dung này đã tồn tại.")
+    invalidate_question_bank(db_question.skill_category)
+    await db.refresh(db_question)
     # Chuyển đổi lại options thành list cho phản hồi API
     db_question.options = json.loads(db_question.options)
     return db_question
 
+@router.post("/question-bank/import", response_model=QuestionImportResult)
+async def import_question_bank(
+    file: UploadFile = File(...),
+    format: Optional[Literal["csv", "ndjson", "json"]] = None, # Mặc định theo đuôi tên file
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Nhập hàng loạt câu hỏi từ file CSV (cột question_text, options, correct_answer, skill_category, difficulty),
+    NDJSON hoặc mảng JSON. Bản ghi lỗi được bỏ qua và liệt kê trong `errors`; câu trùng nội dung không được ghi lại.
+    """
+    try:
+        fmt = detect_format(file.filename, format)
+        result = await asyncio.to_thread(import_questions, file.file, fmt) # Đọc file và ghi DB đồng bộ trong thread
+    except QuestionImportError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    for skill_category in result.pop("categories"):
+        invalidate_question_bank(skill_category)
+    return result
+
+@router.get("/question-bank/export")
+async def export_question_bank(
+    format: Literal["csv", "ndjson", "json"] = "ndjson",
+    skill_category: Optional[str] = None, # Bỏ trống: xuất tất cả danh mục
+    current_user: dict = Depends(get_current_user)
+):
+    """Xuất ngân hàng câu hỏi (kèm đáp án) theo luồng, cùng định dạng với file nhập."""
+    return StreamingResponse(
+        export_questions(format, skill_category),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="questions.{format}"'},
+    )
+
 @router.get("/questions/{skill_category}", response_model=List[QuestionPublic])
 async def get_questions_by_category(
     skill_category: str, 
     limit: int = 10, # Giới hạn số câu hỏi
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     current_user: dict = Depends(get_current_user)
 ):
     """Lấy danh sách câu hỏi theo danh mục kỹ năng."""
-    questions = db.exec(
-        select(Question).where(Question.skill_category == skill_category).limit(limit)
-    ).all()
-    # Chuyển đổi options từ chuỗi JSON thành list cho mỗi câu hỏi
-    for q in questions:
-        q.options = json.loads(q.options)
-    return questions
+    # Câu hỏi lấy từ ngân hàng câu hỏi trong bộ nhớ, phản hồi ghép từ JSON đã tạo sẵn (options đã giải mã)
+    bank = await get_question_bank(db, skill_category)
+    return Response(content=bank.public_json(limit), media_type="application/json")
+
+async def _seen_question_ids(db: AsyncSession, candidate_id: int) -> Set[int]:
+    """Id các câu hỏi ứng viên đã được giao ở các bài kiểm tra trước (bài cũ chưa lưu question_ids: lấy từ câu trả lời)."""
+    seen, legacy_tests = set(), []
+    tests = (await db.exec(
+        select(SkillTestResult.id, SkillTestResult.question_ids).where(SkillTestResult.candidate_id == candidate_id)
+    )).all()
+    for test_id, question_ids in tests:
+        if question_ids:
+            seen.update(json.loads(question_ids))
+        else:
+            legacy_tests.append(test_id)
+    if legacy_tests:
+        seen.update((await db.exec(
+            select(SkillTestResultItem.question_id).where(SkillTestResultItem.test_result_id.in_(legacy_tests))
+        )).all())
+    return seen
 
 @router.post("/start/{candidate_id}/{skill_category}", response_model=SkillTestStartResponse)
 async def start_skill_test(
     candidate_id: int, 
     skill_category: str, 
     limit: int = 10, 
-    db: Session = Depends(get_session),
+    strategy: Literal["first", "random", "stratified"] = "random", # Cách chọn câu hỏi (xem question_sampling)
+    seed: Optional[int] = None, # Cố định để tái lập cùng một bộ câu hỏi
+    difficulty_mix: Optional[str] = None, # Tỷ lệ độ khó cho strategy=stratified, ví dụ "easy:3,medium:5,hard:2"
+    db: AsyncSession = Depends(get_async_session),
     current_user: dict = Depends(get_current_user)
 ):
     """Bắt đầu một bài kiểm tra kỹ năng cho ứng viên."""
-    candidate = db.get(Candidate, candidate_id)
+    try:
+        mix = parse_difficulty_mix(difficulty_mix)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    candidate = await db.get(Candidate, candidate_id)
     if not candidate:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Không tìm thấy ứng viên.")
 
-    # Lấy các câu hỏi cho bài kiểm tra
-    questions = db.exec(
-        select(Question).where(Question.skill_category == skill_category).limit(limit)
-    ).all()
+    # Chọn câu hỏi từ ngân hàng câu hỏi trong bộ nhớ, tránh các câu ứng viên đã gặp
+    bank = await get_question_bank(db, skill_category)
+    seen = await _seen_question_ids(db, candidate_id) if strategy != "first" else set()
+    questions = sample_questions(bank, limit, strategy=strategy, seed=seed, seen_ids=seen, difficulty_mix=mix)
     
     if not questions:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Không tìm thấy câu hỏi nào cho danh mục '{skill_category}'.")
@@ -73,81 +144,85 @@ async def start_skill_test(
     # Tạo một bản ghi bài kiểm tra mới trong DB
     new_test_result = SkillTestResult(
         candidate_id=candidate_id,
+        skill_category=skill_category,
+        question_ids=json.dumps([bank.ids[p] for p in questions]),
         total_questions=len(questions)
     )
     db.add(new_test_result)
-    db.commit()
-    db.refresh(new_test_result)
-
-    # Chuyển đổi các câu hỏi sang định dạng công khai (không có đáp án đúng)
-    public_questions = [
-        QuestionPublic(
-            id=q.id,
-            question_text=q.question_text,
-            options=json.loads(q.options), # Chuyển đổi options từ chuỗi JSON
-            skill_category=q.skill_category
-        ) for q in questions
-    ]
+    await db.commit()
 
-    return SkillTestStartResponse(test_id=new_test_result.id, questions=public_questions)
+    # Câu hỏi ở định dạng công khai (không có đáp án đúng), ghép từ JSON đã tạo sẵn theo SkillTestStartResponse
+    content = b'{"test_id":%d,"questions":%s}' % (new_test_result.id, bank.public_json_at(questions))
+    return Response(content=content, media_type="application/json")
 
 
 @router.post("/submit/{test_id}", response_model=SkillTestSubmitResponse)
 async def submit_skill_test(
     test_id: int, # ID của bài kiểm tra
     answers: List[AnswerSubmission], # Danh sách các câu trả lời của ứng viên
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     current_user: dict = Depends(get_current_user)
 ):
     """Nộp bài kiểm tra kỹ năng và tính điểm."""
-    test_result = db.get(SkillTestResult, test_id)
+    test_result = await db.get(SkillTestResult, test_id)
     if not test_result:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Không tìm thấy bài kiểm tra.")
     
     if test_result.end_time: # Kiểm tra nếu bài kiểm tra đã được nộp rồi
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bài kiểm tra đã được nộp rồi.")
 
+    # Đáp án đúng của mọi câu được nộp: bảng đáp án đã cache của danh mục, câu còn thiếu tải trong một truy vấn
+    correct_answers = await get_correct_answers(
+        db, (a.question_id for a in answers), test_result.skill_category
+    )
+
+    # Chấm điểm trong bộ nhớ; câu hỏi không tồn tại bị bỏ qua như trước
     score = 0
+    items = []
     for submitted_answer in answers:
-        question = db.get(Question, submitted_answer.question_id) # Lấy câu hỏi từ DB
-        if question:
-            is_correct = (submitted_answer.selected_answer == question.correct_answer)
-            if is_correct:
-                score += 1
-            
-            # Lưu chi tiết câu trả lời của ứng viên
-            test_result_item = SkillTestResultItem(
-                test_result_id=test_id,
-                question_id=question.id,
-                selected_answer=submitted_answer.selected_answer,
-                is_correct=is_correct
-            )
-            db.add(test_result_item)
-    
-    # Cập nhật điểm và thời gian kết thúc bài kiểm tra
-    test_result.score = score
-    test_result.end_time = datetime.utcnow()
-    db.add(test_result)
-    db.commit()
-    db.refresh(test_result)
+        correct_answer = correct_answers.get(submitted_answer.question_id)
+        if correct_answer is None:
+            continue
+        is_correct = (submitted_answer.selected_answer == correct_answer)
+        if is_correct:
+            score += 1
+        items.append({
+            "test_result_id": test_id,
+            "question_id": submitted_answer.question_id,
+            "selected_answer": submitted_answer.selected_answer,
+            "is_correct": is_correct,
+        })
+
+    # Cập nhật điểm và thời gian kết thúc; điều kiện end_time IS NULL chặn hai lần nộp đồng thời cùng một bài
+    submitted = await db.exec(
+        update(SkillTestResult)
+        .where(SkillTestResult.id == test_id, SkillTestResult.end_time == None)
+        .values(score=score, end_time=datetime.utcnow())
+    )
+    if submitted.rowcount == 0:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bài kiểm tra đã được nộp rồi.")
+    if items:
+        await db.exec(insert(SkillTestResultItem), params=items) # Lưu chi tiết câu trả lời bằng một lệnh INSERT nhiều dòng
+    await db.commit()
 
     return SkillTestSubmitResponse(
         test_result_id=test_result.id,
-        score=test_result.score,
+        score=score,
         total_questions=test_result.total_questions
     )
 
 @router.get("/results/{test_id}", response_model=SkillTestResultPublic)
 async def get_test_results(
     test_id: int, 
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     current_user: dict = Depends(get_current_user)
 ):
     """Lấy chi tiết kết quả của một bài kiểm tra kỹ năng."""
-    test_result = db.exec(
+    test_result = (await db.exec(
         select(SkillTestResult).where(SkillTestResult.id == test_id)
         .options(selectinload(SkillTestResult.items).options(selectinload(SkillTestResultItem.question))) # Tải các item và câu hỏi liên quan
-    ).first()
+    )).first()
 
     if not test_result:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Không tìm thấy kết quả bài kiểm tra.")
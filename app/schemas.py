@@ -21,6 +21,7 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     email: Optional[str] = None
+    user_id: Optional[int] = None
 
 class CandidateCreate(SQLModel):
     full_name: str
@@ -55,6 +56,41 @@ class CVJDUploadResponse(BaseModel):
     feedback: Optional[str] = None
     suggestions: Optional[List[str]] = None
 
+class AnalysisJobPublic(BaseModel):
+    job_id: str
+    status: str # pending, running, succeeded, failed
+    stage: Optional[str] = None
+    candidate_id: int
+    jd_id: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+    match_score: Optional[int] = None
+    feedback: Optional[str] = None
+    suggestions: Optional[List[str]] = None
+
+class CandidateRankItem(BaseModel):
+    candidate_id: int
+    full_name: str
+    email: str
+    relevance_score: float # Điểm BM25 từ chỉ mục cục bộ
+    match_score: Optional[int] = None # Chỉ có khi chấm điểm thêm bằng GPT
+    feedback: Optional[str] = None
+    suggestions: Optional[List[str]] = None
+
+class CandidateRankResponse(BaseModel):
+    indexed_candidates: int
+    results: List[CandidateRankItem]
+
+class CandidateMatchPublic(BaseModel):
+    candidate_id: int
+    full_name: str
+    email: str
+    match_score: int
+    feedback: str
+    created_at: datetime
+
 class ChatbotMessage(BaseModel):
     message: str
 
@@ -66,17 +102,33 @@ class ChatbotResponse(BaseModel):
 class InterviewEvaluationRequest(BaseModel):
     question: str
     candidate_answer: str
-    jd_text: str
+    candidate_id: Optional[int] = None # Dùng JD đã lưu của ứng viên nếu có
+    jd_text: Optional[str] = None
 
 class InterviewEvaluationResponse(BaseModel):
     score: int
     feedback: str
 
+class InterviewScoreItem(BaseModel):
+    question: str
+    answer: str
+    score: int
+    feedback: str
+
+class InterviewScoreResponse(BaseModel):
+    session_id: str
+    overall_score: int
+    overall_feedback: str
+    evaluated: int # Số câu trả lời đã chấm
+    failed: int # Số câu trả lời không chấm được (không tính vào điểm chung)
+    items: List[InterviewScoreItem]
+
 class QuestionCreate(BaseModel):
     question_text: str
     options: List[str]
     correct_answer: str
     skill_category: str
+    difficulty: Optional[str] = None
 
 class QuestionPublic(BaseModel):
     id: int
@@ -92,6 +144,19 @@ class SkillTestStartResponse(BaseModel):
     test_id: int
     questions: List[QuestionPublic]
 
+class QuestionImportRowError(BaseModel):
+    row: Optional[int] = None # Số thứ tự bản ghi trong file (từ 1); None nếu lỗi không gắn với bản ghi nào
+    error: str
+
+class QuestionImportResult(BaseModel):
+    format: str
+    received: int # Số bản ghi đọc được từ file
+    inserted: int
+    duplicates: int # Trùng nội dung với câu hỏi đã có hoặc với bản ghi trước đó trong file
+    invalid: int
+    errors: List[QuestionImportRowError] # Tối đa QUESTION_IMPORT_MAX_ERRORS lỗi đầu tiên
+    seconds: float
+
 class SkillTestSubmitResponse(BaseModel):
     test_result_id: int
     score: int
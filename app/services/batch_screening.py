@@ -0,0 +1,190 @@
+import io
+import re
+import json
+import asyncio
+import logging
+import zipfile
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import Session, select
+from app.config import settings
+from app.database import engine
+from app.models import Candidate, MatchResult
+from app.services.cv_jd_processor import process_uploaded_file, analyze_cv_jd
+from app.services.cv_index import index_candidate_cv
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx")
+_EMAIL_RE = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+
+class BatchTooLargeError(ValueError):
+    """Tổng dung lượng CV của lô (sau khi giải nén zip) vượt BATCH_SCREENING_MAX_TOTAL_BYTES."""
+
+def extract_email(text: str) -> str | None:
+    """Tìm địa chỉ email đầu tiên xuất hiện trong văn bản CV."""
+    match = _EMAIL_RE.search(text or "")
+    return match.group(0).lower() if match else None
+
+def name_from_filename(filename: str) -> str:
+    """Đoán họ tên ứng viên từ tên file CV (ví dụ: 'nguyen_van_a.pdf' -> 'Nguyen Van A')."""
+    return re.sub(r"[_\-.]+", " ", Path(filename).stem).strip().title() or filename
+
+def expand_cv_files(files: List[Tuple[str, bytes]]) -> List[Tuple[str, bytes]]:
+    """
+    Chuẩn hóa danh sách file CV tải lên: giải nén các file .zip và chỉ giữ lại file PDF/DOCX.
+    Bỏ qua các mục trong zip vượt quá giới hạn kích thước trích xuất. Ném BatchTooLargeError nếu tổng dung lượng
+    các file (mục trong zip tính theo kích thước sau giải nén, kiểm tra trước khi giải nén) vượt giới hạn của lô.
+    """
+    expanded = []
+    total_bytes = 0
+
+    def count(size: int):
+        nonlocal total_bytes
+        total_bytes += size
+        if total_bytes > settings.BATCH_SCREENING_MAX_TOTAL_BYTES:
+            raise BatchTooLargeError(f"Tổng dung lượng CV vượt quá {settings.BATCH_SCREENING_MAX_TOTAL_BYTES} bytes.")
+
+    for filename, content in files:
+        if (filename or "").lower().endswith(".zip"):
+            with zipfile.ZipFile(io.BytesIO(content)) as archive:
+                for info in archive.infolist():
+                    if info.is_dir() or not info.filename.lower().endswith(SUPPORTED_EXTENSIONS):
+                        continue
+                    if info.file_size > settings.EXTRACTION_MAX_BYTES:
+                        logging.error(f"Bỏ qua {info.filename} trong file zip: vượt quá giới hạn kích thước.")
+                        continue
+                    count(info.file_size) # zipfile không đọc quá kích thước khai báo này
+                    expanded.append((Path(info.filename).name, archive.read(info)))
+        else:
+            count(len(content))
+            expanded.append((filename, content))
+        if len(expanded) >= settings.BATCH_SCREENING_MAX_FILES:
+            return expanded[:settings.BATCH_SCREENING_MAX_FILES]
+    return expanded
+
+def _save_results(rows: List[dict], applied_position: str, jd_id: int) -> Dict[str, int]:
+    """
+    Ghi một nhóm kết quả vào DB trong một giao dịch: tìm các ứng viên đã có bằng MỘT truy vấn,
+    tạo các ứng viên còn thiếu, rồi chèn hàng loạt các MatchResult.
+    Trả về ánh xạ tên file -> candidate_id.
+    """
+    with Session(engine) as session:
+        emails = {row["email"] for row in rows}
+        candidates = {
+            c.email: c for c in session.exec(select(Candidate).where(Candidate.email.in_(emails))).all()
+        }
+        for row in rows:
+            candidate = candidates.get(row["email"])
+            if candidate is None:
+                candidate = Candidate(full_name=row["full_name"], email=row["email"], applied_position=applied_position)
+                candidates[row["email"]] = candidate
+            candidate.cv_text = row["cv_text"]
+            candidate.jd_id = jd_id
+        session.add_all(candidates.values())
+        session.flush() # Lấy ID cho các ứng viên mới trước khi tạo MatchResult
+
+        session.add_all([
+            MatchResult(
+                candidate_id=candidates[row["email"]].id,
+                match_score=row["match_score"],
+                feedback=row["feedback"],
+                suggestions=json.dumps(row["suggestions"]),
+                jd_id=jd_id
+            ) for row in rows
+        ])
+        session.commit()
+        return {row["filename"]: candidates[row["email"]].id for row in rows}
+
+async def screen_cvs(
+    jd_id: int,
+    jd_text: str,
+    cv_files: List[Tuple[str, bytes]],
+    applied_position: str,
+    jd_requirements: Optional[dict] = None,
+) -> AsyncIterator[dict]:
+    """
+    So khớp nhiều CV với cùng một JD (JD đã được trích xuất một lần).
+    Các CV được xử lý đồng thời với số lượng giới hạn; mỗi kết quả được trả về ngay khi xong
+    (sự kiện "result" hoặc "error"), các kết quả được ghi DB theo lô (sự kiện "saved"; lô ghi lỗi thì mỗi CV
+    của lô có một sự kiện "error"), và cuối cùng là sự kiện "done" với thống kê.
+    """
+    semaphore = asyncio.Semaphore(settings.BATCH_SCREENING_CONCURRENCY)
+
+    async def screen_one(filename: str, content: bytes) -> dict:
+        async with semaphore:
+            cv_text = await process_uploaded_file(content, filename)
+            if not cv_text:
+                return {"event": "error", "filename": filename, "detail": "Không thể trích xuất văn bản từ file CV."}
+            email = extract_email(cv_text)
+            if not email:
+                return {"event": "error", "filename": filename, "detail": "Không tìm thấy email ứng viên trong CV."}
+            analysis = await analyze_cv_jd(cv_text, jd_text, jd_requirements=jd_requirements)
+            return {
+                "event": "result",
+                "filename": filename,
+                "full_name": name_from_filename(filename),
+                "email": email,
+                "cv_text": cv_text,
+                "match_score": analysis.get("score", 0),
+                "feedback": analysis.get("feedback", "Không có phản hồi từ AI."),
+                "suggestions": analysis.get("suggestions", []),
+            }
+
+    tasks = [asyncio.create_task(screen_one(filename, content)) for filename, content in cv_files]
+    pending_rows: List[dict] = []
+    succeeded = failed = 0
+
+    async def flush() -> List[dict]:
+        nonlocal succeeded, failed
+        rows = pending_rows.copy()
+        pending_rows.clear()
+        try:
+            saved = await asyncio.to_thread(_save_results, rows, applied_position, jd_id)
+        except SQLAlchemyError as e: # Ví dụ IntegrityError khi request khác vừa tạo ứng viên cùng email
+            # Giao dịch của lô đã được rollback khi phiên đóng; các lô khác vẫn được ghi tiếp
+            logging.error(f"Lỗi khi lưu {len(rows)} kết quả sàng lọc CV: {e}")
+            succeeded -= len(rows)
+            failed += len(rows)
+            return [
+                {"event": "error", "filename": row["filename"], "detail": "Không lưu được kết quả vào cơ sở dữ liệu."}
+                for row in rows
+            ]
+        for row in rows:
+            index_candidate_cv(saved[row["filename"]], row["cv_text"])
+        return [{"event": "saved", "candidate_ids": saved}]
+
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                result = await next_done
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling(): # Chính luồng kết quả bị hủy (client ngắt kết nối)
+                    raise
+                failed += 1 # Chỉ tác vụ xử lý một CV bị hủy
+                yield {"event": "error", "filename": None, "detail": "Việc xử lý CV bị hủy."}
+                continue
+            except Exception as e:
+                logging.error(f"Lỗi khi sàng lọc CV hàng loạt: {e}")
+                failed += 1
+                yield {"event": "error", "filename": None, "detail": "Lỗi không xác định khi xử lý CV."}
+                continue
+            if result["event"] == "error":
+                failed += 1
+                yield result
+                continue
+
+            succeeded += 1
+            pending_rows.append(result)
+            yield {k: v for k, v in result.items() if k != "cv_text"} # Không gửi lại toàn bộ văn bản CV
+            if len(pending_rows) >= settings.BATCH_INSERT_SIZE:
+                for event in await flush():
+                    yield event
+        if pending_rows:
+            for event in await flush():
+                yield event
+    finally:
+        for task in tasks: # Client ngắt kết nối giữa chừng: hủy các CV chưa xử lý
+            task.cancel()
+
+    yield {"event": "done", "total": len(cv_files), "succeeded": succeeded, "failed": failed}
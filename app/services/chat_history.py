@@ -0,0 +1,86 @@
+import threading
+from typing import List, Sequence
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from sqlalchemy import delete
+from sqlmodel import Session, select
+from app.config import settings
+from app.database import engine
+from app.models import InterviewMessage
+from app.services.llm_cache import LRUTTLCache
+
+_MESSAGE_TYPES = {"human": HumanMessage, "ai": AIMessage, "system": SystemMessage}
+
+class _CachedTranscript:
+    """Bản sao trong tiến trình của lịch sử một phiên và ID của tin nhắn cuối cùng đã đọc từ DB."""
+
+    def __init__(self):
+        self.messages: List[BaseMessage] = []
+        self.last_id = 0
+
+# Cache đọc xuyên (read-through): chỉ đọc thêm các tin nhắn mới hơn last_id từ DB,
+# nên vẫn đúng khi worker khác vừa ghi thêm tin nhắn vào cùng phiên
+_cache = LRUTTLCache(settings.CHAT_HISTORY_CACHE_SIZE, settings.CHAT_HISTORY_CACHE_TTL_SECONDS)
+_lock = threading.Lock() # LangChain có thể đọc/ghi lịch sử từ thread pool (aget_messages/aadd_messages)
+
+def _role_of(message: BaseMessage) -> str:
+    """Vai trò lưu trong DB; tin nhắn dạng chunk (khi stream) được lưu như tin nhắn thường."""
+    for role, message_type in _MESSAGE_TYPES.items():
+        if isinstance(message, message_type):
+            return role
+    return message.type
+
+def _to_message(row: InterviewMessage) -> BaseMessage:
+    return _MESSAGE_TYPES.get(row.role, HumanMessage)(content=row.content)
+
+class DBChatMessageHistory(BaseChatMessageHistory):
+    """
+    Lịch sử trò chuyện phỏng vấn lưu trong bảng InterviewMessage (chỉ ghi thêm, không sửa),
+    dùng chung giữa các worker uvicorn và không mất khi khởi động lại.
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+
+    def _sync(self) -> List[BaseMessage]:
+        """Đọc thêm các tin nhắn mới hơn bản cache từ DB (truy vấn theo chỉ mục) và trả về toàn bộ lịch sử."""
+        with _lock:
+            transcript = _cache.get(self.session_id) or _CachedTranscript()
+            last_id = transcript.last_id
+        with Session(engine) as db:
+            rows = db.exec(
+                select(InterviewMessage)
+                .where(InterviewMessage.session_id == self.session_id, InterviewMessage.id > last_id)
+                .order_by(InterviewMessage.id)
+            ).all()
+        with _lock: # Thread khác có thể đã cập nhật bản cache trong lúc truy vấn
+            new_rows = [row for row in rows if row.id > transcript.last_id]
+            if new_rows:
+                transcript.messages.extend(_to_message(row) for row in new_rows)
+                transcript.last_id = new_rows[-1].id
+            _cache.set(self.session_id, transcript)
+            return list(transcript.messages)
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        return self._sync()
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        rows = [InterviewMessage(session_id=self.session_id, role=_role_of(m), content=str(m.content)) for m in messages]
+        with Session(engine) as db:
+            db.add_all(rows)
+            db.commit()
+        self._sync() # Đọc lại theo thứ tự ID để giữ đúng thứ tự khi nhiều worker cùng ghi
+
+    def clear(self) -> None:
+        with Session(engine) as db:
+            db.exec(delete(InterviewMessage).where(InterviewMessage.session_id == self.session_id))
+            db.commit()
+        with _lock:
+            _cache.pop(self.session_id)
+
+def evict_cached_history(session_id: str):
+    """Bỏ bản cache của phiên; lịch sử trong DB được giữ lại làm biên bản phỏng vấn."""
+    with _lock:
+        _cache.pop(session_id)
@@ -1,19 +1,37 @@
+import asyncio
+import logging
+from typing import AsyncIterator, List, Optional, Tuple
+
 from langchain_openai import ChatOpenAI # Kết nối với OpenAI qua LangChain
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder # Để tạo các mẫu câu hỏi cho chatbot
 from langchain_core.runnables.history import RunnableWithMessageHistory # Để quản lý lịch sử trò chuyện
-from langchain_core.messages import SystemMessage, HumanMessage # Các loại tin nhắn
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage # Các loại tin nhắn
 from langchain_community.chat_message_histories import ChatMessageHistory # Để lưu lịch sử tin nhắn
+from langchain_core.chat_history import BaseChatMessageHistory
 from app.config import settings # Nhập API Key từ config
-from openai import OpenAI # Sử dụng OpenAI client trực tiếp để đánh giá
-
-import json # Để xử lý JSON
+from app.services.llm_client import chat_completion_json, estimate_tokens, get_http_client, get_llm_api_key, get_llm_base_url # Client OpenAI bất đồng bộ dùng chung (cho phần đánh giá)
+from app.services.llm_gateway import CircuitOpenError, get_llm_gateway # Giới hạn tốc độ, thử lại và cầu dao dùng chung
+from app.services import llm_cache # Cache kết quả đánh giá theo nội dung đầu vào
+from app.services.chat_history import DBChatMessageHistory, evict_cached_history # Lịch sử phỏng vấn lưu trong DB
+from app.services.history_compaction import CompactedChatHistory, schedule_compaction # Thu gọn lịch sử trong prompt
+from app.services.interview_sessions import get_session_manager # Giới hạn bộ nhớ các phiên đang mở
+from app.services.prompt_builder import fit_to_budget # Giới hạn số token của tài liệu trong prompt
 
-# Khởi tạo OpenAI client để gọi API trực tiếp (cho phần đánh giá)
-openai_client = OpenAI(api_key=settings.OPENAI_API_KEY)
+# Phiên bản prompt đánh giá: tăng khi sửa prompt để bỏ qua các kết quả cache cũ
+EVALUATION_PROMPT_VERSION = "evaluation-v1"
 
 # Khởi tạo LangChain LLM (Large Language Model)
 # temperature=0.7 giúp câu trả lời của AI tự nhiên hơn, không quá cứng nhắc
-llm = ChatOpenAI(openai_api_key=settings.OPENAI_API_KEY, model="gpt-3.5-turbo-0125", temperature=0.7)
+# http_async_client: dùng chung pool kết nối với các dịch vụ khác khi gọi bất đồng bộ
+# max_retries=0: việc thử lại do LLMGateway đảm nhiệm
+llm = ChatOpenAI(
+    openai_api_key=get_llm_api_key(),
+    openai_api_base=get_llm_base_url(),
+    model=settings.OPENAI_MODEL,
+    temperature=0.7,
+    http_async_client=get_http_client(),
+    max_retries=0,
+)
 
 # Mẫu câu hỏi (prompt) cho chatbot phỏng vấn
 interview_prompt = ChatPromptTemplate.from_messages(
@@ -28,34 +46,51 @@ interview_prompt = ChatPromptTemplate.from_messages(
         ),
         # Nơi LangChain sẽ tự động chèn lịch sử cuộc trò chuyện
         MessagesPlaceholder(variable_name="history"),
-        # Tin nhắn của người dùng
-        HumanMessage(content="{input}"),
+        # Tin nhắn của người dùng (dạng mẫu để {input} được thay bằng nội dung thật)
+        ("human", "{input}"),
     ]
 )
 
-# Để đơn giản, chúng ta sẽ lưu lịch sử trò chuyện trong bộ nhớ của server.
-# Trong ứng dụng thực tế, bạn nên lưu vào cơ sở dữ liệu để bền vững hơn.
-store = {} # Một dictionary để lưu lịch sử cho từng session_id
+# Lịch sử trò chuyện mặc định được lưu trong cơ sở dữ liệu (bảng InterviewMessage) để mọi worker
+# đều đọc được cùng một phiên; "memory" chỉ dùng khi chạy một worker (ví dụ khi phát triển).
+store = {} # Lịch sử trong bộ nhớ cho từng session_id (chỉ dùng với CHAT_HISTORY_BACKEND="memory")
 
-def get_session_history(session_id: str) -> ChatMessageHistory:
-    """Lấy hoặc tạo lịch sử trò chuyện cho một session_id cụ thể."""
+def get_session_history(session_id: str) -> BaseChatMessageHistory:
+    """Lấy lịch sử trò chuyện cho một session_id cụ thể theo backend đã cấu hình."""
+    if settings.CHAT_HISTORY_BACKEND == "db":
+        return DBChatMessageHistory(session_id)
     if session_id not in store:
         store[session_id] = ChatMessageHistory()
     return store[session_id]
 
+def get_prompt_history(session_id: str) -> BaseChatMessageHistory:
+    """Lịch sử đưa vào prompt: toàn bộ, hoặc bản thu gọn theo INTERVIEW_HISTORY_STRATEGY để số token mỗi lượt gần như không đổi."""
+    history = get_session_history(session_id)
+    if settings.INTERVIEW_HISTORY_STRATEGY == "full":
+        return history
+    return CompactedChatHistory(session_id, history)
+
+def release_session_history(session_id: str):
+    """Giải phóng bộ nhớ của một phiên đã kết thúc (lịch sử trong DB được giữ lại)."""
+    store.pop(session_id, None)
+    evict_cached_history(session_id)
+
 # Tạo chuỗi hội thoại có quản lý lịch sử
 interview_chain = RunnableWithMessageHistory(
     interview_prompt | llm, # Nối prompt với LLM
-    get_session_history, # Hàm để lấy lịch sử
+    get_prompt_history, # Hàm để lấy lịch sử (đã thu gọn)
     input_messages_key="input", # Khóa cho đầu vào của người dùng
     history_messages_key="history", # Khóa cho lịch sử trò chuyện
 )
 
+def approx_history_bytes(contents: List[str]) -> int:
+    """Ước lượng bộ nhớ của một lịch sử trò chuyện: nội dung UTF-8 cộng chi phí cố định cho mỗi đối tượng tin nhắn."""
+    return sum(len(content.encode("utf-8")) + 400 for content in contents)
+
 async def start_interview(session_id: str) -> str:
     """Bắt đầu một phiên phỏng vấn mới và trả về tin nhắn chào mừng/câu hỏi đầu tiên."""
-    # Xóa lịch sử cũ nếu session_id đã tồn tại
-    if session_id in store:
-        store[session_id].clear()
+    # Xóa lịch sử cũ nếu session_id đã tồn tại (các thao tác lịch sử dùng bản async: không chặn event loop khi đọc/ghi DB)
+    await get_session_history(session_id).aclear()
     
     # Tin nhắn chào mừng và câu hỏi mở đầu
     initial_prompt = "Chào bạn! Chúng ta sẽ bắt đầu buổi phỏng vấn sơ bộ cho vị trí Software Engineer. Bạn có thể giới thiệu đôi chút về bản thân và kinh nghiệm của mình không?"
@@ -63,23 +98,57 @@ async def start_interview(session_id: str) -> str:
     # LangChain RunnableWithMessageHistory cần một tin nhắn "input" để bắt đầu
     # Chúng ta sẽ thêm tin nhắn chào mừng vào lịch sử và trả về nó
     history = get_session_history(session_id)
-    history.add_ai_message(initial_prompt) # Ghi tin nhắn của AI vào lịch sử
+    await history.aadd_messages([AIMessage(content=initial_prompt)]) # Ghi tin nhắn của AI vào lịch sử
+    get_session_manager().touch(session_id, approx_history_bytes([initial_prompt]))
     
     return initial_prompt
 
 async def chat_with_chatbot(session_id: str, message: str) -> str:
-    """Tiếp tục cuộc trò chuyện phỏng vấn."""
-    response = interview_chain.invoke(
-        {"input": message}, # Tin nhắn đầu vào từ người dùng
-        config={"configurable": {"session_id": session_id}} # Để LangChain biết session nào
+    """
+    Tiếp tục cuộc trò chuyện phỏng vấn.
+    Ném CircuitOpenError nếu OpenAI đang gặp sự cố (cầu dao mở); lịch sử chỉ được ghi khi gọi thành công.
+    """
+    history = get_session_history(session_id)
+    prompt_contents = [str(m.content) for m in await get_prompt_history(session_id).aget_messages()]
+    response = await get_llm_gateway().call(
+        lambda: interview_chain.ainvoke(
+            {"input": message}, # Tin nhắn đầu vào từ người dùng
+            config={"configurable": {"session_id": session_id}} # Để LangChain biết session nào
+        ),
+        estimated_tokens=estimate_tokens(*prompt_contents, message) + 500,
     )
+    await _after_turn(session_id, history)
     return response.content # Nội dung phản hồi từ chatbot
 
-async def evaluate_candidate_response(question: str, candidate_answer: str, jd_text: str) -> dict:
+async def stream_chat_with_chatbot(session_id: str, message: str) -> AsyncIterator[str]:
     """
-    Đánh giá câu trả lời của ứng viên cho một câu hỏi phỏng vấn cụ thể bằng GPT.
-    Trả về dictionary với 'score' (điểm) và 'feedback' (phản hồi chi tiết).
+    Như chat_with_chatbot nhưng trả về từng đoạn văn bản ngay khi mô hình sinh ra.
+    Câu trả lời đầy đủ được ghi vào lịch sử khi luồng kết thúc (không ghi nếu client ngắt kết nối giữa chừng).
     """
+    history = get_session_history(session_id)
+    prompt_contents = [str(m.content) for m in await get_prompt_history(session_id).aget_messages()]
+    chunks = get_llm_gateway().stream(
+        lambda: interview_chain.astream(
+            {"input": message},
+            config={"configurable": {"session_id": session_id}}
+        ),
+        estimated_tokens=estimate_tokens(*prompt_contents, message) + 500,
+    )
+    async for chunk in chunks:
+        if chunk.content:
+            yield str(chunk.content)
+    await _after_turn(session_id, history)
+
+async def _after_turn(session_id: str, history: BaseChatMessageHistory):
+    """Sau mỗi lượt chat: cập nhật bộ nhớ của phiên và gộp các lượt cũ vào bản tóm tắt ở nền."""
+    contents = [str(m.content) for m in await history.aget_messages()]
+    get_session_manager().touch(session_id, approx_history_bytes(contents))
+    schedule_compaction(session_id, history)
+
+async def _evaluate_answer(question: str, candidate_answer: str, jd_text: str) -> dict:
+    """Gọi GPT (qua cache) để chấm một cặp câu hỏi/câu trả lời; ném lỗi nếu không chấm được."""
+    jd_text = await fit_to_budget(jd_text, settings.PROMPT_JD_TOKEN_BUDGET, "JD")
+    candidate_answer = await fit_to_budget(candidate_answer, settings.PROMPT_ANSWER_TOKEN_BUDGET, "câu trả lời phỏng vấn")
     prompt = f"""
     Bạn là một chuyên gia tuyển dụng. Hãy đánh giá câu trả lời của ứng viên cho câu hỏi phỏng vấn dưới đây.
     Đánh giá dựa trên sự liên quan, rõ ràng, độ sâu của kiến thức, và mức độ phù hợp với mô tả công việc (JD).
@@ -102,16 +171,75 @@ async def evaluate_candidate_response(question: str, candidate_answer: str, jd_t
     {candidate_answer}
     ---
     """
+    return await llm_cache.get_or_compute(
+        "interview_evaluation", EVALUATION_PROMPT_VERSION, (question, candidate_answer, jd_text),
+        lambda: chat_completion_json("Bạn là trợ lý đánh giá câu trả lời phỏng vấn.", prompt)
+    )
+
+async def evaluate_candidate_response(question: str, candidate_answer: str, jd_text: str) -> dict:
+    """
+    Đánh giá câu trả lời của ứng viên cho một câu hỏi phỏng vấn cụ thể bằng GPT.
+    Trả về dictionary với 'score' (điểm) và 'feedback' (phản hồi chi tiết).
+    """
     try:
-        response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo-0125", # Hoặc "gpt-4-turbo"
-            messages=[
-                {"role": "system", "content": "Bạn là trợ lý đánh giá câu trả lời phỏng vấn."},
-                {"role": "user", "content": prompt}
-            ],
-            response_format={"type": "json_object"}
-        )
-        return json.loads(response.choices[0].message.content)
+        return await _evaluate_answer(question, candidate_answer, jd_text)
+    except CircuitOpenError:
+        return {"score": 0, "feedback": "Dịch vụ AI đang tạm thời quá tải. Vui lòng đánh giá lại sau ít phút."}
     except Exception as e:
         print(f"Lỗi khi đánh giá câu trả lời ứng viên với GPT: {e}")
-        return {"score": 0, "feedback": "Không thể đánh giá. Vui lòng thử lại."}
\ No newline at end of file
+        return {"score": 0, "feedback": "Không thể đánh giá. Vui lòng thử lại."}
+
+def extract_qa_pairs(messages: List[BaseMessage]) -> List[Tuple[str, str]]:
+    """Tách biên bản phỏng vấn thành các cặp (câu hỏi của chatbot, câu trả lời của ứng viên)."""
+    pairs, question, answers = [], None, []
+    for message in messages:
+        if isinstance(message, AIMessage):
+            if question and answers:
+                pairs.append((question, "\n".join(answers)))
+            question, answers = str(message.content), []
+        elif isinstance(message, HumanMessage) and question:
+            answers.append(str(message.content))
+    if question and answers:
+        pairs.append((question, "\n".join(answers)))
+    return pairs
+
+def _overall_feedback(items: List[dict], overall_score: int) -> str:
+    """Tổng hợp nhận xét chung từ kết quả từng câu: điểm trung bình, câu tốt nhất và câu cần cải thiện nhất."""
+    best = max(items, key=lambda item: item["score"])
+    worst = min(items, key=lambda item: item["score"])
+    lines = [f"Điểm trung bình {overall_score}/100 trên {len(items)} câu trả lời."]
+    lines.append(f"Trả lời tốt nhất ({best['score']}/100) cho câu hỏi \"{best['question']}\": {best['feedback']}")
+    if worst is not best:
+        lines.append(f"Cần cải thiện nhất ({worst['score']}/100) ở câu hỏi \"{worst['question']}\": {worst['feedback']}")
+    return "\n".join(lines)
+
+async def score_interview_transcript(messages: List[BaseMessage], jd_text: str) -> dict:
+    """
+    Chấm toàn bộ một buổi phỏng vấn: tách các cặp hỏi/đáp, chấm đồng thời (tối đa INTERVIEW_SCORING_CONCURRENCY cuộc gọi)
+    rồi tổng hợp thành điểm và nhận xét chung. Mỗi cặp được cache theo nội dung nên chấm lại không tốn thêm cuộc gọi GPT.
+    Trả về dictionary với 'overall_score' (None nếu không chấm được câu nào), 'overall_feedback', 'items' và 'failed'.
+    """
+    jd_text = await fit_to_budget(jd_text, settings.PROMPT_JD_TOKEN_BUDGET, "JD") # Một lần cho mọi câu hỏi
+    semaphore = asyncio.Semaphore(settings.INTERVIEW_SCORING_CONCURRENCY)
+
+    async def score(question: str, answer: str) -> Optional[dict]:
+        async with semaphore:
+            try:
+                result = await _evaluate_answer(question, answer, jd_text)
+            except Exception as e:
+                logging.error(f"Lỗi khi chấm câu trả lời phỏng vấn: {e}")
+                return None
+        return {"question": question, "answer": answer, "score": int(result.get("score", 0)), "feedback": str(result.get("feedback", ""))}
+
+    pairs = extract_qa_pairs(messages)
+    results = await asyncio.gather(*(score(question, answer) for question, answer in pairs))
+    items = [item for item in results if item is not None]
+    if not items:
+        return {"overall_score": None, "overall_feedback": None, "items": [], "failed": len(pairs)}
+    overall_score = round(sum(item["score"] for item in items) / len(items))
+    return {
+        "overall_score": overall_score,
+        "overall_feedback": _overall_feedback(items, overall_score),
+        "items": items,
+        "failed": len(pairs) - len(items),
+    }
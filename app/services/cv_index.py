@@ -0,0 +1,171 @@
+import re
+import time
+import zlib
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlmodel import Session, select
+from app.config import settings
+from app.database import engine
+from app.models import Candidate
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+def tokenize(text: str) -> List[str]:
+    """Tách văn bản thành các từ (chữ thường, hỗ trợ tiếng Việt có dấu), bỏ các từ 1 ký tự."""
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if len(t) > 1]
+
+def hash_terms(tokens: List[str], dim: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Băm các từ vào không gian `dim` chiều (crc32 ổn định giữa các tiến trình).
+    Trả về (chỉ số từ đã băm, số lần xuất hiện) dạng mảng NumPy gọn.
+    """
+    if not tokens:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+    hashed = np.fromiter((zlib.crc32(t.encode("utf-8")) for t in tokens), dtype=np.uint32, count=len(tokens))
+    terms, counts = np.unique((hashed % dim).astype(np.int32), return_counts=True)
+    return terms, counts.astype(np.float32)
+
+class CVIndex:
+    """
+    Chỉ mục BM25 trên Candidate.cv_text, lưu dưới dạng các mảng NumPy (từ băm, tần suất, hàng tài liệu).
+    Cập nhật tăng dần khi có CV mới; các phần cập nhật được gộp vào mảng chính khi truy vấn.
+    """
+
+    def __init__(self, dim: int, k1: float = 1.5, b: float = 0.75):
+        self.dim = dim
+        self.k1 = k1
+        self.b = b
+        self.df = np.zeros(dim, dtype=np.int32) # Số tài liệu chứa mỗi từ
+        self.terms = np.empty(0, dtype=np.int32) # Chỉ số từ của mỗi phần tử khác 0
+        self.tfs = np.empty(0, dtype=np.float32) # Tần suất tương ứng
+        self.rows = np.empty(0, dtype=np.int32) # Hàng tài liệu tương ứng
+        self.doc_len = np.empty(0, dtype=np.float32)
+        self.alive = np.empty(0, dtype=bool)
+        self.candidate_ids = np.empty(0, dtype=np.int64)
+        self._row_of: Dict[int, int] = {} # candidate_id -> hàng hiện tại
+        self._doc_terms: Dict[int, np.ndarray] = {} # hàng -> các từ (để cập nhật df khi CV thay đổi)
+        self._pending: List[Tuple[int, np.ndarray, np.ndarray]] = []
+        self._pending_meta: List[Tuple[int, float]] = []
+        self._dead_pending: List[int] = [] # Các hàng chưa gộp nhưng đã bị thay thế
+        self.built_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    @property
+    def _n_rows(self) -> int:
+        return len(self.alive) + len(self._pending_meta)
+
+    def add_document(self, candidate_id: int, text: str):
+        """Thêm hoặc thay thế CV của một ứng viên trong chỉ mục."""
+        self.remove_document(candidate_id)
+        tokens = tokenize(text)
+        terms, tfs = hash_terms(tokens, self.dim)
+        row = self._n_rows
+        self._pending.append((row, terms, tfs))
+        self._pending_meta.append((candidate_id, float(len(tokens))))
+        self._row_of[candidate_id] = row
+        self._doc_terms[row] = terms
+        self.df[terms] += 1
+
+    def remove_document(self, candidate_id: int):
+        """Đánh dấu CV cũ của ứng viên là không còn hiệu lực."""
+        row = self._row_of.pop(candidate_id, None)
+        if row is None:
+            return
+        self.df[self._doc_terms.pop(row)] -= 1
+        if row < len(self.alive):
+            self.alive[row] = False
+        else:
+            self._dead_pending.append(row)
+
+    def _merge_pending(self):
+        """Gộp các tài liệu mới thêm vào các mảng chính (một lần nối mảng cho nhiều cập nhật)."""
+        if not self._pending:
+            return
+        self.terms = np.concatenate([self.terms] + [t for _, t, _ in self._pending])
+        self.tfs = np.concatenate([self.tfs] + [f for _, _, f in self._pending])
+        self.rows = np.concatenate(
+            [self.rows] + [np.full(len(t), row, dtype=np.int32) for row, t, _ in self._pending]
+        )
+        self.candidate_ids = np.concatenate(
+            [self.candidate_ids, np.array([cid for cid, _ in self._pending_meta], dtype=np.int64)]
+        )
+        self.doc_len = np.concatenate(
+            [self.doc_len, np.array([length for _, length in self._pending_meta], dtype=np.float32)]
+        )
+        self.alive = np.concatenate([self.alive, np.ones(len(self._pending_meta), dtype=bool)])
+        self.alive[self._dead_pending] = False
+        self._pending.clear()
+        self._pending_meta.clear()
+        self._dead_pending.clear()
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[int, float]]:
+        """Trả về tối đa `top_k` cặp (candidate_id, điểm BM25) phù hợp nhất với văn bản truy vấn."""
+        self._merge_pending()
+        n_docs = len(self)
+        if n_docs == 0 or top_k <= 0:
+            return []
+        q_terms, q_tfs = hash_terms(tokenize(query), self.dim)
+        if len(q_terms) == 0:
+            return []
+
+        # Bảng tra theo từ: trọng số của từ trong truy vấn (0 nếu không có)
+        q_weight = np.zeros(self.dim, dtype=np.float32)
+        q_weight[q_terms] = q_tfs
+        mask = q_weight[self.terms] > 0
+        terms, tfs, rows = self.terms[mask], self.tfs[mask], self.rows[mask]
+
+        df = self.df[terms].astype(np.float32)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+        avgdl = float(self.doc_len[self.alive].mean()) or 1.0
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len[rows] / avgdl)
+        contrib = q_weight[terms] * idf * tfs * (self.k1 + 1) / (tfs + norm)
+
+        scores = np.bincount(rows, weights=contrib, minlength=len(self.alive))
+        scores[~self.alive] = -np.inf
+        k = min(top_k, n_docs)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.candidate_ids[i]), float(scores[i])) for i in top if scores[i] > 0]
+
+def build_index_from_db() -> CVIndex:
+    """Xây chỉ mục mới từ toàn bộ CV trong cơ sở dữ liệu."""
+    index = CVIndex(settings.CV_INDEX_DIM)
+    with Session(engine) as session:
+        for candidate_id, cv_text in session.exec(
+            select(Candidate.id, Candidate.cv_text).where(Candidate.cv_text != None)
+        ):
+            index.add_document(candidate_id, cv_text)
+    index._merge_pending()
+    return index
+
+_index: Optional[CVIndex] = None
+_build_lock: Optional[asyncio.Lock] = None
+
+async def get_cv_index() -> CVIndex:
+    """
+    Lấy chỉ mục CV của tiến trình này; xây lại từ DB (trong thread riêng) khi chưa có hoặc đã quá cũ,
+    để nhận cả các CV do worker khác ghi.
+    """
+    global _index, _build_lock
+    if _build_lock is None:
+        _build_lock = asyncio.Lock()
+    async with _build_lock:
+        if _index is None or time.monotonic() - _index.built_at > settings.CV_INDEX_REBUILD_SECONDS:
+            try:
+                _index = await asyncio.to_thread(build_index_from_db)
+            except Exception as e:
+                logging.error(f"Lỗi khi xây chỉ mục CV: {e}")
+                if _index is None:
+                    _index = CVIndex(settings.CV_INDEX_DIM)
+                _index.built_at = time.monotonic() # Không thử xây lại ở mọi truy vấn khi DB đang lỗi
+    return _index
+
+def index_candidate_cv(candidate_id: int, cv_text: Optional[str]):
+    """Cập nhật tăng dần chỉ mục sau khi CV của ứng viên được ghi (bỏ qua nếu chỉ mục chưa được tạo)."""
+    if _index is not None and cv_text:
+        _index.add_document(candidate_id, cv_text)
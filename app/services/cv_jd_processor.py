@@ -1,43 +1,190 @@
-import io
 import json
 import logging
 import asyncio
-from typing import Optional
-from PyPDF2 import PdfReader 
-from docx import Document 
-from openai import OpenAI 
+import multiprocessing
+import openai
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Set
 from app.config import settings 
+from app.services.text_extraction import extract_pdf_text, extract_docx_text, extraction_worker_main # Chạy trong pool
+from app.services.llm_client import chat_completion_json # Client OpenAI bất đồng bộ dùng chung
+from app.services.llm_gateway import CircuitOpenError # Cầu dao mở: trả kết quả dự phòng thay vì chờ OpenAI
+from app.services import llm_cache # Cache kết quả GPT theo nội dung đầu vào
+from app.services.prompt_builder import fit_to_budget # Giới hạn số token của tài liệu trong prompt
+from app.services.cv_index import tokenize # Tách từ dùng cho điểm dự phòng theo từ khóa
 
 logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+# Phiên bản prompt: tăng khi sửa nội dung prompt để các kết quả cache cũ không còn được dùng
+MATCH_PROMPT_VERSION = "match-v1"
+SUGGESTIONS_PROMPT_VERSION = "suggestions-v1"
+FUSED_PROMPT_VERSION = "fused-v1"
+JD_REQUIREMENTS_PROMPT_VERSION = "jd-requirements-v1"
+
+class _ExtractionWorker:
+    """
+    Một tiến trình con trích xuất, nhận việc qua Pipe; có thể dừng riêng khi bị treo. Đọc/ghi Pipe chạy trong
+    thread của pool (chạy được với mọi event loop, kể cả ProactorEventLoop trên Windows, và không chặn event loop
+    khi văn bản trả về lớn).
+    """
+
+    def __init__(self, context, io_executor: ThreadPoolExecutor):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=extraction_worker_main, args=(child_conn,), name="extract", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self._io_executor = io_executor
+        self._io: Optional[Future] = None # Thao tác Pipe đang chạy (có thể vẫn chạy sau khi người gọi bị hủy)
+
+    async def _io_call(self, func, *args):
+        self._io = self._io_executor.submit(func, *args)
+        return await asyncio.wrap_future(self._io)
+
+    def _recv(self, timeout: float):
+        if not self.conn.poll(timeout):
+            raise asyncio.TimeoutError()
+        return self.conn.recv() # EOFError nếu tiến trình con đã chết
+
+    async def _receive(self, timeout: float):
+        """Chờ tin nhắn tiếp theo từ tiến trình con tối đa `timeout` giây."""
+        return await self._io_call(self._recv, timeout)
+
+    async def started(self, timeout: float):
+        """Chờ tiến trình con khởi động xong (import thư viện đọc file)."""
+        await self._receive(timeout)
+
+    async def run(self, func, file: bytes, limit: int, timeout: float):
+        """Giao một file cho tiến trình và chờ kết quả tối đa `timeout` giây (chỉ tính thời gian tiến trình xử lý)."""
+        await self._io_call(self.conn.send, (func, file, limit))
+        return await self._receive(timeout)
+
+    def kill(self):
+        self.process.kill() # Đầu Pipe bên kia đóng: thao tác Pipe đang chạy (nếu có) kết thúc ngay
+        if self._io is None:
+            self.conn.close()
+        else: # Chỉ đóng Pipe sau khi thread đang đọc/ghi đã trả về
+            self._io.add_done_callback(lambda _: self.conn.close())
+
+class _ProcessExtractionPool:
+    """
+    Pool EXTRACTION_WORKERS tiến trình trích xuất tự quản lý (thay cho ProcessPoolExecutor, vốn không dừng riêng được
+    một worker). Thời gian chờ tới lượt không tính vào timeout; tiến trình quá thời gian (hoặc có người gọi bị hủy)
+    bị kill và thay bằng tiến trình mới khi cần, các file khác đang xử lý không bị ảnh hưởng.
+    Mỗi chỗ trong pool có một thread riêng để đọc/ghi Pipe, không dùng chung executor mặc định của event loop.
+    """
+
+    def __init__(self, workers: int):
+        self._context = multiprocessing.get_context() # Cùng cách tạo tiến trình mặc định như ProcessPoolExecutor trước đây
+        self._slots = asyncio.Semaphore(workers)
+        self._io_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="extract-io")
+        self._idle: List[_ExtractionWorker] = []
+        self._workers: Set[_ExtractionWorker] = set()
+
+    async def run(self, func, file: bytes, limit: int, timeout: float):
+        async with self._slots:
+            fresh = not self._idle
+            worker = _ExtractionWorker(self._context, self._io_executor) if fresh else self._idle.pop()
+            self._workers.add(worker)
+            reusable = False
+            try:
+                if fresh:
+                    await worker.started(timeout)
+                ok, value = await worker.run(func, file, limit, timeout)
+                reusable = True
+            finally:
+                if reusable:
+                    self._idle.append(worker)
+                else: # Quá thời gian, bị hủy hoặc tiến trình chết: chỉ dừng tiến trình này
+                    self._workers.discard(worker)
+                    worker.kill()
+        if not ok:
+            raise RuntimeError(value)
+        return value
+
+    def shutdown(self):
+        for worker in self._workers:
+            worker.kill()
+        self._workers.clear()
+        self._idle.clear()
+        self._io_executor.shutdown(wait=False)
+
+class _ThreadExtractionPool:
+    """
+    Pool thread (EXTRACTION_POOL=thread). Thread không dừng được: file quá thời gian trả về cho người gọi ngay
+    nhưng vẫn giữ chỗ trong pool tới khi chạy xong, để các file sau không xếp hàng ngầm trong executor.
+    """
+
+    def __init__(self, workers: int):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="extract")
+        self._slots = asyncio.Semaphore(workers)
+
+    def _release(self, future: asyncio.Future):
+        self._slots.release()
+        if not future.cancelled():
+            future.exception() # Đánh dấu đã đọc lỗi của file mà người gọi đã bỏ chờ
+
+    async def run(self, func, file: bytes, limit: int, timeout: float):
+        await self._slots.acquire()
+        future = asyncio.get_running_loop().run_in_executor(self._executor, func, file, limit)
+        future.add_done_callback(self._release)
+        return await asyncio.wait_for(asyncio.shield(future), timeout)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+_extraction_pool = None
+_extraction_semaphore: Optional[asyncio.Semaphore] = None
+
+def _get_extraction_pool():
+    """Lấy (hoặc tạo) pool trích xuất văn bản; kích thước và loại pool lấy từ cấu hình."""
+    global _extraction_pool
+    if _extraction_pool is None:
+        if settings.EXTRACTION_POOL == "thread":
+            _extraction_pool = _ThreadExtractionPool(settings.EXTRACTION_WORKERS)
+        else:
+            _extraction_pool = _ProcessExtractionPool(settings.EXTRACTION_WORKERS)
+    return _extraction_pool
+
+def shutdown_extraction_pool():
+    """Tắt pool trích xuất văn bản khi ứng dụng dừng."""
+    global _extraction_pool
+    if _extraction_pool is not None:
+        _extraction_pool.shutdown()
+        _extraction_pool = None
+
+async def _run_extraction(func, file: bytes, limit: int, kind: str) -> Optional[str]:
+    """
+    Chạy hàm trích xuất `func` trong pool, không chặn event loop.
+    Giới hạn kích thước file, số file đang chờ trong pool và thời gian xử lý mỗi file (tính từ khi file được xử lý).
+    """
+    global _extraction_semaphore
+    if len(file) > settings.EXTRACTION_MAX_BYTES:
+        logging.error(f"File {kind} quá lớn ({len(file)} bytes > {settings.EXTRACTION_MAX_BYTES}). Bỏ qua trích xuất.")
+        return None
+    if _extraction_semaphore is None:
+        _extraction_semaphore = asyncio.Semaphore(settings.EXTRACTION_MAX_PENDING)
+
+    async with _extraction_semaphore: # Backpressure: không đẩy quá nhiều file vào pool cùng lúc
+        try:
+            return await _get_extraction_pool().run(func, file, limit, settings.EXTRACTION_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logging.error(f"Hết thời gian trích xuất văn bản từ {kind} ({settings.EXTRACTION_TIMEOUT_SECONDS}s).")
+            return None
+        except Exception as e:
+            print(f"Lỗi khi trích xuất văn bản từ {kind}: {e}")
+            return None
 
 async def extract_text_from_pdf(file: bytes) -> Optional[str]:
     """Trích xuất văn bản từ file PDF."""
-    try:
-        reader = PdfReader(io.BytesIO(file))
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() or "" 
-        return text
-    except Exception as e:
-        print(f"Lỗi khi trích xuất văn bản từ PDF: {e}")
-        return None
+    return await _run_extraction(extract_pdf_text, file, settings.EXTRACTION_MAX_PAGES, "PDF")
 
 async def extract_text_from_docx(file: bytes) -> Optional[str]:
     """Trích xuất văn bản từ file DOCX."""
-    try:
-        doc = Document(io.BytesIO(file))
-        text = ""
-        for para in doc.paragraphs:
-            text += para.text + "\n" 
-        return text
-    except Exception as e:
-        print(f"Lỗi khi trích xuất văn bản từ DOCX: {e}")
-        return None
+    return await _run_extraction(extract_docx_text, file, settings.EXTRACTION_MAX_DOCX_PARAGRAPHS, "DOCX")
 
 async def process_uploaded_file(file_content: bytes, filename: str) -> Optional[str]:
     """Xác định loại file và trích xuất văn bản tương ứng."""
+    filename = (filename or "").lower()
     if filename.endswith(".pdf"):
         return await extract_text_from_pdf(file_content)
     elif filename.endswith(".docx"):
@@ -45,12 +192,96 @@ async def process_uploaded_file(file_content: bytes, filename: str) -> Optional[
     else:
         return None 
 
-async def get_cv_jd_matching_score_and_feedback(cv_text: str, jd_text: str) -> dict:
+async def extract_jd_requirements(jd_text: str, strict: bool = False) -> Optional[dict]:
+    """
+    Sử dụng GPT để tóm tắt JD thành bộ yêu cầu có cấu trúc (kỹ năng, cấp bậc, yêu cầu bắt buộc...).
+    Chỉ cần chạy một lần cho mỗi JD; trả về None nếu không trích xuất được (`strict`: ném lại lỗi của GPT).
+    """
+    jd_text = await fit_to_budget(jd_text, settings.PROMPT_JD_TOKEN_BUDGET, "JD")
+    prompt = f"""
+    Bạn là một chuyên gia tuyển dụng. Hãy tóm tắt mô tả công việc (JD) dưới đây thành các yêu cầu ngắn gọn.
+    Phản hồi của bạn PHẢI là một đối tượng JSON có các trường:
+    - "title": Tên vị trí.
+    - "seniority": Cấp bậc (ví dụ: "Intern", "Junior", "Mid", "Senior", "Lead").
+    - "min_years_experience": Số năm kinh nghiệm tối thiểu (số nguyên, hoặc null nếu không nêu).
+    - "must_have": Mảng các yêu cầu bắt buộc, mỗi mục là một cụm từ ngắn.
+    - "nice_to_have": Mảng các yêu cầu ưu tiên (không bắt buộc).
+    - "skills": Mảng các kỹ năng/công nghệ được nhắc đến.
+    - "responsibilities": Mảng tối đa 5 trách nhiệm chính, mỗi mục một câu ngắn.
+    - "education": Yêu cầu học vấn (chuỗi, hoặc null).
+
+    Mô tả công việc (JD):
+    ---
+    {jd_text}
+    ---
+    """
+    try:
+        return await llm_cache.get_or_compute(
+            "jd_requirements", JD_REQUIREMENTS_PROMPT_VERSION, (jd_text,),
+            lambda: chat_completion_json("Bạn là một trợ lý phân tích JD.", prompt, temperature=0)
+        )
+    except Exception as e:
+        if strict:
+            raise
+        logging.error(f"Lỗi khi trích xuất yêu cầu từ JD bằng GPT: {e}")
+        return None
+
+def format_jd_requirements(requirements: dict) -> str:
+    """Chuyển bộ yêu cầu JD thành văn bản ngắn gọn để đưa vào prompt chấm điểm."""
+    def join(values) -> str:
+        return "; ".join(str(v) for v in values) if isinstance(values, list) else str(values)
+
+    labels = [
+        ("title", "Vị trí"),
+        ("seniority", "Cấp bậc"),
+        ("min_years_experience", "Số năm kinh nghiệm tối thiểu"),
+        ("must_have", "Bắt buộc"),
+        ("nice_to_have", "Ưu tiên"),
+        ("skills", "Kỹ năng"),
+        ("responsibilities", "Trách nhiệm chính"),
+        ("education", "Học vấn"),
+    ]
+    return "\n".join(
+        f"- {label}: {join(requirements[key])}" for key, label in labels if requirements.get(key) not in (None, "", [])
+    )
+
+def _jd_prompt_section(jd_text: str, jd_requirements: Optional[dict]) -> str:
+    """Phần JD trong prompt: bản yêu cầu đã tóm tắt nếu có, nếu không thì toàn bộ JD."""
+    compact = format_jd_requirements(jd_requirements) if jd_requirements else ""
+    if compact:
+        return f"""Yêu cầu công việc (tóm tắt từ JD):
+    ---
+    {compact}
+    ---"""
+    return f"""Mô tả công việc (JD):
+    ---
+    {jd_text}
+    ---"""
+
+def keyword_match_fallback(cv_text: str, jd_section: str) -> dict:
+    """
+    Kết quả dự phòng khi không gọi được GPT (cầu dao mở): điểm ước lượng theo tỷ lệ từ khóa của JD có trong CV.
+    Không được cache nên lần phân tích sau sẽ gọi lại GPT.
+    """
+    jd_terms = {t for t in tokenize(jd_section) if len(t) > 2}
+    cv_terms = set(tokenize(cv_text))
+    score = round(100 * len(jd_terms & cv_terms) / len(jd_terms)) if jd_terms else 0
+    return {
+        "score": score,
+        "feedback": "Dịch vụ AI đang tạm thời quá tải; điểm này chỉ là ước lượng theo mức trùng khớp từ khóa giữa CV và JD. Vui lòng phân tích lại sau.",
+    }
+
+async def get_cv_jd_matching_score_and_feedback(
+    cv_text: str, jd_text: str, jd_requirements: Optional[dict] = None, strict: bool = False
+) -> dict:
     """
     Sử dụng GPT để đánh giá mức độ phù hợp của CV với JD.
     Trả về một dictionary chứa 'score' (điểm số) và 'feedback' (phản hồi).
-    Thêm xử lý cho trường hợp vượt quá token và retry.
+    Việc thử lại khi OpenAI lỗi tạm thời do LLMGateway đảm nhiệm; khi cầu dao mở thì trả về điểm ước lượng theo từ khóa.
+    Nếu có `jd_requirements` (yêu cầu đã trích xuất từ JD) thì prompt chỉ chứa bản tóm tắt này thay vì toàn bộ JD.
+    `strict`: ném lại lỗi (kể cả CircuitOpenError) thay vì trả về điểm 0 hoặc điểm ước lượng.
     """
+    jd_section = _jd_prompt_section(jd_text, jd_requirements)
     prompt = f"""
     Bạn là một chuyên gia tuyển dụng. Hãy so sánh CV sau với mô tả công việc (JD) dưới đây và đưa ra đánh giá chi tiết.
     Phản hồi của bạn PHẢI là một đối tượng JSON có hai trường:
@@ -62,54 +293,52 @@ async def get_cv_jd_matching_score_and_feedback(cv_text: str, jd_text: str) -> d
     {cv_text}
     ---
 
-    Mô tả công việc (JD):
-    ---
-    {jd_text}
-    ---
+    {jd_section}
     """
 
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo-0125", # Hoặc "gpt-4-turbo"
-                messages=[
-                    {"role": "system", "content": "Bạn là một trợ lý phân tích CV/JD."},
-                    {"role": "user", "content": prompt}
-                ],
-                response_format={"type": "json_object"},
+    try:
+        return await llm_cache.get_or_compute(
+            "cv_jd_match", MATCH_PROMPT_VERSION, (cv_text, jd_section),
+            lambda: chat_completion_json(
+                "Bạn là một trợ lý phân tích CV/JD.",
+                prompt,
                 temperature=0.7, # Điều chỉnh khả năng sáng tạo; thấp hơn cho kết quả thực tế hơn
                 timeout=30 # Thêm thời gian chờ cho cuộc gọi API
             )
-            return json.loads(response.choices[0].message.content)
-        except openai.APITimeoutError as e:
-            logging.error(f"API Timeout (lần thử {attempt+1}/{max_retries}): {e}")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(2 ** attempt) # Thời gian chờ tăng dần theo cấp số nhân
-            else:
-                return {"score": 0, "feedback": "Lỗi kết nối API: Hết thời gian chờ."}
-        except openai.APIError as e:
-            logging.error(f"Lỗi API OpenAI (lần thử {attempt+1}/{max_retries}): {e}")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(2 ** attempt) # Thời gian chờ tăng dần theo cấp số nhân
-            else:
-                return {"score": 0, "feedback": "Lỗi từ OpenAI API. Vui lòng thử lại sau."}
-        except json.JSONDecodeError as e:
-            logging.error(f"Lỗi giải mã JSON từ GPT (lần thử {attempt+1}/{max_retries}): {e}. Phản hồi thô: {response.choices[0].message.content if response else 'N/A'}")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(2 ** attempt) # Thời gian chờ tăng dần theo cấp số nhân
-            else:
-                return {"score": 0, "feedback": "Lỗi định dạng phản hồi từ GPT. Vui lòng thử lại."}
-        except Exception as e:
-            logging.error(f"Lỗi không xác định khi lấy điểm phù hợp và phản hồi từ GPT: {e}")
-            return {"score": 0, "feedback": "Không thể phân tích. Vui lòng thử lại."}
-    return {"score": 0, "feedback": "Không thể phân tích sau nhiều lần thử. Vui lòng thử lại."}
+        )
+    except CircuitOpenError:
+        if strict:
+            raise
+        return keyword_match_fallback(cv_text, jd_section)
+    except openai.APITimeoutError as e:
+        if strict:
+            raise
+        logging.error(f"API Timeout sau khi đã thử lại: {e}")
+        return {"score": 0, "feedback": "Lỗi kết nối API: Hết thời gian chờ."}
+    except openai.APIError as e:
+        if strict:
+            raise
+        logging.error(f"Lỗi API OpenAI sau khi đã thử lại: {e}")
+        return {"score": 0, "feedback": "Lỗi từ OpenAI API. Vui lòng thử lại sau."}
+    except json.JSONDecodeError as e:
+        if strict:
+            raise
+        logging.error(f"Lỗi giải mã JSON từ GPT: {e}. Phản hồi thô: {e.doc}")
+        return {"score": 0, "feedback": "Lỗi định dạng phản hồi từ GPT. Vui lòng thử lại."}
+    except Exception as e:
+        if strict:
+            raise
+        logging.error(f"Lỗi không xác định khi lấy điểm phù hợp và phản hồi từ GPT: {e}")
+        return {"score": 0, "feedback": "Không thể phân tích. Vui lòng thử lại."}
 
-async def get_cv_improvement_suggestions(cv_text: str, jd_text: str) -> dict:
+async def get_cv_improvement_suggestions(
+    cv_text: str, jd_text: str, jd_requirements: Optional[dict] = None, strict: bool = False
+) -> dict:
     """
     Sử dụng GPT để đưa ra gợi ý chỉnh sửa CV để phù hợp hơn với JD.
-    Trả về một dictionary chứa 'suggestions' (danh sách các gợi ý).
+    Trả về một dictionary chứa 'suggestions' (danh sách các gợi ý); `strict`: ném lại lỗi của GPT.
     """
+    jd_section = _jd_prompt_section(jd_text, jd_requirements)
     prompt = f"""
     Bạn là một chuyên gia tuyển dụng. Dựa trên CV dưới đây và mô tả công việc (JD) đi kèm, hãy đưa ra các gợi ý CỤ THỂ và THỰC TẾ để chỉnh sửa CV, giúp nó phù hợp hơn với JD.
     Phản hồi của bạn PHẢI là một đối tượng JSON có một trường:
@@ -128,21 +357,92 @@ async def get_cv_improvement_suggestions(cv_text: str, jd_text: str) -> dict:
     {cv_text}
     ---
 
-    Mô tả công việc (JD):
+    {jd_section}
+    """
+    try:
+        return await llm_cache.get_or_compute(
+            "cv_suggestions", SUGGESTIONS_PROMPT_VERSION, (cv_text, jd_section),
+            lambda: chat_completion_json("Bạn là một trợ lý cung cấp gợi ý chỉnh sửa CV.", prompt)
+        )
+    except Exception as e:
+        if strict:
+            raise
+        print(f"Lỗi khi lấy gợi ý chỉnh sửa CV từ GPT: {e}")
+        return {"suggestions": ["Không thể đưa ra gợi ý. Vui lòng thử lại."]}
+
+async def get_cv_jd_fused_analysis(
+    cv_text: str, jd_text: str, jd_requirements: Optional[dict] = None, strict: bool = False
+) -> dict:
+    """
+    Sử dụng MỘT cuộc gọi GPT để lấy cả điểm phù hợp, phản hồi và gợi ý chỉnh sửa CV.
+    Trả về một dictionary chứa 'score', 'feedback' và 'suggestions'; `strict`: ném lại lỗi của GPT.
+    """
+    jd_section = _jd_prompt_section(jd_text, jd_requirements)
+    prompt = f"""
+    Bạn là một chuyên gia tuyển dụng. Hãy so sánh CV sau với mô tả công việc (JD) dưới đây, đánh giá mức độ phù hợp và đưa ra gợi ý chỉnh sửa CV.
+    Phản hồi của bạn PHẢI là một đối tượng JSON có ba trường:
+    - "score": Một số nguyên từ 0 đến 100 thể hiện mức độ phù hợp của CV với JD (0 là không phù hợp, 100 là hoàn hảo).
+    - "feedback": Một đoạn văn bản cung cấp lý do cho điểm số và những điểm mạnh, điểm yếu của CV so với JD, tập trung vào sự liên quan trực tiếp đến JD.
+    - "suggestions": Một mảng các chuỗi, mỗi chuỗi là một gợi ý CỤ THỂ và THỰC TẾ để CV phù hợp hơn với JD.
+
+    CV:
     ---
-    {jd_text}
+    {cv_text}
     ---
+
+    {jd_section}
     """
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo-0125", # Hoặc "gpt-4-turbo"
-            messages=[
-                {"role": "system", "content": "Bạn là một trợ lý cung cấp gợi ý chỉnh sửa CV."},
-                {"role": "user", "content": prompt}
-            ],
-            response_format={"type": "json_object"} # Yêu cầu GPT trả về JSON
+        result = await llm_cache.get_or_compute(
+            "cv_jd_fused", FUSED_PROMPT_VERSION, (cv_text, jd_section),
+            lambda: chat_completion_json("Bạn là một trợ lý phân tích CV/JD.", prompt, temperature=0.7, timeout=30)
         )
-        return json.loads(response.choices[0].message.content)
+    except CircuitOpenError:
+        if strict:
+            raise
+        return dict(keyword_match_fallback(cv_text, jd_section), suggestions=[])
     except Exception as e:
-        print(f"Lỗi khi lấy gợi ý chỉnh sửa CV từ GPT: {e}")
-        return {"suggestions": ["Không thể đưa ra gợi ý. Vui lòng thử lại."]}
\ No newline at end of file
+        if strict:
+            raise
+        logging.error(f"Lỗi khi phân tích gộp CV/JD với GPT: {e}")
+        return {
+            "score": 0,
+            "feedback": "Không thể phân tích. Vui lòng thử lại.",
+            "suggestions": ["Không thể đưa ra gợi ý. Vui lòng thử lại."]
+        }
+    return {
+        "score": result.get("score", 0),
+        "feedback": result.get("feedback", "Không có phản hồi từ AI."),
+        "suggestions": result.get("suggestions", []),
+    }
+
+async def analyze_cv_jd(
+    cv_text: str, jd_text: str, fused: Optional[bool] = None, jd_requirements: Optional[dict] = None, strict: bool = False
+) -> dict:
+    """
+    Phân tích CV so với JD: trả về dictionary chứa 'score', 'feedback' và 'suggestions'.
+    `jd_requirements`: yêu cầu đã trích xuất sẵn từ JD (xem extract_jd_requirements), dùng thay cho toàn bộ JD.
+    Mặc định chạy song song hai cuộc gọi (điểm/phản hồi và gợi ý); nếu bật chế độ gộp
+    (fused hoặc settings.CV_JD_FUSED_ANALYSIS) thì chỉ dùng một cuộc gọi có cấu trúc.
+    `strict`: lỗi GPT được ném ra thay vì trả về kết quả dự phòng (để hàng đợi job thử lại hoặc báo thất bại).
+    """
+    if fused is None:
+        fused = settings.CV_JD_FUSED_ANALYSIS
+
+    # Làm sạch và giới hạn số token một lần cho cả các cuộc gọi bên dưới
+    cv_text = await fit_to_budget(cv_text, settings.PROMPT_CV_TOKEN_BUDGET, "CV")
+    if not (jd_requirements and format_jd_requirements(jd_requirements)):
+        jd_text = await fit_to_budget(jd_text, settings.PROMPT_JD_TOKEN_BUDGET, "JD")
+    if fused:
+        return await get_cv_jd_fused_analysis(cv_text, jd_text, jd_requirements, strict)
+
+    # Hai cuộc gọi độc lập trên cùng dữ liệu: chạy đồng thời để tổng thời gian ~ cuộc gọi chậm nhất
+    matching_result_dict, suggestions_dict = await asyncio.gather(
+        get_cv_jd_matching_score_and_feedback(cv_text, jd_text, jd_requirements, strict),
+        get_cv_improvement_suggestions(cv_text, jd_text, jd_requirements, strict),
+    )
+    return {
+        "score": matching_result_dict.get("score", 0),
+        "feedback": matching_result_dict.get("feedback", "Không có phản hồi từ AI."),
+        "suggestions": suggestions_dict.get("suggestions", []),
+    }
\ No newline at end of file
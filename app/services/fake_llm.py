@@ -0,0 +1,120 @@
+"""
+Máy chủ LLM giả lập tương thích OpenAI (POST /v1/chat/completions) để kiểm thử tải mà không gọi OpenAI.
+
+Ứng dụng chạy với LLM_BACKEND=fake sẽ gửi yêu cầu tới máy chủ này qua đúng client thật
+(AsyncOpenAI/ChatOpenAI, pool kết nối, LLMGateway), nên số đo phản ánh đường đi thực tế của mã.
+Phản hồi và độ trễ là tất định theo FAKE_LLM_SEED và nội dung yêu cầu; lần gửi lại cùng yêu cầu
+(thử lại sau lỗi) được tính là một lần thử mới nên có thể thành công.
+
+Chạy từ thư mục gốc của dự án:
+    python -m app.services.fake_llm
+"""
+import json
+import time
+import random
+import asyncio
+import hashlib
+from collections import Counter
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.config import settings
+
+fake_llm_app = FastAPI(title="Fake LLM")
+
+_attempts: Counter = Counter() # Số lần đã nhận mỗi yêu cầu (theo hash nội dung)
+_stats = {"requests": 0, "errors": 0}
+
+def _rng_for(body: bytes) -> random.Random:
+    digest = hashlib.sha256(body).hexdigest()
+    _attempts[digest] += 1
+    return random.Random(f"{settings.FAKE_LLM_SEED}:{digest}:{_attempts[digest]}")
+
+def _json_content(rng: random.Random) -> dict:
+    """Một đối tượng JSON chứa đủ các trường mà mọi prompt JSON của ứng dụng yêu cầu."""
+    skills = rng.sample(["Python", "FastAPI", "SQL", "Docker", "Kubernetes", "React", "AWS", "Git", "Redis"], 4)
+    return {
+        "score": rng.randint(30, 95),
+        "feedback": f"Ứng viên đáp ứng {rng.randint(40, 90)}% yêu cầu; mạnh về {skills[0]} và {skills[1]}.",
+        "suggestions": [f"Bổ sung kinh nghiệm thực tế với {skill}." for skill in skills[2:]],
+        "summary": f"Tóm tắt: kinh nghiệm với {', '.join(skills)}.",
+        "title": "Software Engineer",
+        "seniority": rng.choice(["Junior", "Mid", "Senior"]),
+        "min_years_experience": rng.randint(0, 5),
+        "must_have": skills[:2],
+        "nice_to_have": skills[2:],
+        "skills": skills,
+        "responsibilities": ["Phát triển và bảo trì dịch vụ backend."],
+        "education": None,
+    }
+
+def _text_content(rng: random.Random) -> str:
+    topic = rng.choice(["dự án gần nhất", "cách bạn xử lý lỗi trên production", "kinh nghiệm làm việc nhóm", "thiết kế API"])
+    return f"Cảm ơn bạn đã chia sẻ. Bạn có thể kể thêm về {topic} không?"
+
+async def _stream_chunks(payload: dict, content: str):
+    """Gửi nội dung theo từng từ ở định dạng chunk SSE của OpenAI, cách nhau FAKE_LLM_TOKEN_INTERVAL_MS."""
+    base = {
+        "id": f"chatcmpl-fake-{_stats['requests']}",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": payload.get("model", settings.OPENAI_MODEL),
+    }
+    words = content.split(" ")
+    for index, word in enumerate(words):
+        delta = {"content": word if index == 0 else " " + word}
+        if index == 0:
+            delta["role"] = "assistant"
+        chunk = dict(base, choices=[{"index": 0, "delta": delta, "finish_reason": None}])
+        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+        await asyncio.sleep(settings.FAKE_LLM_TOKEN_INTERVAL_MS / 1000)
+    yield f"data: {json.dumps(dict(base, choices=[{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]))}\n\n"
+    yield "data: [DONE]\n\n"
+
+@fake_llm_app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.body()
+    payload = json.loads(body)
+    rng = _rng_for(body)
+    _stats["requests"] += 1
+
+    prompt_chars = sum(len(str(m.get("content", ""))) for m in payload.get("messages", []))
+    # Độ trễ = thành phần ngẫu nhiên (log-normal) + thời gian xử lý prompt tỷ lệ với số token đầu vào
+    latency_ms = rng.lognormvariate(0, settings.FAKE_LLM_LATENCY_SIGMA) * settings.FAKE_LLM_LATENCY_MS
+    latency_ms += prompt_chars / 3 / 1000 * settings.FAKE_LLM_LATENCY_PER_1K_TOKENS_MS
+    await asyncio.sleep(latency_ms / 1000)
+
+    if rng.random() < settings.FAKE_LLM_ERROR_RATE:
+        _stats["errors"] += 1
+        if rng.random() < 0.5:
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached (fake)", "type": "rate_limit_error"}},
+                status_code=429, headers={"retry-after": "1"},
+            )
+        return JSONResponse({"error": {"message": "Internal error (fake)", "type": "server_error"}}, status_code=500)
+
+    wants_json = (payload.get("response_format") or {}).get("type") == "json_object"
+    content = json.dumps(_json_content(rng), ensure_ascii=False) if wants_json else _text_content(rng)
+    if payload.get("stream"):
+        return StreamingResponse(_stream_chunks(payload, content), media_type="text/event-stream")
+    prompt_tokens, completion_tokens = prompt_chars // 3, len(content) // 3
+    return {
+        "id": f"chatcmpl-fake-{_stats['requests']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": payload.get("model", settings.OPENAI_MODEL),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+@fake_llm_app.get("/stats")
+async def read_stats():
+    return _stats
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(fake_llm_app, host=settings.FAKE_LLM_HOST, port=settings.FAKE_LLM_PORT, log_level="warning")
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, SystemMessage
+from sqlalchemy import update
+from sqlmodel import Session, select
+from app.config import settings
+from app.database import engine
+from app.models import Interview
+from app.services import llm_cache
+from app.services.llm_client import chat_completion_json
+
+# Phiên bản prompt tóm tắt lịch sử: tăng khi sửa prompt để bỏ qua các kết quả cache cũ
+HISTORY_SUMMARY_PROMPT_VERSION = "interview-history-summary-v1"
+
+_ROLE_LABELS = {"human": "Ứng viên", "ai": "Người phỏng vấn"}
+_compaction_tasks: Dict[str, asyncio.Task] = {} # Mỗi phiên chỉ có một lượt tóm tắt chạy tại một thời điểm
+
+def _window_size() -> int:
+    return settings.INTERVIEW_HISTORY_WINDOW_TURNS * 2 # Một lượt = một câu hỏi + một câu trả lời
+
+def load_summary_state(session_id: str) -> Tuple[Optional[str], int]:
+    """Bản tóm tắt hiện tại của phiên và số tin nhắn đầu tiên đã được gộp vào bản tóm tắt."""
+    with Session(engine) as db:
+        row = db.exec(
+            select(Interview.history_summary, Interview.summarized_messages).where(Interview.session_id == session_id)
+        ).first()
+    if row is None:
+        return None, 0
+    return row[0], row[1] or 0
+
+def _save_summary_state(session_id: str, summary: str, expected: int, summarized: int) -> bool:
+    """Lưu bản tóm tắt mới nếu chưa có worker nào khác cập nhật trước (so sánh với số tin nhắn đã tóm tắt cũ)."""
+    with Session(engine) as db:
+        result = db.exec(
+            update(Interview)
+            .where(Interview.session_id == session_id, Interview.summarized_messages == expected)
+            .values(history_summary=summary, summarized_messages=summarized)
+        )
+        db.commit()
+        return result.rowcount == 1
+
+class CompactedChatHistory(BaseChatMessageHistory):
+    """
+    Lịch sử đưa vào prompt phỏng vấn theo INTERVIEW_HISTORY_STRATEGY:
+    - "window": chỉ N lượt gần nhất.
+    - "summary": bản tóm tắt các lượt cũ + các tin nhắn chưa được tóm tắt (thường là N lượt gần nhất).
+    Ghi/xóa tin nhắn đi thẳng vào lịch sử gốc, nên biên bản đầy đủ vẫn được lưu.
+    """
+
+    def __init__(self, session_id: str, history: BaseChatMessageHistory):
+        self.session_id = session_id
+        self.history = history
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        messages = self.history.messages
+        if settings.INTERVIEW_HISTORY_STRATEGY == "window":
+            return messages[-_window_size():]
+        summary, summarized = load_summary_state(self.session_id)
+        recent = messages[summarized:] # Nếu lượt tóm tắt trước đó lỗi thì giữ nguyên các tin nhắn chưa tóm tắt
+        if summary:
+            return [SystemMessage(content=f"Tóm tắt phần trước của buổi phỏng vấn:\n{summary}")] + recent
+        return recent
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self.history.add_messages(messages)
+
+    def clear(self) -> None:
+        self.history.clear()
+
+def format_transcript(messages: Sequence[BaseMessage]) -> str:
+    return "\n".join(f"{_ROLE_LABELS.get(m.type, m.type)}: {m.content}" for m in messages)
+
+async def summarize_turns(previous_summary: Optional[str], messages: Sequence[BaseMessage]) -> str:
+    """Cập nhật bản tóm tắt: gộp bản tóm tắt cũ với các lượt vừa rời khỏi cửa sổ."""
+    prompt = f"""
+    Bạn đang ghi chép một buổi phỏng vấn tuyển dụng. Hãy cập nhật bản tóm tắt dưới đây với các lượt hội thoại mới.
+    Giữ lại: các câu hỏi đã hỏi, thông tin ứng viên đã chia sẻ (kinh nghiệm, kỹ năng, dự án, số liệu), điểm mạnh/yếu đã thể hiện.
+    Bỏ lời chào hỏi và câu chung chung. Bản tóm tắt không quá {settings.INTERVIEW_SUMMARY_MAX_TOKENS} token.
+    Phản hồi của bạn PHẢI là một đối tượng JSON có một trường:
+    - "summary": Bản tóm tắt đã cập nhật.
+
+    Bản tóm tắt hiện tại:
+    ---
+    {previous_summary or "(chưa có)"}
+    ---
+
+    Các lượt hội thoại mới:
+    ---
+    {format_transcript(messages)}
+    ---
+    """
+    result = await llm_cache.get_or_compute(
+        "interview_history_summary", HISTORY_SUMMARY_PROMPT_VERSION, (previous_summary or "", format_transcript(messages)),
+        lambda: chat_completion_json("Bạn là trợ lý ghi chép phỏng vấn.", prompt, temperature=0)
+    )
+    return str(result.get("summary", ""))
+
+async def compact_history(session_id: str, history: BaseChatMessageHistory):
+    """
+    Gộp các tin nhắn nằm ngoài cửa sổ N lượt gần nhất vào bản tóm tắt của phiên.
+    Chỉ chạy khi đã có thêm INTERVIEW_SUMMARY_BATCH_TURNS lượt ngoài cửa sổ, để không tốn một cuộc gọi GPT mỗi lượt.
+    """
+    messages = await history.aget_messages()
+    summary, summarized = await asyncio.to_thread(load_summary_state, session_id)
+    target = len(messages) - _window_size()
+    if target - summarized < settings.INTERVIEW_SUMMARY_BATCH_TURNS * 2:
+        return
+    new_summary = await summarize_turns(summary, messages[summarized:target])
+    if new_summary:
+        await asyncio.to_thread(_save_summary_state, session_id, new_summary, summarized, target)
+
+def schedule_compaction(session_id: str, history: BaseChatMessageHistory):
+    """Tóm tắt lịch sử ở nền sau khi đã trả lời, để không làm chậm lượt chat hiện tại."""
+    if settings.INTERVIEW_HISTORY_STRATEGY != "summary":
+        return
+    running = _compaction_tasks.get(session_id)
+    if running is not None and not running.done():
+        return
+
+    async def run():
+        try:
+            await compact_history(session_id, history)
+        except Exception as e:
+            logging.error(f"Lỗi khi tóm tắt lịch sử phỏng vấn {session_id}: {e}")
+        finally:
+            _compaction_tasks.pop(session_id, None)
+
+    _compaction_tasks[session_id] = asyncio.create_task(run())
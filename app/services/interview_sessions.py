@@ -0,0 +1,161 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+
+from sqlalchemy import and_, exists, update
+from sqlmodel import Session, select
+from app.config import settings
+from app.database import engine
+from app.models import Interview, InterviewMessage
+
+class InterviewSessionManager:
+    """
+    Giới hạn bộ nhớ của các phiên phỏng vấn đang mở trong tiến trình:
+    - Phiên không hoạt động quá INTERVIEW_SESSION_IDLE_TTL_SECONDS bị coi là bỏ dở: ghi Interview.end_time và giải phóng.
+    - Vượt quá số phiên tối đa hoặc ngân sách bộ nhớ: giải phóng phiên ít dùng nhất (LRU). Lịch sử vẫn nằm trong DB
+      nên phiên bị loại vẫn tiếp tục được (được nạp lại ở lượt chat sau). Chỉ áp dụng với CHAT_HISTORY_BACKEND="db":
+      với "memory" lịch sử trong bộ nhớ là bản duy nhất nên không bị loại, chỉ được giải phóng khi phiên kết thúc/hết hạn.
+    - Một tác vụ nền quét định kỳ các phiên hết hạn, kể cả phiên mở ở worker khác (dựa trên thời điểm tin nhắn cuối trong DB;
+      với CHAT_HISTORY_BACKEND="memory" chỉ các phiên nhàn rỗi của tiến trình này).
+    - Phiên đã kết thúc (qua /end hoặc do hết hạn) được đánh dấu trong tiến trình để kết nối WebSocket đang mở
+      biết mà không phải truy vấn DB ở mỗi lượt.
+    """
+
+    def __init__(self):
+        self._sessions: "OrderedDict[str, tuple[float, int]]" = OrderedDict() # session_id -> (lần hoạt động cuối, số byte)
+        self._memory_bytes = 0
+        self._ended: "OrderedDict[str, float]" = OrderedDict() # session_id -> thời điểm đánh dấu kết thúc
+        self._sweeper: Optional[asyncio.Task] = None
+        self.stats = {"evicted_lru": 0, "expired": 0, "finalized": 0}
+
+    def touch(self, session_id: str, approx_bytes: int):
+        """Ghi nhận hoạt động của một phiên (bắt đầu hoặc chat) với dung lượng lịch sử hiện tại, rồi áp giới hạn."""
+        _, old_bytes = self._sessions.pop(session_id, (0.0, 0))
+        self._sessions[session_id] = (time.monotonic(), approx_bytes)
+        self._memory_bytes += approx_bytes - old_bytes
+        if settings.CHAT_HISTORY_BACKEND != "db":
+            return # Loại phiên sẽ xóa mất biên bản duy nhất
+        budget = int(settings.INTERVIEW_SESSION_MEMORY_BUDGET_MB * 1024 * 1024)
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > settings.INTERVIEW_MAX_ACTIVE_SESSIONS or self._memory_bytes > budget
+        ):
+            oldest = next(iter(self._sessions))
+            self.release(oldest)
+            self.stats["evicted_lru"] += 1
+
+    def release(self, session_id: str):
+        """Giải phóng bộ nhớ của một phiên (kết thúc, hết hạn hoặc bị loại)."""
+        from app.services.chatbot_service import release_session_history # Tránh import vòng
+        _, approx_bytes = self._sessions.pop(session_id, (0.0, 0))
+        self._memory_bytes -= approx_bytes
+        release_session_history(session_id)
+
+    def _mark_ended(self, session_id: str):
+        self._ended[session_id] = time.monotonic()
+        self._ended.move_to_end(session_id)
+
+    def end(self, session_id: str):
+        """
+        Đánh dấu phiên đã kết thúc (Interview.end_time đã được ghi) và giải phóng bộ nhớ của phiên. Với
+        CHAT_HISTORY_BACKEND="memory" lịch sử là biên bản duy nhất nên được giữ lại để chấm điểm (/score);
+        tác vụ quét giải phóng nó khi phiên nhàn rỗi quá INTERVIEW_SESSION_IDLE_TTL_SECONDS.
+        """
+        self._mark_ended(session_id)
+        if settings.CHAT_HISTORY_BACKEND == "db":
+            self.release(session_id)
+
+    def is_ended(self, session_id: str) -> bool:
+        """Phiên đã được đánh dấu kết thúc trong tiến trình này (không tính phiên kết thúc ở worker khác)."""
+        return session_id in self._ended
+
+    def _forget_ended(self):
+        # Giữ dấu kết thúc trong một TTL: đủ lâu để mọi kết nối WebSocket còn mở đã đọc lại DB ít nhất một lần
+        cutoff = time.monotonic() - settings.INTERVIEW_SESSION_IDLE_TTL_SECONDS
+        while self._ended and next(iter(self._ended.values())) < cutoff:
+            self._ended.popitem(last=False)
+
+    def _idle_local_sessions(self) -> List[str]:
+        cutoff = time.monotonic() - settings.INTERVIEW_SESSION_IDLE_TTL_SECONDS
+        return [session_id for session_id, (last_seen, _) in self._sessions.items() if last_seen < cutoff]
+
+    def _finalize_expired(self, idle_local_sessions: List[str]) -> List[str]:
+        """
+        Ghi end_time cho các phiên chưa kết thúc đã hết hạn; trả về các phiên đó. Với lịch sử trong DB: các phiên không có
+        tin nhắn mới trong khoảng TTL (kể cả phiên mở ở worker khác). Với "memory" không có tin nhắn nào trong DB nên chỉ
+        dựa vào lần hoạt động cuối của các phiên trong tiến trình này.
+        Điều kiện được kiểm tra trong chính câu UPDATE nên an toàn khi nhiều worker cùng quét.
+        """
+        now = datetime.utcnow()
+        if settings.CHAT_HISTORY_BACKEND == "db":
+            cutoff = now - timedelta(seconds=settings.INTERVIEW_SESSION_IDLE_TTL_SECONDS)
+            recent_message = exists().where(and_(
+                InterviewMessage.session_id == Interview.session_id,
+                InterviewMessage.created_at >= cutoff,
+            ))
+            conditions = [Interview.start_time < cutoff, ~recent_message]
+        elif idle_local_sessions:
+            conditions = [Interview.session_id.in_(idle_local_sessions)]
+        else:
+            return []
+        with Session(engine) as db:
+            expired = db.exec(select(Interview.session_id).where(Interview.end_time == None, *conditions)).all()
+            if expired:
+                result = db.exec(
+                    update(Interview)
+                    .where(Interview.session_id.in_(expired), Interview.end_time == None, *conditions)
+                    .values(end_time=now)
+                    .execution_options(synchronize_session=False)
+                )
+                db.commit()
+                self.stats["finalized"] += result.rowcount
+        return list(expired)
+
+    async def sweep(self):
+        """Một lượt quét: kết thúc các phiên hết hạn trong DB và giải phóng các phiên nhàn rỗi trong tiến trình."""
+        idle = self._idle_local_sessions()
+        expired = await asyncio.to_thread(self._finalize_expired, idle)
+        for session_id in set(expired) | set(idle):
+            if session_id in self._sessions:
+                self.stats["expired"] += 1
+            if session_id in expired:
+                self._mark_ended(session_id)
+            self.release(session_id)
+        self._forget_ended()
+
+    async def _sweep_forever(self):
+        while True:
+            await asyncio.sleep(settings.INTERVIEW_SWEEP_INTERVAL_SECONDS)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logging.error(f"Lỗi khi quét các phiên phỏng vấn hết hạn: {e}")
+
+    def start(self):
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def stop(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+
+    def get_stats(self) -> dict:
+        return dict(
+            self.stats,
+            active_sessions=len(self._sessions),
+            memory_bytes=self._memory_bytes,
+            memory_budget_bytes=int(settings.INTERVIEW_SESSION_MEMORY_BUDGET_MB * 1024 * 1024),
+        )
+
+_session_manager: Optional[InterviewSessionManager] = None
+
+def get_session_manager() -> InterviewSessionManager:
+    """Bộ quản lý phiên phỏng vấn dùng chung trong tiến trình."""
+    global _session_manager
+    if _session_manager is None:
+        _session_manager = InterviewSessionManager()
+    return _session_manager
@@ -0,0 +1,71 @@
+import json
+import asyncio
+import hashlib
+from typing import Optional
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlmodel import Session, select
+from app.config import settings
+from app.database import engine
+from app.models import JobDescription
+from app.services.llm_cache import LRUTTLCache, normalize_text
+from app.services.cv_jd_processor import process_uploaded_file, extract_jd_requirements
+
+# Cache văn bản JD đã trích xuất theo hash nội dung file: cùng một file JD chỉ được phân tích một lần
+_extracted_jd_cache = LRUTTLCache(settings.JD_EXTRACTION_CACHE_SIZE, settings.LLM_CACHE_TTL_SECONDS)
+
+def jd_content_hash(jd_text: str) -> str:
+    """Hash SHA-256 của văn bản JD đã chuẩn hóa khoảng trắng (khóa để loại bỏ JD trùng lặp)."""
+    return hashlib.sha256(normalize_text(jd_text).encode("utf-8")).hexdigest()
+
+async def extract_jd_text(file_content: bytes, filename: str) -> Optional[str]:
+    """Trích xuất văn bản JD, dùng lại kết quả nếu cùng nội dung file đã được trích xuất trước đó."""
+    file_hash = hashlib.sha256(file_content).hexdigest()
+    jd_text = _extracted_jd_cache.get(file_hash)
+    if jd_text is None:
+        jd_text = await process_uploaded_file(file_content, filename)
+        if jd_text:
+            _extracted_jd_cache.set(file_hash, jd_text)
+    return jd_text
+
+def get_or_create_jd(db: Session, jd_text: str, title: Optional[str] = None) -> JobDescription:
+    """
+    Tìm JD theo hash nội dung hoặc tạo mới nếu chưa có, để mỗi JD chỉ được lưu một lần.
+    Bản ghi mới được flush (chưa commit) để có ID ngay; nơi gọi chịu trách nhiệm commit.
+    Với AsyncSession, gọi qua `await db.run_sync(get_or_create_jd, jd_text, title)`.
+    """
+    content_hash = jd_content_hash(jd_text)
+    jd = db.exec(select(JobDescription).where(JobDescription.content_hash == content_hash)).first()
+    if jd:
+        return jd
+    jd = JobDescription(content_hash=content_hash, title=title, text=jd_text)
+    try:
+        with db.begin_nested(): # Savepoint: request khác có thể vừa tạo cùng JD
+            db.add(jd)
+    except IntegrityError:
+        jd = db.exec(select(JobDescription).where(JobDescription.content_hash == content_hash)).one()
+    return jd
+
+def _save_jd_requirements(jd_id: int, requirements: str):
+    with Session(engine) as db:
+        db.exec(update(JobDescription).where(JobDescription.id == jd_id).values(requirements=requirements))
+        db.commit()
+
+async def get_jd_requirements(jd: JobDescription, strict: bool = False) -> Optional[dict]:
+    """
+    Lấy bộ yêu cầu có cấu trúc của JD: đọc từ bản đã lưu, hoặc trích xuất bằng GPT một lần rồi lưu lại
+    để mọi ứng viên của cùng JD dùng chung. Trả về None nếu tính năng bị tắt hoặc trích xuất thất bại
+    (`strict`: ném lại lỗi của GPT).
+    """
+    if not settings.JD_REQUIREMENTS_ENABLED:
+        return None
+    if jd.requirements:
+        return json.loads(jd.requirements)
+    requirements = await extract_jd_requirements(jd.text, strict)
+    if requirements:
+        value = json.dumps(requirements, ensure_ascii=False)
+        await asyncio.to_thread(_save_jd_requirements, jd.id, value)
+        set_committed_value(jd, "requirements", value) # Cập nhật đối tượng của nơi gọi mà không đánh dấu cần ghi lại
+    return requirements
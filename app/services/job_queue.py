@@ -0,0 +1,216 @@
+import json
+import uuid
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional
+
+from sqlalchemy import update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.config import settings
+from app.database import async_engine
+from app.models import AnalysisJob, Candidate, JobDescription, MatchResult
+from app.services.cv_jd_processor import analyze_cv_jd
+from app.services.jd_store import get_jd_requirements
+from app.services.llm_gateway import CircuitOpenError
+
+TERMINAL_STATUSES = ("succeeded", "failed")
+
+class QueueFullError(Exception):
+    """Hàng đợi đã đạt giới hạn số job đang chờ."""
+
+class AnalysisJobQueue:
+    """
+    Hàng đợi job phân tích CV/JD chạy trong tiến trình: một nhóm worker asyncio lấy job từ hàng đợi,
+    trạng thái job được lưu trong bảng AnalysisJob nên có thể tiếp tục sau khi khởi động lại.
+    Mỗi bước đọc/ghi DB dùng một AsyncSession ngắn, không giữ kết nối trong lúc gọi GPT.
+    """
+
+    def __init__(self):
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._workers: List[asyncio.Task] = []
+        self._subscribers: Dict[str, List[asyncio.Queue]] = defaultdict(list)
+        self._retries: Dict[str, asyncio.TimerHandle] = {} # Job đang chờ tới lượt thử lại
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    async def submit(self, candidate_id: int, jd_id: int) -> AnalysisJob:
+        """Tạo job mới ở trạng thái 'pending' và đưa vào hàng đợi. Ném QueueFullError nếu hàng đợi đầy."""
+        if self.depth >= settings.JOB_QUEUE_MAX_DEPTH:
+            raise QueueFullError()
+        job = AnalysisJob(id=uuid.uuid4().hex, candidate_id=candidate_id, jd_id=jd_id, stage="queued")
+        async with AsyncSession(async_engine, expire_on_commit=False) as db:
+            db.add(job)
+            await db.commit()
+        self._queue.put_nowait(job.id)
+        return job
+
+    async def start(self):
+        """Khởi động các worker và đưa lại vào hàng đợi các job chưa xong từ lần chạy trước."""
+        for job_id in await self._recover_unfinished_jobs():
+            self._queue.put_nowait(job_id)
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(settings.JOB_WORKERS)]
+
+    async def stop(self):
+        """Dừng các worker; job đang chạy dở hoặc đang chờ thử lại sẽ được chạy lại ở lần khởi động sau."""
+        for handle in self._retries.values():
+            handle.cancel()
+        self._retries.clear()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _recover_unfinished_jobs(self) -> List[str]:
+        stale_before = datetime.utcnow() - timedelta(seconds=settings.JOB_STALE_SECONDS)
+        async with AsyncSession(async_engine) as db:
+            # Job 'running' quá lâu: tiến trình xử lý đã dừng giữa chừng -> chuyển lại về 'pending'
+            await db.exec(
+                update(AnalysisJob)
+                .where(AnalysisJob.status == "running", AnalysisJob.started_at < stale_before)
+                .values(status="pending", stage="queued")
+            )
+            await db.commit()
+            job_ids = (await db.exec(
+                select(AnalysisJob.id).where(AnalysisJob.status == "pending").order_by(AnalysisJob.created_at)
+            )).all()
+        if job_ids:
+            print(f"Hàng đợi phân tích: tiếp tục {len(job_ids)} job chưa hoàn thành.")
+        return list(job_ids)
+
+    async def _claim(self, job_id: str) -> bool:
+        """Chuyển job từ 'pending' sang 'running' một cách nguyên tử (tránh hai worker cùng chạy một job)."""
+        async with AsyncSession(async_engine) as db:
+            result = await db.exec(
+                update(AnalysisJob)
+                .where(AnalysisJob.id == job_id, AnalysisJob.status == "pending")
+                .values(status="running", stage="analyzing", started_at=datetime.utcnow(), attempts=AnalysisJob.attempts + 1)
+            )
+            await db.commit()
+            return result.rowcount == 1
+
+    async def _update(self, job_id: str, **values) -> AnalysisJob:
+        async with AsyncSession(async_engine, expire_on_commit=False) as db:
+            job = await db.get(AnalysisJob, job_id)
+            for field, value in values.items():
+                setattr(job, field, value)
+            db.add(job)
+            await db.commit()
+        self._publish(job)
+        return job
+
+    def _publish(self, job: AnalysisJob):
+        event = job_event(job)
+        for subscriber in self._subscribers.get(job.id, []):
+            subscriber.put_nowait(event)
+
+    async def _worker(self, worker_index: int):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                if await self._claim(job_id):
+                    await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Lỗi không xác định trong worker phân tích {worker_index} (job {job_id}): {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        async with AsyncSession(async_engine) as db:
+            job = await db.get(AnalysisJob, job_id)
+            candidate = await db.get(Candidate, job.candidate_id)
+            jd = await db.get(JobDescription, job.jd_id)
+        # Phiên đã đóng: các đối tượng vẫn đọc được, kết nối DB không bị giữ trong lúc gọi GPT
+        self._publish(job)
+        try:
+            await self._update(job_id, stage="extracting_requirements")
+            jd_requirements = await get_jd_requirements(jd, strict=True)
+            await self._update(job_id, stage="scoring")
+            # strict: lỗi GPT (kể cả cầu dao mở) được ném ra để job được thử lại, không lưu điểm 0/điểm ước lượng
+            analysis = await analyze_cv_jd(candidate.cv_text, jd.text, jd_requirements=jd_requirements, strict=True)
+        except Exception as e:
+            logging.error(f"Job phân tích {job_id} thất bại (lần {job.attempts}): {e}")
+            if job.attempts < settings.JOB_MAX_ATTEMPTS:
+                await self._update(job_id, status="pending", stage="queued")
+                self._schedule_retry(job_id, self._retry_delay(job.attempts, e))
+            else:
+                await self._update(job_id, status="failed", stage="failed", error=str(e) or type(e).__name__, finished_at=datetime.utcnow())
+            return
+
+        match_result = MatchResult(
+            candidate_id=candidate.id,
+            match_score=analysis.get("score", 0),
+            feedback=analysis.get("feedback", "Không có phản hồi từ AI."),
+            suggestions=json.dumps(analysis.get("suggestions", [])),
+            jd_id=jd.id
+        )
+        async with AsyncSession(async_engine, expire_on_commit=False) as db:
+            db.add(match_result)
+            await db.commit()
+        await self._update(job_id, status="succeeded", stage="done", match_result_id=match_result.id, finished_at=datetime.utcnow())
+
+    @staticmethod
+    def _retry_delay(attempts: int, error: Exception) -> float:
+        """
+        Thời gian chờ trước lần thử lại: hết thời gian chờ của cầu dao nếu cầu dao đang mở (thử lại sớm hơn chỉ bị
+        từ chối ngay và mất thêm một lần thử), nếu không thì tăng theo cấp số nhân từ JOB_RETRY_BASE_SECONDS.
+        """
+        if isinstance(error, CircuitOpenError):
+            return settings.LLM_BREAKER_COOLDOWN_SECONDS
+        return settings.JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+
+    def _schedule_retry(self, job_id: str, delay: float):
+        def requeue():
+            self._retries.pop(job_id, None)
+            self._queue.put_nowait(job_id)
+        self._retries[job_id] = asyncio.get_running_loop().call_later(delay, requeue)
+
+    async def _read_event(self, job_id: str) -> Optional[dict]:
+        async with AsyncSession(async_engine) as db:
+            job = await db.get(AnalysisJob, job_id)
+            return job_event(job) if job else None
+
+    async def events(self, job_id: str, poll_interval: float = 2.0) -> AsyncIterator[dict]:
+        """
+        Luồng sự kiện tiến độ của một job cho đến khi kết thúc.
+        Nhận sự kiện ngay nếu job chạy trong tiến trình này; nếu không thì đọc lại trạng thái từ DB định kỳ
+        (job có thể đang chạy ở worker uvicorn khác).
+        """
+        subscriber: asyncio.Queue = asyncio.Queue()
+        self._subscribers[job_id].append(subscriber)
+        try:
+            last_event = None
+            event = await self._read_event(job_id) # Trạng thái hiện tại trước, rồi mới chờ thay đổi
+            while event is not None:
+                if event != last_event:
+                    last_event = event
+                    yield event
+                if event["status"] in TERMINAL_STATUSES:
+                    return
+                try:
+                    event = await asyncio.wait_for(subscriber.get(), timeout=poll_interval)
+                except asyncio.TimeoutError:
+                    event = await self._read_event(job_id)
+        finally:
+            self._subscribers[job_id].remove(subscriber)
+            if not self._subscribers[job_id]:
+                del self._subscribers[job_id]
+
+def job_event(job: AnalysisJob) -> dict:
+    """Sự kiện tiến độ gửi cho client theo dõi job."""
+    return {"job_id": job.id, "status": job.status, "stage": job.stage, "error": job.error}
+
+_job_queue: Optional[AnalysisJobQueue] = None
+
+def get_job_queue() -> AnalysisJobQueue:
+    """Hàng đợi job phân tích dùng chung trong tiến trình."""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = AnalysisJobQueue()
+    return _job_queue
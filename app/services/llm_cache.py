@@ -0,0 +1,178 @@
+import re
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence
+
+from sqlmodel import Session
+from app.config import settings
+from app.database import engine
+from app.models import LLMCacheEntry
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def normalize_text(text: Optional[str]) -> str:
+    """Chuẩn hóa văn bản đầu vào (gộp khoảng trắng) để các bản tải lên giống nhau cho cùng một khóa."""
+    return _WHITESPACE_RE.sub(" ", text or "").strip()
+
+def make_cache_key(namespace: str, prompt_version: str, model: str, inputs: Sequence[str]) -> str:
+    """Tạo khóa cache từ hash SHA-256 của đầu vào đã chuẩn hóa, phiên bản prompt và tên model."""
+    payload = json.dumps(
+        [namespace, prompt_version, model, [normalize_text(i) for i in inputs]],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class LRUTTLCache:
+    """Bộ nhớ đệm trong tiến trình: loại bỏ mục ít dùng nhất (LRU) và hết hạn theo TTL."""
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key) # Đánh dấu vừa được sử dụng
+        return value
+
+    def set(self, key: str, value: Any):
+        self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False) # Loại bỏ mục cũ nhất
+
+    def pop(self, key: str) -> Optional[Any]:
+        item = self._data.pop(key, None)
+        return item[1] if item else None
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+_memory_cache = LRUTTLCache(settings.LLM_CACHE_MAX_ENTRIES, settings.LLM_CACHE_TTL_SECONDS)
+_stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"memory_hits": 0, "db_hits": 0, "coalesced": 0, "misses": 0})
+_in_flight: Dict[str, asyncio.Future] = {} # Gộp các cuộc gọi trùng khóa đang chạy đồng thời
+
+class _LeaderCancelled(Exception):
+    """Cuộc gọi đang tính kết quả cho một khóa bị hủy: các cuộc gọi đang chờ nó phải tự tính lại."""
+
+def _load_from_db(key: str) -> Optional[dict]:
+    with Session(engine) as session:
+        entry = session.get(LLMCacheEntry, key)
+        if entry is None:
+            return None
+        if entry.created_at < datetime.utcnow() - timedelta(seconds=settings.LLM_CACHE_DB_TTL_SECONDS):
+            session.delete(entry)
+            session.commit()
+            return None
+        return json.loads(entry.value)
+
+def _save_to_db(key: str, namespace: str, model: str, value: dict):
+    with Session(engine) as session:
+        session.merge(LLMCacheEntry(key=key, namespace=namespace, model=model, value=json.dumps(value, ensure_ascii=False)))
+        session.commit()
+
+async def get_or_compute(
+    namespace: str,
+    prompt_version: str,
+    inputs: Sequence[str],
+    compute: Callable[[], Awaitable[dict]],
+    model: Optional[str] = None,
+) -> dict:
+    """
+    Trả về kết quả LLM đã lưu cho bộ (namespace, prompt_version, model, inputs) nếu có;
+    nếu không thì gọi `compute()` và lưu kết quả vào cả hai tầng cache.
+    Nếu `compute()` ném lỗi thì không có gì được lưu và lỗi được ném tiếp cho nơi gọi xử lý.
+    Các cuộc gọi trùng khóa trong lúc đang tính chờ chung một kết quả; nếu cuộc gọi đang tính bị hủy (ví dụ client
+    ngắt kết nối) thì một trong các cuộc gọi đang chờ tiếp tục tính thay, các cuộc gọi khác không bị hủy theo.
+    """
+    if not settings.LLM_CACHE_ENABLED:
+        return await compute()
+
+    model = model or settings.OPENAI_MODEL
+    key = make_cache_key(namespace, prompt_version, model, inputs)
+    stats = _stats[namespace]
+
+    while True:
+        value = _memory_cache.get(key)
+        if value is not None:
+            stats["memory_hits"] += 1
+            return value
+        if key not in _in_flight:
+            break
+        try: # Cùng một yêu cầu đang được tính: chờ kết quả thay vì gọi GPT lần nữa
+            value = await asyncio.shield(_in_flight[key])
+        except _LeaderCancelled:
+            continue # Cuộc gọi đầu tiên thức dậy trở thành cuộc gọi tính kết quả, các cuộc gọi sau lại chờ nó
+        stats["coalesced"] += 1
+        return value
+
+    future = asyncio.get_running_loop().create_future()
+    _in_flight[key] = future
+    try:
+        if settings.LLM_CACHE_PERSIST:
+            try:
+                value = await asyncio.to_thread(_load_from_db, key)
+            except Exception as e:
+                logging.error(f"Lỗi khi đọc cache LLM từ cơ sở dữ liệu: {e}")
+                value = None
+            if value is not None:
+                stats["db_hits"] += 1
+                _memory_cache.set(key, value)
+                future.set_result(value)
+                return value
+
+        stats["misses"] += 1
+        value = await compute()
+        _memory_cache.set(key, value)
+        if settings.LLM_CACHE_PERSIST:
+            try:
+                await asyncio.to_thread(_save_to_db, key, namespace, model, value)
+            except Exception as e:
+                logging.error(f"Lỗi khi ghi cache LLM vào cơ sở dữ liệu: {e}")
+        future.set_result(value)
+        return value
+    except asyncio.CancelledError:
+        future.set_exception(_LeaderCancelled()) # Không hủy future dùng chung: các cuộc gọi đang chờ không liên quan
+        future.exception()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception() # Tránh cảnh báo "exception was never retrieved" khi không ai chờ
+        raise
+    finally:
+        if _in_flight.get(key) is future:
+            del _in_flight[key]
+
+def get_cache_stats() -> dict:
+    """Số lần trúng/trượt cache theo từng namespace và kích thước tầng bộ nhớ."""
+    namespaces = {name: dict(counts) for name, counts in _stats.items()}
+    totals = {"memory_hits": 0, "db_hits": 0, "coalesced": 0, "misses": 0}
+    for counts in namespaces.values():
+        for field, count in counts.items():
+            totals[field] += count
+    lookups = sum(totals.values())
+    return {
+        "enabled": settings.LLM_CACHE_ENABLED,
+        "memory_entries": len(_memory_cache),
+        "hit_rate": round((totals["memory_hits"] + totals["db_hits"] + totals["coalesced"]) / lookups, 4) if lookups else 0.0,
+        "totals": totals,
+        "namespaces": namespaces,
+    }
+
+def clear_memory_cache():
+    """Xóa tầng cache trong bộ nhớ (tầng cơ sở dữ liệu giữ nguyên)."""
+    _memory_cache.clear()
@@ -0,0 +1,87 @@
+import json
+from typing import Optional
+
+import httpx
+from openai import AsyncOpenAI
+from app.config import settings
+from app.services.llm_gateway import get_llm_gateway
+
+# Một client HTTP dùng chung cho toàn bộ tiến trình: các kết nối tới OpenAI được giữ lại (keep-alive)
+# và tái sử dụng giữa các request thay vì mở kết nối TLS mới cho mỗi cuộc gọi.
+_http_client: Optional[httpx.AsyncClient] = None
+_client: Optional[AsyncOpenAI] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Lấy (hoặc tạo) client HTTP bất đồng bộ có pool kết nối dùng chung."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            ),
+            timeout=httpx.Timeout(settings.LLM_TIMEOUT),
+        )
+    return _http_client
+
+def get_llm_base_url() -> Optional[str]:
+    """Endpoint của backend LLM: None là API OpenAI thật, "fake" là máy chủ giả lập cục bộ (xem fake_llm)."""
+    if settings.LLM_BASE_URL:
+        return settings.LLM_BASE_URL
+    if settings.LLM_BACKEND == "fake":
+        return f"http://{settings.FAKE_LLM_HOST}:{settings.FAKE_LLM_PORT}/v1"
+    return None
+
+def get_llm_api_key() -> Optional[str]:
+    """Máy chủ giả lập không kiểm tra khóa, nhưng client OpenAI vẫn yêu cầu có khóa."""
+    return settings.OPENAI_API_KEY or ("fake-key" if settings.LLM_BACKEND == "fake" else None)
+
+def get_llm_client() -> AsyncOpenAI:
+    """Lấy (hoặc tạo) client OpenAI bất đồng bộ dùng chung cho mọi dịch vụ."""
+    global _client
+    if _client is None or _http_client is None or _http_client.is_closed:
+        # max_retries=0: việc thử lại do LLMGateway đảm nhiệm (có backoff, giới hạn tốc độ và cầu dao)
+        _client = AsyncOpenAI(
+            api_key=get_llm_api_key(),
+            base_url=get_llm_base_url(),
+            http_client=get_http_client(),
+            max_retries=0,
+        )
+    return _client
+
+async def close_llm_client():
+    """Đóng pool kết nối khi ứng dụng tắt."""
+    global _client, _http_client
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+    _client = None
+    _http_client = None
+
+def estimate_tokens(*texts: str) -> int:
+    """Ước lượng nhanh số token của prompt (khoảng 3 ký tự/token) để trừ vào hạn mức token mỗi phút."""
+    return sum(len(text or "") for text in texts) // 3
+
+async def chat_completion_json(
+    system_prompt: str,
+    user_prompt: str,
+    model: Optional[str] = None,
+    **kwargs,
+) -> dict:
+    """
+    Gọi Chat Completions ở chế độ JSON mà không chặn event loop, thông qua LLMGateway dùng chung.
+    Trả về dictionary đã được giải mã từ nội dung phản hồi.
+    Ném CircuitOpenError nếu OpenAI đang gặp sự cố (cầu dao mở).
+    """
+    response = await get_llm_gateway().call(
+        lambda: get_llm_client().chat.completions.create(
+            model=model or settings.OPENAI_MODEL,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            response_format={"type": "json_object"}, # Yêu cầu GPT trả về JSON
+            **kwargs
+        ),
+        estimated_tokens=estimate_tokens(system_prompt, user_prompt) + kwargs.get("max_tokens", 500),
+    )
+    return json.loads(response.choices[0].message.content)
@@ -0,0 +1,266 @@
+import time
+import random
+import asyncio
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+import openai
+from app.config import settings
+
+T = TypeVar("T")
+
+class CircuitOpenError(Exception):
+    """Cầu dao đang mở: tạm thời không gửi yêu cầu tới OpenAI để hệ thống kịp hồi phục."""
+
+class TokenBucket:
+    """Giới hạn tốc độ kiểu token bucket: nạp `rate` đơn vị mỗi giây, tối đa `capacity` đơn vị."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        amount = min(amount, self.capacity) # Yêu cầu lớn hơn dung lượng: chỉ chờ đầy bucket
+        async with self._lock: # Xếp hàng theo thứ tự để yêu cầu lớn không bị bỏ đói
+            while True:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((amount - self._tokens) / self.rate)
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Giới hạn số cuộc gọi đồng thời theo kiểu AIMD: tăng dần khi các cuộc gọi nhanh và thành công,
+    giảm một nửa khi bị 429 và giảm nhẹ khi độ trễ vượt mục tiêu.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, target_latency: float):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self, latency: float):
+        if latency > self.target_latency:
+            self.limit = max(self.minimum, self.limit * 0.9)
+        else:
+            self.limit = min(self.maximum, self.limit + 1.0 / max(1.0, self.limit))
+
+    def on_rate_limited(self):
+        self.limit = max(self.minimum, self.limit / 2)
+
+class CircuitBreaker:
+    """Cầu dao: mở sau `failure_threshold` lỗi liên tiếp, sau `cooldown` giây cho một yêu cầu thử (half-open)."""
+
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def before_call(self):
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.cooldown:
+                raise CircuitOpenError()
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probe_in_flight:
+                raise CircuitOpenError()
+            self._probe_in_flight = True
+
+    def on_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def on_ignored(self):
+        """Cuộc gọi lỗi vì lý do không liên quan tới tình trạng OpenAI (ví dụ 400): không tính là lỗi."""
+        self._probe_in_flight = False
+
+    def on_failure(self):
+        self._probe_in_flight = False
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logging.error(f"Cầu dao LLM mở sau {self.failures} lỗi liên tiếp; tạm dừng {self.cooldown}s.")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+# Lỗi tạm thời nên thử lại; các lỗi khác (ví dụ 400 do prompt sai) ném ra ngay
+_RETRYABLE_ERRORS = (openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+class LLMGateway:
+    """
+    Cổng duy nhất cho mọi lưu lượng tới OpenAI trong tiến trình: giới hạn tốc độ theo số yêu cầu và số token,
+    điều chỉnh số cuộc gọi đồng thời, thử lại với backoff có jitter và cầu dao ngắt nhanh khi OpenAI gặp sự cố.
+    """
+
+    def __init__(self):
+        self.request_bucket = TokenBucket(settings.LLM_REQUESTS_PER_MINUTE / 60, max(1, settings.LLM_REQUESTS_PER_MINUTE / 6))
+        self.token_bucket = TokenBucket(settings.LLM_TOKENS_PER_MINUTE / 60, max(1, settings.LLM_TOKENS_PER_MINUTE / 6))
+        self.concurrency = AdaptiveConcurrencyLimiter(
+            settings.LLM_MAX_CONCURRENCY // 2 or 1,
+            settings.LLM_MIN_CONCURRENCY,
+            settings.LLM_MAX_CONCURRENCY,
+            settings.LLM_TARGET_LATENCY_SECONDS,
+        )
+        self.breaker = CircuitBreaker(settings.LLM_BREAKER_FAILURE_THRESHOLD, settings.LLM_BREAKER_COOLDOWN_SECONDS)
+        self.stats = {"calls": 0, "succeeded": 0, "failed": 0, "retries": 0, "rate_limited": 0, "rejected_open_circuit": 0}
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Thời gian chờ trước lần thử lại: theo Retry-After nếu có, nếu không thì exponential backoff với full jitter."""
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(settings.LLM_BACKOFF_MAX_SECONDS, float(retry_after)) + random.uniform(0, 0.5)
+            except ValueError:
+                pass
+        return random.uniform(0, min(settings.LLM_BACKOFF_MAX_SECONDS, settings.LLM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+    async def _admit(self, estimated_tokens: int):
+        """Kiểm tra cầu dao rồi chờ hạn mức yêu cầu, hạn mức token và một chỗ trong giới hạn đồng thời."""
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            self.stats["rejected_open_circuit"] += 1
+            raise
+        try:
+            await self.request_bucket.acquire(1)
+            await self.token_bucket.acquire(estimated_tokens)
+            await self.concurrency.acquire()
+        except BaseException: # Bị hủy khi đang chờ: trả lại lượt thử của cầu dao (half-open) để không kẹt mãi
+            self.breaker.on_ignored()
+            raise
+
+    def _record_success(self, started: float):
+        self.concurrency.on_success(time.monotonic() - started)
+        self.breaker.on_success()
+        self.stats["succeeded"] += 1
+
+    def _record_failure(self, error: Exception) -> bool:
+        """Cập nhật giới hạn/cầu dao theo loại lỗi; trả về True nếu lỗi tạm thời và có thể thử lại."""
+        if isinstance(error, openai.RateLimitError):
+            self.stats["rate_limited"] += 1
+            self.concurrency.on_rate_limited()
+            self.breaker.on_failure()
+            return True
+        if isinstance(error, _RETRYABLE_ERRORS):
+            self.breaker.on_failure()
+            return True
+        # Lỗi không thể thử lại (ví dụ 400): không phải dấu hiệu OpenAI quá tải, không tính vào cầu dao
+        self.breaker.on_ignored()
+        return False
+
+    async def _wait_before_retry(self, attempt: int, error: Exception):
+        self.stats["retries"] += 1
+        delay = self._backoff(attempt, error)
+        logging.error(f"Lỗi OpenAI ({type(error).__name__}), thử lại lần {attempt + 1} sau {delay:.1f}s: {error}")
+        await asyncio.sleep(delay)
+
+    async def call(self, func: Callable[[], Awaitable[T]], estimated_tokens: int = 0) -> T:
+        """
+        Thực hiện `func()` (một cuộc gọi OpenAI) qua các lớp bảo vệ.
+        Ném CircuitOpenError ngay lập tức nếu cầu dao đang mở, để nơi gọi trả về kết quả dự phòng.
+        """
+        self.stats["calls"] += 1
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            await self._admit(estimated_tokens)
+            started = time.monotonic()
+            settled = False
+            try:
+                result = await func()
+            except Exception as e:
+                settled = True
+                if not self._record_failure(e):
+                    self.stats["failed"] += 1
+                    raise
+                error = e
+            else:
+                settled = True
+                self._record_success(started)
+                return result
+            finally:
+                if not settled: # Bị hủy (CancelledError) giữa chừng: không tính là lỗi, trả lại lượt thử half-open
+                    self.breaker.on_ignored()
+                await self.concurrency.release()
+            if attempt == settings.LLM_MAX_RETRIES:
+                break
+            await self._wait_before_retry(attempt, error)
+        self.stats["failed"] += 1
+        raise error
+
+    async def stream(self, func: Callable[[], AsyncIterator[T]], estimated_tokens: int = 0) -> AsyncIterator[T]:
+        """
+        Như `call` nhưng cho một luồng kết quả (streaming): giữ chỗ trong giới hạn đồng thời cho đến khi luồng kết thúc.
+        Chỉ thử lại khi lỗi xảy ra trước phần tử đầu tiên, vì phần đã gửi cho client không thể thu hồi.
+        """
+        self.stats["calls"] += 1
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            await self._admit(estimated_tokens)
+            started = time.monotonic()
+            yielded, settled = False, False
+            try:
+                async for item in func():
+                    yielded = True
+                    yield item
+            except Exception as e:
+                settled = True
+                if not self._record_failure(e) or yielded:
+                    self.stats["failed"] += 1
+                    raise
+                error = e
+            else:
+                settled = True
+                self._record_success(started)
+                return
+            finally:
+                if not settled: # Client ngắt kết nối giữa chừng
+                    self.breaker.on_ignored()
+                await self.concurrency.release()
+            if attempt == settings.LLM_MAX_RETRIES:
+                break
+            await self._wait_before_retry(attempt, error)
+        self.stats["failed"] += 1
+        raise error
+
+    def get_stats(self) -> dict:
+        return dict(
+            self.stats,
+            concurrency_limit=round(self.concurrency.limit, 2),
+            in_flight=self.concurrency.in_flight,
+            circuit_state=self.breaker.state,
+            consecutive_failures=self.breaker.failures,
+        )
+
+_gateway: Optional[LLMGateway] = None
+
+def get_llm_gateway() -> LLMGateway:
+    """Cổng LLM dùng chung trong tiến trình."""
+    global _gateway
+    if _gateway is None:
+        _gateway = LLMGateway()
+    return _gateway
@@ -0,0 +1,86 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext # Để mã hóa và kiểm tra mật khẩu
+from app.config import settings
+
+# Đối tượng để mã hóa/giải mã mật khẩu. Độ khó bcrypt lấy từ cấu hình: hash cũ có độ khó khác
+# được coi là cần cập nhật (needs_update) và sẽ được mã hóa lại ở lần đăng nhập thành công kế tiếp.
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.PASSWORD_BCRYPT_ROUNDS)
+
+class PasswordHasherBusyError(Exception):
+    """Đã có quá nhiều yêu cầu mã hóa/kiểm tra mật khẩu đang chờ."""
+
+class PasswordHasher:
+    """
+    Chạy bcrypt (tốn CPU, hàng trăm ms mỗi lần) trong một pool thread riêng có giới hạn, để đăng nhập hàng loạt
+    không chặn event loop và các request khác. bcrypt nhả GIL khi tính toán nên các thread chạy song song thật.
+    Số yêu cầu đang chờ/đang chạy bị giới hạn: vượt quá thì từ chối ngay (PasswordHasherBusyError) thay vì xếp hàng vô hạn.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._max_pending = max_pending
+        self._pending = 0
+        self._stats = {"hashed": 0, "verified": 0, "rehashed": 0, "rejected": 0, "total_seconds": 0.0}
+
+    async def _run(self, func, *args):
+        if self._pending >= self._max_pending:
+            self._stats["rejected"] += 1
+            raise PasswordHasherBusyError()
+        self._pending += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self._pending -= 1
+            self._stats["total_seconds"] += time.perf_counter() - started
+
+    async def hash(self, password: str) -> str:
+        """Mã hóa mật khẩu."""
+        hashed = await self._run(pwd_context.hash, password)
+        self._stats["hashed"] += 1
+        return hashed
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Kiểm tra mật khẩu. Trả về (khớp hay không, hash mới); hash mới khác None khi mật khẩu đúng
+        nhưng hash cũ dùng tham số khác cấu hình hiện tại và cần được lưu lại.
+        """
+        valid, new_hash = await self._run(pwd_context.verify_and_update, plain_password, hashed_password)
+        self._stats["verified"] += 1
+        if new_hash is not None:
+            self._stats["rehashed"] += 1
+        return valid, new_hash
+
+    def get_stats(self) -> dict:
+        completed = self._stats["hashed"] + self._stats["verified"]
+        return {
+            **self._stats,
+            "total_seconds": round(self._stats["total_seconds"], 3),
+            "pending": self._pending,
+            "max_pending": self._max_pending,
+            "bcrypt_rounds": settings.PASSWORD_BCRYPT_ROUNDS,
+            "avg_ms": round(self._stats["total_seconds"] / completed * 1000, 1) if completed else None,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+_hasher: Optional[PasswordHasher] = None
+
+def get_password_hasher() -> PasswordHasher:
+    """Lấy (hoặc tạo) pool mã hóa mật khẩu dùng chung."""
+    global _hasher
+    if _hasher is None:
+        _hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_PENDING)
+    return _hasher
+
+def shutdown_password_hasher():
+    """Tắt pool mã hóa mật khẩu khi ứng dụng dừng."""
+    global _hasher
+    if _hasher is not None:
+        _hasher.shutdown()
+        _hasher = None
@@ -0,0 +1,203 @@
+import re
+import math
+import asyncio
+import logging
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+from app.config import settings
+from app.services import llm_cache
+from app.services.llm_client import chat_completion_json
+
+try: # tiktoken là tùy chọn: nếu không có (hoặc không tải được bảng mã) thì dùng ước lượng
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+SUMMARY_PROMPT_VERSION = "chunk-summary-v1"
+
+_encoder = None # Bảng mã tiktoken, nạp một lần lúc khởi động (load_tokenizer); None: dùng ước lượng
+_APPROX_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_PAGE_NUMBER_RE = re.compile(r"^\s*(page|trang)?\s*\d+\s*((of|/|trên)\s*\d+)?\s*$", re.IGNORECASE)
+_DECORATION_RE = re.compile(r"^[\s\-_=*•·.~|]+$")
+_SPACES_RE = re.compile(r"[ \t\u00a0]+")
+PAGE_BREAK = "\f" # Ngăn cách các trang trong văn bản trích xuất từ PDF (xem text_extraction)
+_PAGE_EDGE_LINES = 2 # Số dòng đầu/cuối mỗi trang được xét là header/footer
+
+_stats: Dict[str, Dict[str, int]] = defaultdict(
+    lambda: {"documents": 0, "tokens_in": 0, "tokens_out": 0, "trimmed": 0, "summarized": 0, "truncated": 0}
+)
+
+def _load_encoder():
+    try:
+        return tiktoken.encoding_for_model(settings.OPENAI_MODEL)
+    except KeyError: # Model không có trong bảng của tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+
+async def load_tokenizer():
+    """
+    Nạp bảng mã tiktoken lúc khởi động ứng dụng, trong thread và có giới hạn thời gian: lần đầu tiktoken tải file BPE
+    qua mạng. Thiếu tiktoken, lỗi hoặc quá thời gian thì dùng ước lượng số token cho đến khi khởi động lại.
+    """
+    global _encoder
+    if tiktoken is None or _encoder is not None:
+        return
+    try:
+        _encoder = await asyncio.wait_for(asyncio.to_thread(_load_encoder), settings.TOKENIZER_LOAD_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logging.error(f"Tải bảng mã tiktoken quá {settings.TOKENIZER_LOAD_TIMEOUT_SECONDS}s, dùng ước lượng số token.")
+    except Exception as e:
+        logging.error(f"Không tải được bảng mã tiktoken, dùng ước lượng số token: {e}")
+
+def count_tokens(text: str) -> int:
+    """Đếm số token của văn bản (tiktoken nếu có, nếu không thì ước lượng theo số từ và dấu câu)."""
+    if not text:
+        return 0
+    encoder = _encoder
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    return math.ceil(len(_APPROX_TOKEN_RE.findall(text)) * 1.3)
+
+def _is_noise(line: str) -> bool:
+    return bool(_PAGE_NUMBER_RE.match(line) or _DECORATION_RE.match(line))
+
+def _page_edge_repeats(pages: List[List[str]]) -> set:
+    """
+    Header/footer: dòng ngắn nằm trong vài dòng đầu hoặc cuối của ít nhất một nửa số trang (tối thiểu 3 trang).
+    Dòng lặp lại trong thân trang (kỹ năng, chức danh...) không bị tính.
+    """
+    if len(pages) < 3:
+        return set()
+    counts = Counter()
+    for page in pages:
+        body = [line for line in page if line and not _is_noise(line)]
+        counts.update(set(body[:_PAGE_EDGE_LINES] + body[-_PAGE_EDGE_LINES:]))
+    threshold = max(3, math.ceil(len(pages) / 2))
+    return {line for line, count in counts.items() if count >= threshold and len(line) < 80}
+
+def clean_text(text: str) -> str:
+    """
+    Loại bỏ phần thừa trước khi đưa văn bản vào prompt: số trang, dòng trang trí,
+    header/footer lặp lại ở đầu/cuối các trang (văn bản có ngăn cách trang PAGE_BREAK),
+    khoảng trắng và dòng trống liên tiếp.
+    """
+    pages = [
+        [_SPACES_RE.sub(" ", line).strip() for line in page.splitlines()]
+        for page in (text or "").split(PAGE_BREAK)
+    ]
+    repeats = _page_edge_repeats(pages)
+    cleaned = []
+    for page in pages:
+        body = [i for i, line in enumerate(page) if line and not _is_noise(line)]
+        edges = set(body[:_PAGE_EDGE_LINES] + body[-_PAGE_EDGE_LINES:])
+        for i, line in enumerate(page):
+            if not line:
+                if cleaned and cleaned[-1] != "":
+                    cleaned.append("")
+                continue
+            if _is_noise(line):
+                continue
+            if i in edges and line in repeats: # Header/footer của trang
+                continue
+            cleaned.append(line)
+    return "\n".join(cleaned).strip()
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cắt văn bản để không vượt quá `max_tokens` token."""
+    encoder = _encoder
+    if encoder is not None:
+        tokens = encoder.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else encoder.decode(tokens[:max_tokens])
+    if count_tokens(text) <= max_tokens:
+        return text
+    ratio = max_tokens / count_tokens(text)
+    return text[:int(len(text) * ratio)]
+
+def split_into_chunks(text: str, chunk_tokens: int) -> List[str]:
+    """Chia văn bản thành các đoạn không quá `chunk_tokens` token, ưu tiên cắt theo đoạn văn."""
+    chunks, current, current_tokens = [], [], 0
+    for paragraph in text.split("\n"):
+        paragraph_tokens = count_tokens(paragraph) + 1
+        if paragraph_tokens > chunk_tokens: # Đoạn văn quá dài: cắt cứng
+            if current:
+                chunks.append("\n".join(current))
+                current, current_tokens = [], 0
+            step = max(1, len(paragraph) * chunk_tokens // paragraph_tokens)
+            chunks.extend(paragraph[i:i + step] for i in range(0, len(paragraph), step))
+            continue
+        if current_tokens + paragraph_tokens > chunk_tokens:
+            chunks.append("\n".join(current))
+            current, current_tokens = [], 0
+        current.append(paragraph)
+        current_tokens += paragraph_tokens
+    if current:
+        chunks.append("\n".join(current))
+    return [chunk for chunk in chunks if chunk.strip()]
+
+async def summarize_chunk(chunk: str, kind: str, max_tokens: int) -> str:
+    """Tóm tắt một đoạn tài liệu, giữ lại các thông tin quan trọng cho việc tuyển dụng."""
+    prompt = f"""
+    Hãy tóm tắt đoạn trích sau từ một {kind} để dùng cho việc đánh giá tuyển dụng.
+    Giữ nguyên tên kỹ năng, công nghệ, chức danh, số năm kinh nghiệm, bằng cấp, thành tích có số liệu.
+    Bỏ các câu chung chung. Tóm tắt không quá {max_tokens} token.
+    Phản hồi của bạn PHẢI là một đối tượng JSON có một trường:
+    - "summary": Văn bản tóm tắt.
+
+    Đoạn trích:
+    ---
+    {chunk}
+    ---
+    """
+    result = await llm_cache.get_or_compute(
+        "chunk_summary", SUMMARY_PROMPT_VERSION, (kind, str(max_tokens), chunk),
+        lambda: chat_completion_json("Bạn là trợ lý tóm tắt tài liệu tuyển dụng.", prompt, temperature=0)
+    )
+    return str(result.get("summary", ""))
+
+async def fit_to_budget(text: str, max_tokens: int, kind: str) -> str:
+    """
+    Chuẩn bị một tài liệu cho prompt trong giới hạn `max_tokens` token:
+    1. Làm sạch phần thừa (khoảng trắng, số trang, header/footer lặp lại).
+    2. Nếu vẫn vượt ngân sách: chia đoạn, tóm tắt từng đoạn song song (map) rồi ghép lại (reduce).
+    3. Nếu bản tóm tắt vẫn dài hơn ngân sách (hoặc tóm tắt lỗi): cắt bớt phần cuối.
+    """
+    stats = _stats[kind]
+    tokens_in = count_tokens(text or "")
+    stats["documents"] += 1
+    stats["tokens_in"] += tokens_in
+
+    fitted = clean_text(text)
+    tokens = count_tokens(fitted)
+    if tokens < tokens_in:
+        stats["trimmed"] += 1
+
+    if tokens > max_tokens:
+        chunks = split_into_chunks(fitted, settings.PROMPT_CHUNK_TOKENS)
+        per_chunk = max(64, max_tokens // max(1, len(chunks)))
+        try:
+            summaries = await asyncio.gather(*(summarize_chunk(chunk, kind, per_chunk) for chunk in chunks))
+            fitted = "\n".join(s for s in summaries if s)
+            stats["summarized"] += 1
+        except Exception as e:
+            logging.error(f"Lỗi khi tóm tắt {kind} dài, chuyển sang cắt bớt: {e}")
+        if count_tokens(fitted) > max_tokens:
+            fitted = truncate_to_tokens(fitted, max_tokens)
+            stats["truncated"] += 1
+
+    stats["tokens_out"] += count_tokens(fitted)
+    return fitted
+
+def get_prompt_stats() -> dict:
+    """Thống kê số token trước/sau khi xử lý và số token tiết kiệm được, theo từng loại tài liệu."""
+    kinds = {}
+    for kind, counts in _stats.items():
+        kinds[kind] = dict(counts, tokens_saved=counts["tokens_in"] - counts["tokens_out"])
+    tokens_in = sum(c["tokens_in"] for c in kinds.values())
+    tokens_out = sum(c["tokens_out"] for c in kinds.values())
+    return {
+        "tokenizer": "tiktoken" if _encoder is not None else "approximate",
+        "tokens_in": tokens_in,
+        "tokens_out": tokens_out,
+        "tokens_saved": tokens_in - tokens_out,
+        "kinds": kinds,
+    }
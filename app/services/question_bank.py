@@ -0,0 +1,141 @@
+import json
+import time
+import asyncio
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.config import settings
+from app.models import Question, QuestionBankVersion
+from app.services.llm_cache import LRUTTLCache
+
+UNRATED = "unrated" # Tầng của các câu hỏi chưa gán độ khó
+# Cùng dạng JSON với QuestionPublic; dùng chung một encoder nhanh hơn nhiều so với pydantic/json.dumps cho từng câu
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+class CategoryBank:
+    """
+    Câu hỏi của một danh mục ở dạng sẵn dùng, đánh số theo vị trí 0..n-1 (thứ tự id): JSON công khai đã tạo sẵn
+    (options đã giải mã), mảng id gọn, vị trí theo id, các tầng độ khó (mảng vị trí) và bảng đáp án.
+    """
+
+    def __init__(self, version: int, rows: list):
+        self.version = version
+        self.checked_at = time.monotonic()
+        self.ids = array("q")
+        self.payloads: List[bytes] = []
+        self.answer_key: Dict[int, str] = {} # {question_id: correct_answer}
+        self.strata: Dict[str, array] = {} # {độ khó: vị trí các câu hỏi}
+        self.difficulties: List[str] = [] # Độ khó theo vị trí
+        for position, (qid, text, options, correct, category, difficulty) in enumerate(rows):
+            question = {"id": qid, "question_text": text, "options": json.loads(options), "skill_category": category}
+            self.ids.append(qid)
+            self.payloads.append(_encoder.encode(question).encode("utf-8"))
+            self.answer_key[qid] = correct
+            self.difficulties.append(difficulty or UNRATED)
+            self.strata.setdefault(difficulty or UNRATED, array("l")).append(position)
+        self.index_of: Dict[int, int] = {qid: position for position, qid in enumerate(self.ids)}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def public_json(self, limit: int) -> bytes:
+        """Mảng JSON (QuestionPublic) của `limit` câu hỏi đầu tiên, ghép từ các payload đã tạo sẵn."""
+        return b"[" + b",".join(self.payloads[:max(limit, 0)]) + b"]"
+
+    def public_json_at(self, positions: Sequence[int]) -> bytes:
+        """Mảng JSON (QuestionPublic) của các câu hỏi ở các vị trí cho trước, theo đúng thứ tự."""
+        return b"[" + b",".join(self.payloads[p] for p in positions) + b"]"
+
+_banks = LRUTTLCache(settings.QUESTION_BANK_CACHE_SIZE, settings.QUESTION_BANK_CACHE_TTL_SECONDS)
+_stats = {"hits": 0, "loads": 0, "version_checks": 0, "invalidations": 0}
+
+async def _stored_version(db: AsyncSession, skill_category: str) -> int:
+    version = (await db.exec(
+        select(QuestionBankVersion.version).where(QuestionBankVersion.skill_category == skill_category)
+    )).first()
+    return version or 0 # Danh mục chưa có bản ghi phiên bản (câu hỏi tạo trước khi có bảng này)
+
+async def get_question_bank(db: AsyncSession, skill_category: str) -> CategoryBank:
+    """
+    Ngân hàng câu hỏi của danh mục. Trong QUESTION_BANK_VERSION_CHECK_SECONDS giây sau lần kiểm tra gần nhất
+    dùng thẳng bản trong bộ nhớ; sau đó so phiên bản trong DB (một truy vấn theo khóa chính) và chỉ tải lại khi khác.
+    """
+    bank = _banks.get(skill_category)
+    if bank is not None and time.monotonic() - bank.checked_at < settings.QUESTION_BANK_VERSION_CHECK_SECONDS:
+        _stats["hits"] += 1
+        return bank
+
+    # Đọc phiên bản trước khi tải câu hỏi: nếu có thay đổi xen giữa, bản tải về mang phiên bản cũ và sẽ được tải lại
+    version = await _stored_version(db, skill_category)
+    _stats["version_checks"] += 1
+    if bank is not None and bank.version == version:
+        bank.checked_at = time.monotonic()
+        _stats["hits"] += 1
+        return bank
+
+    rows = (await db.exec(
+        select(
+            Question.id, Question.question_text, Question.options, Question.correct_answer,
+            Question.skill_category, Question.difficulty,
+        )
+        .where(Question.skill_category == skill_category)
+        .order_by(Question.id)
+    )).all()
+    bank = await asyncio.to_thread(CategoryBank, version, rows) # Ngân hàng lớn (100k+ câu) mất vài giây: không chặn event loop
+    _banks.set(skill_category, bank)
+    _stats["loads"] += 1
+    return bank
+
+async def get_correct_answers(
+    db: AsyncSession, question_ids: Iterable[int], skill_category: Optional[str] = None
+) -> Dict[int, str]:
+    """
+    Đáp án đúng cho các câu hỏi được nộp: lấy từ bảng đáp án của danh mục bài kiểm tra, các câu còn thiếu
+    (bài kiểm tra cũ chưa lưu danh mục, câu hỏi thuộc danh mục khác) được tải chung trong một truy vấn IN.
+    Câu hỏi không tồn tại không có trong kết quả.
+    """
+    question_ids = set(question_ids)
+    answer_key = (await get_question_bank(db, skill_category)).answer_key if skill_category else {}
+    correct = {qid: answer_key[qid] for qid in question_ids if qid in answer_key}
+    missing = question_ids - correct.keys()
+    if missing:
+        rows = (await db.exec(
+            select(Question.id, Question.correct_answer).where(Question.id.in_(missing))
+        )).all()
+        correct.update(rows)
+    return correct
+
+def bump_question_bank_versions(session: Session, skill_categories: Iterable[str]):
+    """
+    Tăng phiên bản ngân hàng câu hỏi của các danh mục trong giao dịch hiện tại để các worker khác tải lại.
+    Một lệnh INSERT ... ON CONFLICT (skill_category) DO UPDATE nên hai request cùng tạo câu hỏi đầu tiên của một
+    danh mục mới không va chạm khóa chính. Nơi gọi commit cùng với thay đổi câu hỏi rồi gọi invalidate_question_bank cho worker này.
+    """
+    rows = [{"skill_category": skill_category, "version": 1} for skill_category in skill_categories]
+    if not rows:
+        return
+    insert = postgresql_insert if session.get_bind().dialect.name == "postgresql" else sqlite_insert
+    session.exec(
+        insert(QuestionBankVersion).on_conflict_do_update(
+            index_elements=[QuestionBankVersion.skill_category],
+            set_={"version": QuestionBankVersion.version + 1},
+        ),
+        params=rows,
+    )
+
+async def bump_question_bank_version(db: AsyncSession, skill_category: str):
+    """Như bump_question_bank_versions, cho một danh mục với AsyncSession."""
+    await db.run_sync(bump_question_bank_versions, [skill_category])
+
+def invalidate_question_bank(skill_category: str):
+    """Xóa ngân hàng câu hỏi đã cache của danh mục trong worker này."""
+    if _banks.pop(skill_category) is not None:
+        _stats["invalidations"] += 1
+
+def get_question_bank_stats() -> dict:
+    """Số lần dùng cache, số lần tải lại/kiểm tra phiên bản và số danh mục đang được cache."""
+    return {**_stats, "categories": len(_banks)}
@@ -0,0 +1,246 @@
+"""
+Nhập/xuất ngân hàng câu hỏi hàng loạt.
+
+Nhập: đọc file CSV/NDJSON/JSON theo luồng (không nạp cả file vào bộ nhớ), kiểm tra từng bản ghi theo
+QuestionCreate, bỏ câu trùng theo hash nội dung (trong chính file, và với DB qua ràng buộc unique của content_hash)
+và ghi theo lô bằng một lệnh INSERT ... ON CONFLICT DO NOTHING nhiều dòng mỗi lô. Chạy đồng bộ trong thread
+(asyncio.to_thread) với engine đồng bộ.
+Xuất: đọc theo trang khóa (id > id cuối) và trả về từng lô, cùng định dạng với file nhập.
+"""
+import io
+import csv
+import json
+import time
+import hashlib
+from typing import AsyncIterator, BinaryIO, Dict, Iterator, List, Optional, Sequence
+
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.config import settings
+from app.database import engine, async_engine
+from app.models import Question
+from app.schemas import QuestionCreate
+from app.services.llm_cache import normalize_text
+from app.services.question_bank import bump_question_bank_versions
+
+IMPORT_FORMATS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson", ".json": "json"}
+EXPORT_MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson", "json": "application/json"}
+CSV_COLUMNS = ["question_text", "options", "correct_answer", "skill_category", "difficulty"]
+
+class QuestionImportError(ValueError):
+    """File nhập không dùng được (định dạng không hỗ trợ, thiếu cột bắt buộc...)."""
+
+def question_content_hash(skill_category: str, question_text: str, options: Sequence[str], correct_answer: str) -> str:
+    """Hash SHA-256 của nội dung câu hỏi đã chuẩn hóa khoảng trắng (khóa để phát hiện câu hỏi trùng)."""
+    payload = json.dumps(
+        [normalize_text(skill_category), normalize_text(question_text), [normalize_text(o) for o in options], normalize_text(correct_answer)],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def detect_format(filename: Optional[str], declared: Optional[str] = None) -> str:
+    """Định dạng file nhập: theo tham số `format` nếu có, nếu không theo đuôi tên file."""
+    if declared:
+        return declared
+    for suffix, fmt in IMPORT_FORMATS.items():
+        if (filename or "").lower().endswith(suffix):
+            return fmt
+    raise QuestionImportError("Không nhận ra định dạng file: dùng đuôi .csv, .ndjson/.jsonl, .json hoặc tham số format.")
+
+def _iter_csv(stream: io.TextIOBase) -> Iterator[dict]:
+    reader = csv.DictReader(stream)
+    missing = {"question_text", "options", "correct_answer", "skill_category"} - set(reader.fieldnames or [])
+    if missing:
+        raise QuestionImportError(f"File CSV thiếu cột: {', '.join(sorted(missing))}")
+    yield from reader
+
+def _iter_ndjson(stream: io.TextIOBase) -> Iterator[str]:
+    # Trả về dòng thô: giải mã khi kiểm tra bản ghi để một dòng lỗi không làm dừng việc đọc cả file
+    for line in stream:
+        if line.strip():
+            yield line
+
+def _iter_json_array(stream: io.TextIOBase, chunk_size: int = 1 << 16) -> Iterator[dict]:
+    """Đọc mảng JSON theo từng phần tử: giải mã dần từ bộ đệm, đọc thêm khi phần tử bị cắt ngang giữa hai khối."""
+    decoder = json.JSONDecoder()
+    buffer = stream.read(chunk_size).lstrip()
+    if not buffer.startswith("["):
+        raise QuestionImportError("File JSON phải là một mảng các câu hỏi.")
+    buffer, eof = buffer[1:], False
+    while True:
+        buffer = buffer.lstrip()
+        if buffer.startswith(","):
+            buffer = buffer[1:].lstrip()
+        if buffer.startswith("]"):
+            return
+        try:
+            record, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise QuestionImportError("File JSON không hợp lệ hoặc bị cắt ngang.")
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield record
+        buffer = buffer[end:]
+
+_READERS = {"csv": _iter_csv, "ndjson": _iter_ndjson, "json": _iter_json_array}
+
+def _parse_question(record) -> QuestionCreate:
+    """Kiểm tra một bản ghi (dòng NDJSON được giải mã tại đây); options trong CSV là mảng JSON hoặc các lựa chọn ngăn cách bởi "|"."""
+    if isinstance(record, str):
+        try:
+            record = json.loads(record)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"JSON không hợp lệ: {e}")
+    if not isinstance(record, dict):
+        raise ValueError("Mỗi câu hỏi phải là một object.")
+    options = record.get("options")
+    if isinstance(options, str):
+        options = json.loads(options) if options.lstrip().startswith("[") else [o.strip() for o in options.split("|")]
+    # Chỉ lấy các cột đã biết: cột thừa (kể cả khóa None của DictReader khi dòng CSV có nhiều trường hơn tiêu đề) bị bỏ qua
+    fields = {key: record[key] for key in CSV_COLUMNS if key in record}
+    question = QuestionCreate(**{**fields, "options": options, "difficulty": record.get("difficulty") or None})
+    if not question.question_text.strip() or not question.skill_category.strip():
+        raise ValueError("question_text và skill_category không được để trống.")
+    if question.correct_answer not in question.options:
+        raise ValueError("correct_answer phải là một trong các options.")
+    return question
+
+def _insert_ignoring_duplicates(session: Session):
+    """INSERT ... ON CONFLICT (content_hash) DO NOTHING RETURNING content_hash, theo dialect của engine (SQLite/PostgreSQL)."""
+    insert = postgresql_insert if session.get_bind().dialect.name == "postgresql" else sqlite_insert
+    return insert(Question).on_conflict_do_nothing(index_elements=[Question.content_hash]).returning(Question.content_hash)
+
+def _insert_batch(session: Session, batch: Dict[str, QuestionCreate]) -> List[QuestionCreate]:
+    """
+    Ghi các câu hỏi (theo hash) bằng một lệnh INSERT nhiều dòng; câu đã có trong DB (kể cả do một lần nhập khác
+    chạy đồng thời vừa ghi) được bỏ qua nhờ ràng buộc unique. Trả về các câu đã thực sự được ghi.
+    """
+    inserted = session.exec(_insert_ignoring_duplicates(session), params=[
+        {
+            "question_text": q.question_text, "options": json.dumps(q.options), "correct_answer": q.correct_answer,
+            "skill_category": q.skill_category, "difficulty": q.difficulty, "content_hash": content_hash,
+        }
+        for content_hash, q in batch.items()
+    ]).scalars().all()
+    session.commit()
+    return [batch[content_hash] for content_hash in inserted]
+
+def import_questions(file: BinaryIO, fmt: str) -> dict:
+    """
+    Nhập câu hỏi từ file (đồng bộ, gọi qua asyncio.to_thread). Mỗi lô QUESTION_IMPORT_BATCH_SIZE câu được commit
+    riêng; phiên bản ngân hàng câu hỏi của các danh mục có câu mới được tăng một lần ở cuối (kể cả khi dừng giữa chừng).
+    Kết quả theo QuestionImportResult, kèm `categories`: các danh mục có câu mới (để xóa cache ở worker gọi).
+    """
+    started = time.perf_counter()
+    stream = io.TextIOWrapper(file, encoding="utf-8-sig", newline="" if fmt == "csv" else None)
+    result = {"format": fmt, "received": 0, "inserted": 0, "duplicates": 0, "invalid": 0, "errors": []}
+    categories = set()
+    seen_hashes = set() # Hash các câu đã gặp trong file này
+    batch: Dict[str, QuestionCreate] = {}
+
+    def flush():
+        inserted = _insert_batch(session, batch)
+        categories.update(q.skill_category for q in inserted)
+        result["inserted"] += len(inserted)
+        result["duplicates"] += len(batch) - len(inserted) # Đã có trong DB
+        batch.clear()
+
+    def add_error(row: Optional[int], error: str):
+        if len(result["errors"]) < settings.QUESTION_IMPORT_MAX_ERRORS:
+            result["errors"].append({"row": row, "error": error})
+
+    with Session(engine) as session:
+        try:
+            records = _READERS[fmt](stream)
+            while True:
+                try:
+                    record = next(records)
+                except StopIteration:
+                    break
+                except (QuestionImportError, csv.Error, UnicodeDecodeError) as e:
+                    if result["received"] == 0 and isinstance(e, QuestionImportError):
+                        raise # File sai ngay từ đầu: báo lỗi cho cả request
+                    add_error(None, f"Dừng đọc file: {e}")
+                    break
+                result["received"] += 1
+                try:
+                    question = _parse_question(record)
+                except (ValueError, TypeError) as e: # Gồm cả lỗi JSON và ValidationError của pydantic
+                    result["invalid"] += 1
+                    add_error(result["received"], str(e))
+                    continue
+                content_hash = question_content_hash(
+                    question.skill_category, question.question_text, question.options, question.correct_answer
+                )
+                if content_hash in seen_hashes:
+                    result["duplicates"] += 1
+                    continue
+                seen_hashes.add(content_hash)
+                batch[content_hash] = question
+                if len(batch) >= settings.QUESTION_IMPORT_BATCH_SIZE:
+                    flush()
+            if batch:
+                flush()
+        except Exception:
+            session.rollback() # Lô lỗi (ví dụ "database is locked"): giao dịch phải rollback trước khi tăng phiên bản bên dưới
+            raise
+        finally:
+            if categories:
+                bump_question_bank_versions(session, sorted(categories))
+                session.commit()
+            stream.detach() # Không đóng file tải lên (UploadFile tự đóng)
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    result["categories"] = sorted(categories)
+    return result
+
+def _export_rows(fmt: str, rows: list, first: bool) -> bytes:
+    if fmt == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(
+            [text, options, correct, category, difficulty or ""] for _, text, options, correct, category, difficulty in rows
+        )
+        return buffer.getvalue().encode("utf-8")
+    records = [
+        json.dumps({
+            "question_text": text, "options": json.loads(options), "correct_answer": correct,
+            "skill_category": category, "difficulty": difficulty,
+        }, ensure_ascii=False)
+        for _, text, options, correct, category, difficulty in rows
+    ]
+    if fmt == "ndjson":
+        return ("\n".join(records) + "\n").encode("utf-8")
+    return (("" if first else ",\n") + ",\n".join(records)).encode("utf-8")
+
+async def export_questions(fmt: str, skill_category: Optional[str] = None) -> AsyncIterator[bytes]:
+    """
+    Xuất câu hỏi (kèm đáp án) theo từng lô QUESTION_EXPORT_BATCH_SIZE câu, đọc theo trang khóa id để mỗi lô là một
+    truy vấn dùng khóa chính. Phiên DB riêng vì phản hồi dạng luồng chạy sau khi dependency của request đã đóng.
+    """
+    if fmt == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(CSV_COLUMNS)
+        yield buffer.getvalue().encode("utf-8")
+    elif fmt == "json":
+        yield b"[\n"
+    last_id, first = 0, True
+    async with AsyncSession(async_engine) as db:
+        while True:
+            statement = select(
+                Question.id, Question.question_text, Question.options, Question.correct_answer,
+                Question.skill_category, Question.difficulty,
+            ).where(Question.id > last_id)
+            if skill_category:
+                statement = statement.where(Question.skill_category == skill_category)
+            rows = (await db.exec(statement.order_by(Question.id).limit(settings.QUESTION_EXPORT_BATCH_SIZE))).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            yield _export_rows(fmt, rows, first)
+            first = False
+    if fmt == "json":
+        yield b"\n]\n"
@@ -0,0 +1,115 @@
+"""
+Chọn câu hỏi cho bài kiểm tra kỹ năng từ ngân hàng câu hỏi trong bộ nhớ (CategoryBank).
+
+- "first": `limit` câu đầu tiên theo id (cách cũ).
+- "random": ngẫu nhiên đều trên cả danh mục.
+- "stratified": chia `limit` theo tầng độ khó (mặc định theo tỷ lệ số câu mỗi tầng, hoặc theo trọng số
+  truyền vào dạng "easy:3,medium:5,hard:2") rồi chọn ngẫu nhiên trong từng tầng.
+
+Cùng seed, cùng ngân hàng câu hỏi và cùng danh sách câu đã gặp thì cho cùng kết quả. Câu ứng viên đã gặp
+được tránh; chỉ khi không đủ câu mới mới dùng lại câu đã gặp. Việc chọn làm trên vị trí trong mảng nên
+chi phí kỳ vọng là O(limit + số câu đã gặp), không phụ thuộc kích thước ngân hàng (trừ khi gần cạn câu).
+"""
+import random
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+from app.services.question_bank import CategoryBank
+
+SAMPLING_STRATEGIES = ("first", "random", "stratified")
+
+def parse_difficulty_mix(text: Optional[str]) -> Optional[Dict[str, float]]:
+    """Đọc trọng số các tầng độ khó dạng "easy:3,medium:5,hard:2". Sai định dạng thì báo ValueError."""
+    if not text:
+        return None
+    weights = {}
+    for part in text.split(","):
+        name, _, weight = part.partition(":")
+        name = name.strip()
+        if not name or not weight:
+            raise ValueError(f"Sai định dạng tỷ lệ độ khó: '{part}' (cần dạng easy:3,medium:5)")
+        weights[name] = float(weight)
+        if weights[name] < 0:
+            raise ValueError(f"Trọng số độ khó không được âm: '{part}'")
+    return weights
+
+def _sample_positions(rng: random.Random, pool: Sequence[int], k: int, excluded: Set[int]) -> List[int]:
+    """
+    Chọn tối đa k vị trí khác nhau trong pool, bỏ qua các vị trí trong excluded.
+    Khi pool lớn hơn nhiều so với k + |excluded|, bốc ngẫu nhiên rồi loại trùng (mỗi lần bốc trúng với xác suất > 1/2,
+    kỳ vọng O(k)); ngược lại lọc pool (O(len(pool))) rồi chọn.
+    """
+    n = len(pool)
+    if k <= 0 or n == 0:
+        return []
+    if n > 2 * (k + len(excluded)):
+        chosen, picked = [], set()
+        while len(chosen) < k:
+            position = pool[rng.randrange(n)]
+            if position in picked or position in excluded:
+                continue
+            picked.add(position)
+            chosen.append(position)
+        return chosen
+    available = [position for position in pool if position not in excluded]
+    return rng.sample(available, min(k, len(available)))
+
+def _allocate(limit: int, available: Dict[str, int], weights: Dict[str, float]) -> Dict[str, int]:
+    """
+    Chia `limit` câu cho các tầng theo trọng số (phương pháp phần dư lớn nhất). Tầng không đủ câu thì lấy hết
+    và phần thiếu được chia lại cho các tầng còn lại. Duyệt tầng theo tên để kết quả ổn định với cùng seed.
+    """
+    quotas = {name: 0 for name in available}
+    active = [name for name in sorted(available) if available[name] > 0 and weights.get(name, 0) > 0]
+    remaining = limit
+    while remaining > 0 and active:
+        total = sum(weights[name] for name in active)
+        shares = {name: remaining * weights[name] / total for name in active}
+        wanted = {name: int(shares[name]) for name in active}
+        leftover = remaining - sum(wanted.values())
+        for name in sorted(active, key=lambda name: shares[name] - wanted[name], reverse=True)[:leftover]:
+            wanted[name] += 1
+        remaining = 0
+        for name in active:
+            take = min(wanted[name], available[name] - quotas[name])
+            quotas[name] += take
+            remaining += wanted[name] - take
+        active = [name for name in active if quotas[name] < available[name]]
+    return quotas
+
+def sample_questions(
+    bank: CategoryBank,
+    limit: int,
+    strategy: str = "random",
+    seed: Optional[int] = None,
+    seen_ids: Iterable[int] = (),
+    difficulty_mix: Optional[Dict[str, float]] = None,
+) -> List[int]:
+    """Vị trí (trong bank) của các câu hỏi được chọn cho một bài kiểm tra, theo thứ tự giao cho ứng viên."""
+    limit = min(max(limit, 0), len(bank))
+    if strategy == "first":
+        return list(range(limit))
+
+    rng = random.Random(seed) # seed=None: lấy ngẫu nhiên từ hệ điều hành
+    everything = range(len(bank))
+    excluded = {bank.index_of[qid] for qid in seen_ids if qid in bank.index_of}
+
+    if strategy == "stratified":
+        names = sorted(bank.strata)
+        unseen_per_stratum = {name: len(bank.strata[name]) for name in names}
+        for position in excluded:
+            unseen_per_stratum[bank.difficulties[position]] -= 1
+        weights = difficulty_mix or {name: len(bank.strata[name]) for name in names}
+        quotas = _allocate(limit, unseen_per_stratum, weights)
+        chosen = []
+        for name in names:
+            chosen += _sample_positions(rng, bank.strata[name], quotas[name], excluded)
+        rng.shuffle(chosen) # Trộn để các độ khó xen kẽ nhau
+    else:
+        chosen = _sample_positions(rng, everything, limit, excluded)
+
+    if len(chosen) < limit:
+        # Thiếu câu (tỷ lệ độ khó không khớp ngân hàng hoặc ứng viên đã gặp gần hết): bù câu chưa gặp, rồi câu đã gặp
+        taken = set(chosen)
+        chosen += _sample_positions(rng, everything, limit - len(chosen), taken | excluded)
+        chosen += _sample_positions(rng, everything, limit - len(chosen), set(chosen))
+    return chosen
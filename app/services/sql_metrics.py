@@ -0,0 +1,165 @@
+"""
+Đo các câu lệnh SQL theo từng request HTTP: số truy vấn, tổng thời gian CSDL, các câu lệnh chậm nhất
+và phát hiện mẫu N+1 (cùng một câu lệnh lặp lại nhiều lần trong một request).
+
+Sự kiện của SQLAlchemy trên cả hai engine ghi vào bộ đếm của request hiện tại (ContextVar, được sao chép sang
+asyncio.to_thread); truy vấn ngoài request (worker nền) được cộng vào mục "background".
+Thống kê gộp theo endpoint ở /api/metrics/sql; header X-DB-* trên từng response khi bật SQL_DEBUG_HEADERS.
+"""
+import re
+import time
+import heapq
+import logging
+import threading
+from contextvars import ContextVar
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.config import settings
+
+# Danh sách tham số có độ dài thay đổi (IN (?, ?, ?)) được gộp lại để cùng một câu lệnh có cùng khóa
+_PARAM_LIST_RE = re.compile(r"\((?:\s*(?:\?|\$\d+|%\(\w+\)s)\s*,)+\s*(?:\?|\$\d+|%\(\w+\)s)\s*\)")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def normalize_statement(statement: str) -> str:
+    return _PARAM_LIST_RE.sub("(?, ...)", _WHITESPACE_RE.sub(" ", statement).strip())
+
+class RequestSQLStats:
+    """Các truy vấn của một request."""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+        self.by_statement: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0]) # câu lệnh -> [số lần, tổng thời gian]
+
+    def record(self, statement: str, seconds: float):
+        self.queries += 1
+        self.seconds += seconds
+        entry = self.by_statement[statement]
+        entry[0] += 1
+        entry[1] += seconds
+
+    def slowest(self, limit: int) -> List[Tuple[float, str]]:
+        return heapq.nlargest(limit, ((total, statement) for statement, (_, total) in self.by_statement.items()))
+
+    def n_plus_one(self) -> List[Tuple[str, int]]:
+        """Các câu lệnh lặp lại từ SQL_N_PLUS_ONE_THRESHOLD lần trở lên trong request."""
+        return [
+            (statement, int(count)) for statement, (count, _) in self.by_statement.items()
+            if count >= settings.SQL_N_PLUS_ONE_THRESHOLD
+        ]
+
+_current: ContextVar[Optional[RequestSQLStats]] = ContextVar("request_sql_stats", default=None)
+_lock = threading.Lock()
+_background = RequestSQLStats()
+_endpoints: Dict[str, dict] = defaultdict(lambda: {
+    "requests": 0, "queries": 0, "max_queries": 0, "db_seconds": 0.0, "n_plus_one_requests": 0,
+})
+_slowest: List[Tuple[float, str, str]] = [] # Heap nhỏ nhất: (thời gian, endpoint, câu lệnh) của các câu lệnh chậm nhất
+_n_plus_one: Dict[Tuple[str, str], dict] = {} # (endpoint, câu lệnh) -> số lần phát hiện, số lần lặp lớn nhất
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = _current.get()
+    with _lock: # Request có thể chạy truy vấn trong thread (asyncio.to_thread) song song với event loop
+        (stats or _background).record(normalize_statement(statement), elapsed)
+    if elapsed * 1000 >= settings.SQL_SLOW_QUERY_MS:
+        logging.warning(f"Truy vấn SQL chậm ({elapsed * 1000:.0f} ms): {statement[:300]}")
+
+def _handle_error(exception_context):
+    # Câu lệnh lỗi không đi qua after_cursor_execute: bỏ mốc thời gian để ngăn xếp không lệch
+    starts = exception_context.connection.info.get("query_start") if exception_context.connection is not None else None
+    if starts:
+        starts.pop()
+
+def instrument_engine(engine: Engine):
+    """Gắn bộ đo vào một engine (engine bất đồng bộ: truyền async_engine.sync_engine)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+def _record_request(endpoint: str, stats: RequestSQLStats):
+    repeated = stats.n_plus_one()
+    with _lock:
+        row = _endpoints[endpoint]
+        row["requests"] += 1
+        row["queries"] += stats.queries
+        row["max_queries"] = max(row["max_queries"], stats.queries)
+        row["db_seconds"] += stats.seconds
+        if repeated:
+            row["n_plus_one_requests"] += 1
+        for seconds, statement in stats.slowest(settings.SQL_TOP_STATEMENTS):
+            item = (seconds, endpoint, statement)
+            if len(_slowest) < settings.SQL_TOP_STATEMENTS:
+                heapq.heappush(_slowest, item)
+            elif item > _slowest[0]:
+                heapq.heapreplace(_slowest, item)
+        for statement, count in repeated:
+            entry = _n_plus_one.setdefault((endpoint, statement), {"detected": 0, "max_repeats": 0})
+            entry["detected"] += 1
+            entry["max_repeats"] = max(entry["max_repeats"], count)
+    for statement, count in repeated:
+        logging.warning(f"Nghi vấn N+1 ở {endpoint}: câu lệnh lặp {count} lần trong một request: {statement[:200]}")
+
+class SQLMetricsMiddleware:
+    """Middleware ASGI: mở bộ đếm SQL cho mỗi request HTTP và (nếu bật) thêm header X-DB-* vào response."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestSQLStats()
+        token = _current.set(stats)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and settings.SQL_DEBUG_HEADERS:
+                slowest = stats.slowest(1)
+                headers = list(message.get("headers", []))
+                headers += [
+                    (b"x-db-queries", str(stats.queries).encode()),
+                    (b"x-db-time-ms", f"{stats.seconds * 1000:.2f}".encode()),
+                    (b"x-db-slowest-ms", f"{slowest[0][0] * 1000:.2f}".encode() if slowest else b"0"),
+                    (b"x-db-n-plus-one", str(len(stats.n_plus_one())).encode()),
+                ]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current.reset(token)
+            # Theo mẫu route (số khóa có giới hạn); URL không khớp route nào (404, quét đường dẫn) gộp chung một khóa
+            route = scope.get("route")
+            endpoint = f"{scope['method']} {getattr(route, 'path', '<unmatched>')}"
+            _record_request(endpoint, stats)
+
+def get_sql_stats() -> dict:
+    """Thống kê SQL gộp theo endpoint, các câu lệnh chậm nhất và các nghi vấn N+1."""
+    with _lock:
+        endpoints = {
+            endpoint: {
+                "requests": row["requests"],
+                "avg_queries": round(row["queries"] / row["requests"], 2),
+                "max_queries": row["max_queries"],
+                "avg_db_ms": round(row["db_seconds"] / row["requests"] * 1000, 2),
+                "total_db_ms": round(row["db_seconds"] * 1000, 1),
+                "n_plus_one_requests": row["n_plus_one_requests"],
+            } for endpoint, row in sorted(_endpoints.items(), key=lambda item: -item[1]["db_seconds"])
+        }
+        slowest = [
+            {"endpoint": endpoint, "statement": statement, "ms": round(seconds * 1000, 2)}
+            for seconds, endpoint, statement in sorted(_slowest, reverse=True)
+        ]
+        n_plus_one = [
+            {"endpoint": endpoint, "statement": statement, **entry}
+            for (endpoint, statement), entry in _n_plus_one.items()
+        ]
+        background = {"queries": _background.queries, "db_ms": round(_background.seconds * 1000, 1)}
+    return {"endpoints": endpoints, "slowest_statements": slowest, "n_plus_one": n_plus_one, "background": background}
@@ -0,0 +1,44 @@
+import io
+from typing import Optional
+from PyPDF2 import PdfReader
+from docx import Document
+
+# Các hàm ở đây là hàm đồng bộ, chạy trong tiến trình con của pool trích xuất (xem cv_jd_processor).
+# Module này chỉ import thư viện đọc file để tiến trình con khởi động nhanh và nhẹ.
+
+def extract_pdf_text(file: bytes, max_pages: Optional[int] = None) -> str:
+    """Trích xuất văn bản từ nội dung file PDF, chỉ đọc tối đa `max_pages` trang đầu."""
+    reader = PdfReader(io.BytesIO(file))
+    parts = []
+    for index, page in enumerate(reader.pages):
+        if max_pages is not None and index >= max_pages:
+            break
+        parts.append(page.extract_text() or "")
+    return "\f".join(parts) # Ghép một lần; "\f" ngăn cách trang để clean_text nhận ra header/footer (PAGE_BREAK)
+
+def extract_docx_text(file: bytes, max_paragraphs: Optional[int] = None) -> str:
+    """Trích xuất văn bản từ nội dung file DOCX, mỗi đoạn văn một dòng."""
+    doc = Document(io.BytesIO(file))
+    paragraphs = doc.paragraphs
+    if max_paragraphs is not None:
+        paragraphs = paragraphs[:max_paragraphs]
+    return "".join(para.text + "\n" for para in paragraphs)
+
+def extraction_worker_main(conn):
+    """
+    Vòng lặp của một tiến trình con trích xuất: nhận (hàm, nội dung file, giới hạn) qua Pipe, gửi lại (True, văn bản)
+    hoặc (False, lỗi). Mỗi tiến trình chỉ làm một việc một lúc nên có thể bị dừng riêng khi quá thời gian.
+    """
+    conn.send((True, None)) # Báo đã khởi động xong: thời gian khởi động không tính vào timeout của file đầu tiên
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError: # Tiến trình cha đã đóng Pipe
+            return
+        if task is None:
+            return
+        func, file, limit = task
+        try:
+            conn.send((True, func(file, limit)))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
@@ -0,0 +1,86 @@
+"""
+Micro-benchmark chi phí xác thực của một request cần đăng nhập.
+
+So sánh token cũ (chỉ có email, tra cứu người dùng trong DB ở mỗi request) với token mới mang user id
+(người dùng lấy từ cache trong tiến trình), ở hai mức:
+- gọi trực tiếp dependency get_current_user;
+- request đầy đủ GET /api/auth/users/me/ qua ASGI (không qua mạng).
+Đồng thời đếm số câu lệnh SQL trên mỗi request.
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.bench_auth --requests 2000
+"""
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+
+# Benchmark không gọi LLM; backend giả lập chỉ để ứng dụng khởi tạo được mà không cần OPENAI_API_KEY
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench-auth-'), 'bench.db')}")
+
+import httpx
+from sqlalchemy import event
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import async_engine, create_db_and_tables, engine
+from app.models import User
+from app.routers.auth import create_access_token, create_user_access_token, get_current_user, get_password_hash
+
+_statements = 0
+
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def _count_statement(*args):
+    global _statements
+    _statements += 1
+
+async def bench_dependency(token: str, requests: int) -> tuple:
+    global _statements
+    _statements = 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        async with AsyncSession(async_engine) as db: # Mỗi request có một phiên DB riêng (như get_async_session)
+            await get_current_user(token, db)
+    return (time.perf_counter() - started) / requests, _statements / requests
+
+async def bench_endpoint(app, token: str, requests: int) -> tuple:
+    global _statements
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        await client.get("/api/auth/users/me/", headers=headers) # Làm nóng
+        _statements = 0
+        started = time.perf_counter()
+        for _ in range(requests):
+            response = await client.get("/api/auth/users/me/", headers=headers)
+            response.raise_for_status()
+    return (time.perf_counter() - started) / requests, _statements / requests
+
+async def main(args):
+    engine.echo = async_engine.echo = False
+    create_db_and_tables()
+    with Session(engine) as db:
+        user = User(email=f"bench-{time.time_ns()}@example.com", hashed_password=get_password_hash("matkhau123"))
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        legacy_token = create_access_token(data={"sub": user.email}) # Token kiểu cũ: chỉ có email
+        new_token = create_user_access_token(user)
+
+    from app.main import app
+    print(f"{'':<40}{'token cũ':>16}{'token mới':>16}")
+    for label, run in (
+        ("get_current_user", lambda token: bench_dependency(token, args.requests)),
+        ("GET /api/auth/users/me/", lambda token: bench_endpoint(app, token, args.requests)),
+    ):
+        legacy_time, legacy_sql = await run(legacy_token)
+        new_time, new_sql = await run(new_token)
+        print(f"{label + ' (µs)':<40}{legacy_time * 1e6:>16.1f}{new_time * 1e6:>16.1f}")
+        print(f"{label + ' (SQL/request)':<40}{legacy_sql:>16.2f}{new_sql:>16.2f}")
+    await async_engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,121 @@
+"""
+Benchmark trích xuất văn bản PDF/DOCX.
+
+So sánh cách cũ (phân tích ngay trong event loop, ghép chuỗi bằng +=) với pool trích xuất mới
+trên một bộ file PDF/DOCX được sinh tự động, đồng thời đo độ trễ lớn nhất của event loop.
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.bench_extraction --files 20 --pages 40
+"""
+import io
+import time
+import asyncio
+import argparse
+
+from PyPDF2 import PdfReader
+from docx import Document
+
+from app.config import settings
+from app.services.cv_jd_processor import process_uploaded_file, shutdown_extraction_pool
+
+LINE = "Kinh nghiem 5 nam phat trien Python, FastAPI, PostgreSQL va trien khai he thong phan tan."
+
+def make_pdf(pages: int, lines_per_page: int = 45) -> bytes:
+    """Sinh một file PDF hợp lệ gồm `pages` trang văn bản (font Helvetica)."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None, # Đối tượng Pages được điền sau khi biết id các trang
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for page in range(pages):
+        lines = "".join(f"({LINE} {page}-{i}) Tj T* " for i in range(lines_per_page))
+        stream = f"BT /F1 10 Tf 12 TL 40 800 Td {lines}ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % i for i in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages)
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+def make_docx(paragraphs: int) -> bytes:
+    """Sinh một file DOCX gồm `paragraphs` đoạn văn."""
+    doc = Document()
+    for i in range(paragraphs):
+        doc.add_paragraph(f"{LINE} {i}")
+    out = io.BytesIO()
+    doc.save(out)
+    return out.getvalue()
+
+def legacy_extract(content: bytes, filename: str) -> str:
+    """Cách trích xuất cũ: chạy ngay trên event loop và ghép chuỗi bằng +=."""
+    text = ""
+    if filename.endswith(".pdf"):
+        for page in PdfReader(io.BytesIO(content)).pages:
+            text += page.extract_text() or ""
+    else:
+        for para in Document(io.BytesIO(content)).paragraphs:
+            text += para.text + "\n"
+    return text
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Đo độ trễ lớn nhất của event loop (thời gian một tác vụ khác phải chờ)."""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+async def run(corpus, mode: str):
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop))
+    started = time.perf_counter()
+    if mode == "legacy":
+        async def extract(content, filename):
+            return legacy_extract(content, filename)
+    else:
+        extract = process_uploaded_file
+    texts = await asyncio.gather(*(extract(content, filename) for filename, content in corpus))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    lag = await lag_task
+    chars = sum(len(t or "") for t in texts)
+    print(f"{mode:>7}: {len(corpus)} file, {elapsed:.2f}s tổng, {len(corpus) / elapsed:.1f} file/s, "
+          f"{chars} ký tự, độ trễ event loop lớn nhất {lag * 1000:.0f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=20, help="Số file mỗi loại (PDF và DOCX)")
+    parser.add_argument("--pages", type=int, default=40, help="Số trang mỗi file PDF")
+    parser.add_argument("--paragraphs", type=int, default=2000, help="Số đoạn văn mỗi file DOCX")
+    args = parser.parse_args()
+
+    settings.EXTRACTION_MAX_PAGES = max(settings.EXTRACTION_MAX_PAGES, args.pages)
+    corpus = [(f"cv_{i}.pdf", make_pdf(args.pages)) for i in range(args.files)]
+    corpus += [(f"cv_{i}.docx", make_docx(args.paragraphs)) for i in range(args.files)]
+    print(f"Bộ dữ liệu: {len(corpus)} file, {sum(len(c) for _, c in corpus) / 1e6:.1f} MB, "
+          f"pool={settings.EXTRACTION_POOL} x {settings.EXTRACTION_WORKERS}")
+
+    asyncio.run(run(corpus, "legacy"))
+    asyncio.run(run(corpus, "pool"))
+    shutdown_extraction_pool()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark độ trễ và số token của prompt phỏng vấn theo số lượt, với từng chiến lược lịch sử
+(INTERVIEW_HISTORY_STRATEGY: full / window / summary).
+
+Dùng máy chủ LLM giả lập có độ trễ tăng theo độ dài prompt (FAKE_LLM_LATENCY_PER_1K_TOKENS_MS) để mô phỏng
+chi phí xử lý prompt dài. Giữa các lượt, benchmark chờ lượt tóm tắt chạy nền hoàn tất (tương ứng thời gian ứng viên gõ câu trả lời).
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.bench_interview_history --turns 20
+"""
+import os
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+FAKE_LLM_PORT = 8097
+ANSWER = (
+    "Trong dự án gần nhất tôi phụ trách thiết kế API bằng FastAPI, tối ưu truy vấn PostgreSQL, "
+    "viết kiểm thử tự động và triển khai bằng Docker trên Kubernetes. Nhóm có năm người, "
+    "tôi hướng dẫn hai bạn junior và giảm thời gian phản hồi trung bình khoảng 40% sau ba tháng. "
+)
+
+async def run_interview(strategy: str, turns: int, candidate_id: int) -> list:
+    from sqlmodel import Session
+    from app.config import settings
+    from app.database import engine
+    from app.models import Interview
+    from app.services.chatbot_service import start_interview, chat_with_chatbot, get_prompt_history
+    from app.services.history_compaction import _compaction_tasks
+    from app.services.prompt_builder import count_tokens
+
+    settings.INTERVIEW_HISTORY_STRATEGY = strategy
+    session_id = str(uuid.uuid4())
+    with Session(engine) as db:
+        db.add(Interview(candidate_id=candidate_id, session_id=session_id))
+        db.commit()
+    await start_interview(session_id)
+
+    rows = []
+    for turn in range(1, turns + 1):
+        message = f"Lượt {turn}: {ANSWER * 2}"
+        prompt_tokens = sum(count_tokens(str(m.content)) for m in get_prompt_history(session_id).messages)
+        prompt_tokens += count_tokens(message)
+        started = time.perf_counter()
+        await chat_with_chatbot(session_id, message)
+        rows.append((time.perf_counter() - started, prompt_tokens))
+        await asyncio.gather(*list(_compaction_tasks.values()), return_exceptions=True)
+    return rows
+
+async def main(args):
+    from sqlmodel import Session
+    from app.database import create_db_and_tables, engine
+    from app.migrations import run_migrations
+    from app.models import Candidate
+    from app.services.prompt_builder import load_tokenizer
+
+    create_db_and_tables()
+    run_migrations()
+    await load_tokenizer() # Như lúc ứng dụng khởi động: đếm token bằng tiktoken nếu có
+    with Session(engine) as db:
+        candidate = Candidate(full_name="Benchmark", email="bench@example.com", applied_position="Software Engineer")
+        db.add(candidate)
+        db.commit()
+        db.refresh(candidate)
+        candidate_id = candidate.id
+
+    results = {strategy: await run_interview(strategy, args.turns, candidate_id) for strategy in args.strategies}
+
+    header = "".join(f"{strategy + ' ms':>14}{strategy + ' tok':>14}" for strategy in args.strategies)
+    print(f"\n{'lượt':>5}{header}")
+    for turn in range(args.turns):
+        cells = "".join(f"{results[s][turn][0] * 1000:>14.0f}{results[s][turn][1]:>14}" for s in args.strategies)
+        print(f"{turn + 1:>5}{cells}")
+    for strategy in args.strategies:
+        rows = results[strategy]
+        half = len(rows) // 2
+        early = sum(r[0] for r in rows[:half]) / max(1, half)
+        late = sum(r[0] for r in rows[half:]) / max(1, len(rows) - half)
+        print(f"{strategy}: trung bình nửa đầu {early * 1000:.0f} ms, nửa sau {late * 1000:.0f} ms "
+              f"(gấp {late / early:.2f} lần), prompt lượt cuối {rows[-1][1]} token")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=20, help="Số lượt chat (mỗi lượt = 2 tin nhắn)")
+    parser.add_argument("--strategies", nargs="+", default=["full", "window", "summary"])
+    parser.add_argument("--latency-ms", type=float, default=100, help="Độ trễ cơ bản của LLM giả lập")
+    parser.add_argument("--latency-per-1k-tokens-ms", type=float, default=300, help="Độ trễ thêm cho mỗi 1000 token prompt")
+    args = parser.parse_args()
+
+    # Cấu hình phải được đặt trước khi import ứng dụng
+    os.environ.update(
+        LLM_BACKEND="fake",
+        FAKE_LLM_PORT=str(FAKE_LLM_PORT),
+        FAKE_LLM_LATENCY_MS=str(args.latency_ms),
+        FAKE_LLM_LATENCY_SIGMA="0.1",
+        FAKE_LLM_LATENCY_PER_1K_TOKENS_MS=str(args.latency_per_1k_tokens_ms),
+        DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench-history-'), 'bench.db')}",
+        LLM_CACHE_PERSIST="false",
+    )
+    fake_llm = subprocess.Popen([sys.executable, "-m", "app.services.fake_llm"], env=os.environ.copy())
+    try:
+        time.sleep(2) # Chờ máy chủ LLM giả lập khởi động
+        asyncio.run(main(args))
+    finally:
+        fake_llm.terminate()
+        fake_llm.wait()
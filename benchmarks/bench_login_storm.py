@@ -0,0 +1,121 @@
+"""
+Kiểm thử tải đăng nhập hàng loạt: thông lượng đăng nhập và độ trễ p50/p99 của một endpoint không liên quan
+(GET /api/auth/users/me/) khi rảnh và khi đang có "bão" đăng nhập.
+
+bcrypt chạy trong pool thread riêng (PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING) nên request khác
+không phải chờ; khi pool quá tải, đăng nhập bị từ chối nhanh bằng 503 thay vì xếp hàng.
+
+Mặc định script tự khởi động ứng dụng (uvicorn, cơ sở dữ liệu SQLite tạm):
+    python -m benchmarks.bench_login_storm --users 20 --concurrency 32 --duration 10
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from collections import Counter
+from typing import List
+
+import httpx
+
+from benchmarks.load_test import percentile, wait_until_ready
+
+PASSWORD = "matkhau123"
+
+async def probe(client: httpx.AsyncClient, headers: dict, stop: asyncio.Event, interval: float) -> List[float]:
+    """Gọi đều đặn endpoint không liên quan tới mã hóa mật khẩu và ghi lại độ trễ."""
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get("/api/auth/users/me/", headers=headers)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+    return latencies
+
+async def login_storm(client: httpx.AsyncClient, emails: List[str], concurrency: int, stop: asyncio.Event):
+    statuses: Counter = Counter()
+    latencies: List[float] = []
+
+    async def worker(index: int):
+        while not stop.is_set():
+            email = emails[index % len(emails)]
+            started = time.perf_counter()
+            response = await client.post("/api/auth/token", data={"username": email, "password": PASSWORD})
+            statuses[response.status_code] += 1
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - started)
+            elif response.status_code == 503: # Pool mã hóa quá tải: chờ theo Retry-After
+                await asyncio.sleep(float(response.headers.get("retry-after", 1)))
+
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return statuses, latencies
+
+async def measure_probe(client: httpx.AsyncClient, headers: dict, duration: float, interval: float) -> List[float]:
+    stop = asyncio.Event()
+    task = asyncio.create_task(probe(client, headers, stop, interval))
+    await asyncio.sleep(duration)
+    stop.set()
+    return await task
+
+def summary(latencies: List[float]) -> str:
+    if not latencies:
+        return "không có dữ liệu"
+    return (f"{len(latencies)} requests, p50 {percentile(latencies, 50) * 1000:.1f} ms, "
+            f"p99 {percentile(latencies, 99) * 1000:.1f} ms")
+
+async def main(args):
+    process = None
+    base_url = args.base_url
+    if base_url is None:
+        env = dict(
+            os.environ,
+            LLM_BACKEND="fake",
+            DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='login-storm-'), 'bench.db')}",
+        )
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.app_port), "--log-level", "warning"],
+            env=env, stdout=subprocess.DEVNULL,
+        )
+        base_url = f"http://127.0.0.1:{args.app_port}"
+        await wait_until_ready(base_url + "/docs")
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency + 4)
+        async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+            run_id = time.time_ns()
+            emails = [f"storm-{run_id}-{i}@example.com" for i in range(args.users)]
+            for email in emails:
+                (await client.post("/api/auth/register", json={"email": email, "password": PASSWORD})).raise_for_status()
+            token = (await client.post("/api/auth/token", data={"username": emails[0], "password": PASSWORD})).json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}"}
+
+            idle = await measure_probe(client, headers, args.probe_seconds, args.probe_interval)
+
+            stop = asyncio.Event()
+            storm = asyncio.create_task(login_storm(client, emails, args.concurrency, stop))
+            started = time.perf_counter()
+            during = await measure_probe(client, headers, args.duration, args.probe_interval)
+            stop.set()
+            statuses, login_latencies = await storm
+            elapsed = time.perf_counter() - started
+
+        print(f"\nĐăng nhập: {statuses[200] / elapsed:.1f} lần/s thành công, mã trạng thái {dict(statuses)}, {summary(login_latencies)}")
+        print(f"/users/me/ khi rảnh:        {summary(idle)}")
+        print(f"/users/me/ khi bão đăng nhập: {summary(during)}")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="Số tài khoản dùng để đăng nhập")
+    parser.add_argument("--concurrency", type=int, default=32, help="Số yêu cầu đăng nhập đồng thời")
+    parser.add_argument("--duration", type=float, default=10, help="Thời gian bão đăng nhập (giây)")
+    parser.add_argument("--probe-seconds", type=float, default=3, help="Thời gian đo endpoint khi rảnh (giây)")
+    parser.add_argument("--probe-interval", type=float, default=0.02)
+    parser.add_argument("--base-url", default=None, help="Dùng ứng dụng đang chạy sẵn thay vì tự khởi động")
+    parser.add_argument("--app-port", type=int, default=8096)
+    asyncio.run(main(parser.parse_args()))
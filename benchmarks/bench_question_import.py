@@ -0,0 +1,110 @@
+"""
+Benchmark nhập/xuất ngân hàng câu hỏi hàng loạt, tính theo số câu hỏi mỗi giây.
+
+- Cách cũ: mỗi câu một request POST /api/tests/questions/ (mỗi câu một lần commit + refresh), đo trên mẫu nhỏ.
+- Nhập hàng loạt POST /api/tests/question-bank/import cho từng định dạng (CSV, NDJSON, JSON), rồi nhập lại
+  cùng file (toàn bộ là câu trùng) để đo chi phí phát hiện trùng.
+- Xuất theo luồng GET /api/tests/question-bank/export cho từng định dạng.
+Các request đi qua ASGI trong tiến trình (không qua mạng).
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.bench_question_import --questions 20000
+"""
+import io
+import os
+import csv
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+
+# Benchmark không gọi LLM; backend giả lập chỉ để ứng dụng khởi tạo được mà không cần OPENAI_API_KEY
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench-import-'), 'bench.db')}")
+
+import httpx
+from sqlmodel import Session
+
+from app.database import async_engine, create_db_and_tables, engine
+from app.migrations import run_migrations
+from app.models import User
+from app.routers.auth import create_user_access_token, get_password_hash
+
+DIFFICULTIES = ("easy", "medium", "hard")
+
+def make_questions(count: int, category: str) -> list:
+    return [
+        {
+            "question_text": f"Câu hỏi {i}: đâu là đáp án đúng?", "options": ["A", "B", "C", "D"],
+            "correct_answer": "ABCD"[i % 4], "skill_category": category, "difficulty": DIFFICULTIES[i % 3],
+        }
+        for i in range(count)
+    ]
+
+def encode(questions: list, fmt: str) -> bytes:
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["question_text", "options", "correct_answer", "skill_category", "difficulty"])
+        writer.writerows([q["question_text"], json.dumps(q["options"]), q["correct_answer"], q["skill_category"], q["difficulty"]] for q in questions)
+        return buffer.getvalue().encode("utf-8")
+    if fmt == "ndjson":
+        return "\n".join(json.dumps(q, ensure_ascii=False) for q in questions).encode("utf-8")
+    return json.dumps(questions, ensure_ascii=False).encode("utf-8")
+
+async def main(args):
+    try:
+        await run_all(args)
+    finally:
+        await async_engine.dispose() # Thread kết nối aiosqlite không phải daemon: phải đóng để tiến trình thoát được
+
+async def run_all(args):
+    engine.echo = async_engine.echo = False
+    create_db_and_tables()
+    run_migrations()
+    with Session(engine) as db:
+        user = User(email=f"bench-{time.time_ns()}@example.com", hashed_password=get_password_hash("matkhau123"))
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        headers = {"Authorization": f"Bearer {create_user_access_token(user)}"}
+
+    from app.main import app
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers, timeout=None) as client:
+        print(f"{'':<44}{'câu hỏi':>10}{'giây':>10}{'câu/giây':>12}")
+
+        def report(label: str, count: int, seconds: float):
+            print(f"{label:<44}{count:>10}{seconds:>10.2f}{count / seconds:>12.0f}")
+
+        started = time.perf_counter()
+        for question in make_questions(args.single, "bench-single"):
+            (await client.post("/api/tests/questions/", json=question)).raise_for_status()
+        report("POST /questions/ từng câu", args.single, time.perf_counter() - started)
+
+        for fmt in ("csv", "ndjson", "json"):
+            payload = encode(make_questions(args.questions, f"bench-{fmt}"), fmt)
+            for label in ("nhập", "nhập lại (toàn bộ trùng)"):
+                started = time.perf_counter()
+                response = await client.post("/api/tests/question-bank/import", files={"file": (f"questions.{fmt}", payload)})
+                response.raise_for_status()
+                result = response.json()
+                assert result["received"] == args.questions and result["invalid"] == 0, result
+                report(f"{label} {fmt}", args.questions, time.perf_counter() - started)
+
+        total = args.single + 3 * args.questions
+        for fmt in ("csv", "ndjson", "json"):
+            started = time.perf_counter()
+            size = 0
+            async with client.stream("GET", f"/api/tests/question-bank/export?format={fmt}") as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes():
+                    size += len(chunk)
+            report(f"xuất {fmt} ({size / 1e6:.1f} MB)", total, time.perf_counter() - started)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=20000, help="Số câu hỏi mỗi file nhập")
+    parser.add_argument("--single", type=int, default=300, help="Số câu tạo từng request (cách cũ)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,89 @@
+"""
+Benchmark chọn câu hỏi ngẫu nhiên cho bài kiểm tra kỹ năng trên ngân hàng câu hỏi lớn.
+
+So sánh `ORDER BY RANDOM() LIMIT k` (quét cả danh mục mỗi bài kiểm tra) với bộ chọn trong bộ nhớ
+(question_sampling: ngẫu nhiên đều và phân tầng theo độ khó, tránh các câu đã gặp), cùng thời gian
+tải ngân hàng câu hỏi một lần.
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.bench_question_sampling --questions 100000 --limit 50 --seen 500
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+
+# Benchmark không gọi LLM; backend giả lập chỉ để ứng dụng khởi tạo được mà không cần OPENAI_API_KEY
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench-sampling-'), 'bench.db')}")
+
+from sqlalchemy import func, insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import app.main # noqa: F401 - nạp toàn bộ model trước khi tạo bảng
+from app.database import async_engine, create_db_and_tables, engine
+from app.migrations import run_migrations
+from app.models import Question
+from app.services.question_bank import get_question_bank
+from app.services.question_sampling import sample_questions
+
+CATEGORY = "bench-sampling"
+DIFFICULTIES = ("easy", "medium", "hard")
+
+def seed_questions(count: int):
+    rows = [
+        {
+            "question_text": f"Câu hỏi {i}", "options": json.dumps(["A", "B", "C", "D"]), "correct_answer": "A",
+            "skill_category": CATEGORY, "difficulty": DIFFICULTIES[i % len(DIFFICULTIES)],
+        }
+        for i in range(count)
+    ]
+    with engine.begin() as conn:
+        conn.execute(insert(Question), rows)
+
+async def main(args):
+    try:
+        await run_all(args)
+    finally:
+        await async_engine.dispose() # Thread kết nối aiosqlite không phải daemon: phải đóng để tiến trình thoát được
+
+async def run_all(args):
+    engine.echo = async_engine.echo = False
+    create_db_and_tables()
+    run_migrations()
+    seed_questions(args.questions)
+
+    async with AsyncSession(async_engine) as db:
+        started = time.perf_counter()
+        for _ in range(args.tests):
+            (await db.exec(
+                select(Question).where(Question.skill_category == CATEGORY).order_by(func.random()).limit(args.limit)
+            )).all()
+        order_by_random = (time.perf_counter() - started) / args.tests
+
+        started = time.perf_counter()
+        bank = await get_question_bank(db, CATEGORY)
+        load_time = time.perf_counter() - started
+
+    seen = random.sample(list(bank.ids), min(args.seen, len(bank)))
+    print(f"Ngân hàng {len(bank)} câu, chọn {args.limit} câu, ứng viên đã gặp {len(seen)} câu")
+    print(f"{'ORDER BY RANDOM() (ms/bài)':<40}{order_by_random * 1000:>12.2f}")
+    print(f"{'Tải ngân hàng câu hỏi một lần (ms)':<40}{load_time * 1000:>12.1f}")
+    for strategy in ("random", "stratified"):
+        started = time.perf_counter()
+        for seed in range(args.tests):
+            sample_questions(bank, args.limit, strategy=strategy, seed=seed, seen_ids=seen)
+        per_test = (time.perf_counter() - started) / args.tests
+        print(f"{'sample_questions ' + strategy + ' (ms/bài)':<40}{per_test * 1000:>12.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=100000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--seen", type=int, default=500, help="Số câu ứng viên đã gặp (cần tránh)")
+    parser.add_argument("--tests", type=int, default=50, help="Số bài kiểm tra được tạo cho mỗi cách chọn")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,155 @@
+"""
+Benchmark nộp bài kiểm tra kỹ năng (submit_skill_test).
+
+So sánh cách cũ (mỗi câu trả lời một lần db.get(Question) và một lệnh INSERT riêng) với cách hiện tại
+(bảng đáp án đã cache theo danh mục, chấm trong bộ nhớ, một lệnh INSERT nhiều dòng) cho các bài kiểm tra
+từ 10 đến 1000 câu và nhiều ứng viên nộp đồng thời. Hàm xử lý được gọi trực tiếp, mỗi lần nộp một phiên DB riêng
+(như get_async_session); kết quả là độ trễ p50/p99, số bài nộp thành công/giây, số câu lệnh SQL trên mỗi bài và số lần nộp lỗi.
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.bench_skill_test --sizes 10 100 1000 --submitters 1 20 --submissions 40
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from datetime import datetime
+from typing import List
+
+# Benchmark không gọi LLM; backend giả lập chỉ để ứng dụng khởi tạo được mà không cần OPENAI_API_KEY
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench-skill-test-'), 'bench.db')}")
+
+from sqlalchemy import event
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import app.main # noqa: F401 - nạp toàn bộ model trước khi tạo bảng
+from app.database import async_engine, create_db_and_tables, engine
+from app.migrations import run_migrations
+from app.models import Candidate, Question, SkillTestResult, SkillTestResultItem
+from app.routers.tests import submit_skill_test
+from app.schemas import AnswerSubmission
+from benchmarks.load_test import percentile
+
+_statements = 0
+
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def _count_statement(*args):
+    global _statements
+    _statements += 1
+
+async def legacy_submit(test_id: int, answers: List[AnswerSubmission], db: AsyncSession):
+    """Cách nộp bài cũ: truy vấn từng câu hỏi và thêm từng dòng kết quả."""
+    test_result = await db.get(SkillTestResult, test_id)
+    score = 0
+    for submitted_answer in answers:
+        question = await db.get(Question, submitted_answer.question_id)
+        if question:
+            is_correct = (submitted_answer.selected_answer == question.correct_answer)
+            if is_correct:
+                score += 1
+            db.add(SkillTestResultItem(
+                test_result_id=test_id,
+                question_id=question.id,
+                selected_answer=submitted_answer.selected_answer,
+                is_correct=is_correct,
+            ))
+    test_result.score = score
+    test_result.end_time = datetime.utcnow()
+    db.add(test_result)
+    await db.commit()
+
+async def current_submit(test_id: int, answers: List[AnswerSubmission], db: AsyncSession):
+    await submit_skill_test(test_id, answers, db, current_user={})
+
+def setup_category(size: int) -> tuple:
+    """Tạo `size` câu hỏi trong một danh mục mới; trả về (danh mục, danh sách id câu hỏi)."""
+    category = f"bench-{size}-{time.time_ns()}"
+    with Session(engine) as db:
+        questions = [
+            Question(question_text=f"Câu {i}", options='["A", "B", "C", "D"]', correct_answer="A", skill_category=category)
+            for i in range(size)
+        ]
+        db.add_all(questions)
+        db.commit()
+        return category, [q.id for q in questions]
+
+def create_tests(candidate_id: int, category: str, size: int, count: int) -> List[int]:
+    with Session(engine) as db:
+        tests = [
+            SkillTestResult(candidate_id=candidate_id, skill_category=category, total_questions=size)
+            for _ in range(count)
+        ]
+        db.add_all(tests)
+        db.commit()
+        return [t.id for t in tests]
+
+async def run(submit, candidate_id: int, category: str, question_ids: List[int], submitters: int, submissions: int) -> dict:
+    global _statements
+    test_ids = create_tests(candidate_id, category, len(question_ids), submissions)
+    answers = [
+        AnswerSubmission(question_id=qid, selected_answer=random.choice("ABCD")) for qid in question_ids
+    ]
+    semaphore = asyncio.Semaphore(submitters)
+    latencies = []
+    errors = []
+
+    async def submit_one(test_id: int):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                async with AsyncSession(async_engine, expire_on_commit=False) as db:
+                    await submit(test_id, answers, db)
+            except Exception as e: # Ví dụ SQLite "database is locked" khi giao dịch ghi kéo dài
+                errors.append(e)
+                return
+            latencies.append(time.perf_counter() - started)
+
+    _statements = 0
+    started = time.perf_counter()
+    await asyncio.gather(*(submit_one(test_id) for test_id in test_ids))
+    elapsed = time.perf_counter() - started
+    return {
+        "p50_ms": percentile(latencies, 50) * 1000 if latencies else float("nan"),
+        "p99_ms": percentile(latencies, 99) * 1000 if latencies else float("nan"),
+        "per_second": len(latencies) / elapsed,
+        "sql": _statements / submissions,
+        "errors": len(errors),
+    }
+
+async def main(args):
+    try:
+        await run_all(args)
+    finally:
+        await async_engine.dispose() # Thread kết nối aiosqlite không phải daemon: phải đóng để tiến trình thoát được
+
+async def run_all(args):
+    engine.echo = async_engine.echo = False
+    create_db_and_tables()
+    run_migrations()
+    with Session(engine) as db:
+        candidate = Candidate(full_name="Bench", email=f"bench-{time.time_ns()}@example.com")
+        db.add(candidate)
+        db.commit()
+        candidate_id = candidate.id
+
+    print(f"{'câu hỏi':>8}{'đồng thời':>11}{'':>3}{'cách':<8}{'p50 ms':>10}{'p99 ms':>10}{'bài/s':>10}{'SQL/bài':>10}{'lỗi':>6}")
+    for size in args.sizes:
+        category, question_ids = setup_category(size)
+        for submitters in args.submitters:
+            for label, submit in (("cũ", legacy_submit), ("mới", current_submit)):
+                result = await run(submit, candidate_id, category, question_ids, submitters, args.submissions)
+                print(
+                    f"{size:>8}{submitters:>11}{'':>3}{label:<8}{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+                    f"{result['per_second']:>10.1f}{result['sql']:>10.1f}{result['errors']:>6}"
+                )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--submitters", type=int, nargs="+", default=[1, 20])
+    parser.add_argument("--submissions", type=int, default=40, help="Số bài nộp cho mỗi cấu hình")
+    asyncio.run(main(parser.parse_args()))
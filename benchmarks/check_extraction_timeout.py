@@ -0,0 +1,52 @@
+"""
+Kiểm tra timeout của pool tiến trình trích xuất văn bản (EXTRACTION_POOL=process).
+
+- File chờ tới lượt sau một file chậm không bị tính thời gian chờ: chỉ file chậm bị timeout.
+- Timeout của một file không hủy các file khác đang chờ hoặc đang xử lý.
+- Tiến trình bị treo được dừng: số tiến trình con không tăng sau nhiều lần timeout.
+Dùng hàm trích xuất giả lập (ngủ một lúc) thay cho PDF/DOCX thật.
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.check_extraction_timeout
+"""
+import os
+import time
+import asyncio
+import multiprocessing
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-check") # Chỉ để import cấu hình, không gọi OpenAI
+
+from app.config import settings
+from app.services.cv_jd_processor import _run_extraction, shutdown_extraction_pool
+
+def fake_extract(file: bytes, seconds: float) -> str:
+    time.sleep(seconds)
+    return file.decode()
+
+async def main():
+    settings.EXTRACTION_POOL = "process"
+    settings.EXTRACTION_WORKERS = 1
+    settings.EXTRACTION_TIMEOUT_SECONDS = 2
+    try:
+        await _run_extraction(fake_extract, b"warmup", 0, "warmup") # Khởi động tiến trình con trước khi đo
+
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            _run_extraction(fake_extract, b"slow", 30, "slow"),
+            _run_extraction(fake_extract, b"fast-1", 1.5, "fast-1"), # Chờ ~2s + chạy 1.5s: vượt timeout nếu tính cả thời gian chờ
+            _run_extraction(fake_extract, b"fast-2", 0.1, "fast-2"),
+        )
+        elapsed = time.perf_counter() - started
+        assert results == [None, "fast-1", "fast-2"], results
+        print(f"OK  chỉ file chậm bị timeout, các file chờ sau vẫn xong ({elapsed:.1f}s)")
+
+        for _ in range(3):
+            assert await _run_extraction(fake_extract, b"stuck", 30, "stuck") is None
+        children = len(multiprocessing.active_children())
+        assert children <= settings.EXTRACTION_WORKERS, children
+        print(f"OK  sau 3 lần timeout còn {children} tiến trình con")
+    finally:
+        shutdown_extraction_pool()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""
+Kiểm tra các cuộc gọi GPT không chặn event loop: N lần analyze_cv_jd và N lượt chat phỏng vấn chạy đồng thời
+phải xong trong khoảng thời gian của MỘT cuộc gọi, không phải N lần.
+
+Không gọi OpenAI thật: client HTTP dùng chung (llm_client) được thay bằng transport giả lập trả lời sau
+một độ trễ cố định, nên cả client OpenAI lẫn ChatOpenAI của LangChain đều đi qua nó.
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.check_llm_concurrency --calls 10 --delay 0.5
+"""
+import os
+import json
+import time
+import uuid
+import asyncio
+import argparse
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-check") # Chỉ để import cấu hình, không gọi OpenAI
+os.environ.setdefault("LLM_CACHE_ENABLED", "false") # Mỗi lần gọi đều phải tới backend giả lập
+os.environ.setdefault("LLM_MAX_CONCURRENCY", "1000") # Không để giới hạn đồng thời của gateway xếp hàng các cuộc gọi
+os.environ.setdefault("CHAT_HISTORY_BACKEND", "memory") # Lượt chat không cần DB
+os.environ.setdefault("INTERVIEW_HISTORY_STRATEGY", "full")
+
+import httpx
+
+from app.services import llm_client
+
+def completion(content: str) -> dict:
+    return {
+        "id": "chatcmpl-check", "object": "chat.completion", "created": int(time.time()), "model": "check",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+    }
+
+def delayed_transport(delay: float) -> httpx.MockTransport:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(delay)
+        content = json.dumps({"score": 80, "feedback": "Phù hợp.", "suggestions": ["Thêm số liệu."]}, ensure_ascii=False)
+        return httpx.Response(200, json=completion(content))
+    return httpx.MockTransport(handler)
+
+async def timed(label: str, calls: int, delay: float, make_call):
+    started = time.perf_counter()
+    results = await asyncio.gather(*(make_call(i) for i in range(calls)))
+    elapsed = time.perf_counter() - started
+    assert all(results), results
+    # Chạy tuần tự sẽ mất khoảng calls * delay; đồng thời thì gần bằng một cuộc gọi
+    assert elapsed < 2 * delay, f"{label}: {calls} cuộc gọi mất {elapsed:.2f}s (một cuộc gọi {delay}s)"
+    print(f"OK  {calls} lần {label} đồng thời: {elapsed:.2f}s (một cuộc gọi {delay}s, tuần tự ~{calls * delay:.1f}s)")
+
+async def main(args):
+    # Thay client HTTP dùng chung trước khi các dịch vụ (ChatOpenAI của chatbot_service) được tạo
+    llm_client._http_client = httpx.AsyncClient(transport=delayed_transport(args.delay))
+    from app.services.cv_jd_processor import analyze_cv_jd
+    from app.services.chatbot_service import chat_with_chatbot, start_interview
+
+    try:
+        await timed("analyze_cv_jd", args.calls, args.delay, lambda i: analyze_cv_jd(
+            f"CV {i}: 5 năm Python, FastAPI, PostgreSQL.", "JD: cần kỹ sư Python có kinh nghiệm FastAPI."
+        ))
+
+        session_ids = [str(uuid.uuid4()) for _ in range(args.calls)]
+        for session_id in session_ids:
+            await start_interview(session_id)
+        await timed("chat_with_chatbot", args.calls, args.delay, lambda i: chat_with_chatbot(
+            session_ids[i], f"Ứng viên {i}: tôi có 5 năm kinh nghiệm Python."
+        ))
+    finally:
+        await llm_client.close_llm_client()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=10, help="Số cuộc gọi chạy đồng thời")
+    parser.add_argument("--delay", type=float, default=0.5, help="Độ trễ của mỗi cuộc gọi giả lập (giây)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,73 @@
+"""
+Kiểm tra cầu dao của cổng LLM: một lượt thử (half-open) bị hủy không được làm cầu dao kẹt ở trạng thái mở.
+
+Hủy lượt thử ở ba chỗ: khi đang gọi OpenAI, khi đang chờ hạn mức token bucket và khi đang chờ chỗ
+trong giới hạn đồng thời; sau mỗi lần hủy, cuộc gọi tiếp theo phải được cho qua và đóng cầu dao.
+Không gọi OpenAI thật (hàm gọi là coroutine giả lập).
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.check_llm_gateway
+"""
+import os
+import time
+import asyncio
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-check") # Chỉ để import cấu hình, không gọi OpenAI
+
+from app.services.llm_gateway import LLMGateway, TokenBucket
+
+def open_for_probe(gateway: LLMGateway):
+    """Đưa cầu dao về trạng thái mở đã hết thời gian chờ: cuộc gọi kế tiếp là lượt thử half-open."""
+    gateway.breaker.state = "open"
+    gateway.breaker.opened_at = time.monotonic() - gateway.breaker.cooldown - 1
+
+async def ok():
+    return "ok"
+
+async def slow():
+    await asyncio.sleep(60)
+
+async def cancel_probe(gateway: LLMGateway, func):
+    task = asyncio.create_task(gateway.call(func))
+    await asyncio.sleep(0.05)
+    assert gateway.breaker.state == "half_open", gateway.breaker.state
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+async def check(label: str, prepare, restore):
+    gateway = LLMGateway()
+    open_for_probe(gateway)
+    prepare(gateway)
+    await cancel_probe(gateway, slow)
+    restore(gateway)
+    result = await asyncio.wait_for(gateway.call(ok), timeout=5) # Trước khi sửa: CircuitOpenError mãi mãi
+    assert result == "ok" and gateway.breaker.state == "closed", (result, gateway.breaker.state)
+    assert gateway.concurrency.in_flight == 0, gateway.concurrency.in_flight
+    print(f"OK  hủy lượt thử {label}")
+
+def nothing(gateway: LLMGateway):
+    pass
+
+def empty_bucket(gateway: LLMGateway):
+    gateway.request_bucket = TokenBucket(rate=0.01, capacity=1)
+    gateway.request_bucket._tokens = 0
+
+def refill_bucket(gateway: LLMGateway):
+    gateway.request_bucket = TokenBucket(rate=100, capacity=100)
+
+def fill_concurrency(gateway: LLMGateway):
+    gateway.concurrency.in_flight = int(gateway.concurrency.limit)
+
+def free_concurrency(gateway: LLMGateway):
+    gateway.concurrency.in_flight = 0
+
+async def main():
+    await check("khi đang gọi OpenAI", nothing, nothing)
+    await check("khi đang chờ token bucket", empty_bucket, refill_bucket)
+    await check("khi đang chờ giới hạn đồng thời", fill_concurrency, free_concurrency)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,233 @@
+"""
+Kiểm thử tải các luồng tuyển dụng chính với backend LLM giả lập (không gọi OpenAI).
+
+Mỗi người dùng ảo chạy lần lượt: đăng ký -> lấy token -> tải CV/JD -> bắt đầu phỏng vấn -> chat
+-> đánh giá câu trả lời -> bắt đầu và nộp bài kiểm tra kỹ năng. Kết quả là độ trễ p50/p95/p99,
+số lỗi và thông lượng theo từng endpoint.
+
+Mặc định script tự khởi động máy chủ LLM giả lập và ứng dụng (uvicorn, cơ sở dữ liệu SQLite tạm):
+    python -m benchmarks.load_test --users 50 --concurrency 10
+Chạy với ứng dụng đang chạy sẵn (đã đặt LLM_BACKEND=fake):
+    python -m benchmarks.load_test --base-url http://127.0.0.1:8000 --users 50 --concurrency 10
+"""
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+from docx import Document
+
+SKILL_CATEGORY = "loadtest"
+JD_TEXTS = [
+    "Tuyển Backend Engineer: Python, FastAPI, PostgreSQL, Docker. Tối thiểu 2 năm kinh nghiệm.",
+    "Tuyển Frontend Engineer: React, TypeScript, CSS, kiểm thử tự động. Ưu tiên biết Next.js.",
+    "Tuyển Data Engineer: SQL, Spark, Airflow, AWS. Có kinh nghiệm xây dựng pipeline dữ liệu.",
+]
+SKILLS = ["Python", "FastAPI", "React", "SQL", "Docker", "AWS", "Spark", "Kubernetes", "Git", "Redis"]
+
+def make_docx(text: str) -> bytes:
+    document = Document()
+    for line in text.split("\n"):
+        document.add_paragraph(line)
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+class LoadTest:
+    def __init__(self, base_url: str, chat_turns: int, seed: int):
+        self.base_url = base_url.rstrip("/")
+        self.chat_turns = chat_turns
+        self.rng = random.Random(seed)
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.jd_files = [make_docx(text) for text in JD_TEXTS]
+
+    async def request(self, client: httpx.AsyncClient, name: str, method: str, path: str, **kwargs) -> Optional[httpx.Response]:
+        """Gửi một request và ghi lại độ trễ theo tên endpoint; trả về None nếu lỗi."""
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, self.base_url + path, **kwargs)
+        except httpx.HTTPError:
+            self.errors[name] += 1
+            return None
+        self.latencies[name].append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            self.errors[name] += 1
+            return None
+        return response
+
+    async def login(self, client: httpx.AsyncClient, email: str, password: str) -> Optional[dict]:
+        await self.request(client, "register", "POST", "/api/auth/register", json={"email": email, "password": password})
+        response = await self.request(client, "token", "POST", "/api/auth/token", data={"username": email, "password": password})
+        return {"Authorization": f"Bearer {response.json()['access_token']}"} if response else None
+
+    async def seed_questions(self, client: httpx.AsyncClient, count: int = 10):
+        headers = await self.login(client, f"loadtest-admin-{uuid.uuid4().hex[:8]}@example.com", "matkhau123")
+        for i in range(count):
+            await client.post(self.base_url + "/api/tests/questions/", headers=headers, json={
+                "question_text": f"Câu hỏi kiểm thử tải số {i}?",
+                "options": ["A", "B", "C", "D"],
+                "correct_answer": "A",
+                "skill_category": SKILL_CATEGORY,
+            })
+
+    async def user_flow(self, client: httpx.AsyncClient, index: int):
+        email = f"loadtest-{index}-{uuid.uuid4().hex[:8]}@example.com"
+        headers = await self.login(client, email, "matkhau123")
+        if headers is None:
+            return
+
+        skills = ", ".join(self.rng.sample(SKILLS, 4))
+        cv_file = make_docx(f"Ứng viên {index}\n{email}\nKinh nghiệm {index % 6} năm với {skills}.")
+        response = await self.request(
+            client, "upload-cv-jd", "POST", "/api/candidates/upload-cv-jd", headers=headers,
+            data={"full_name": f"Ứng viên {index}", "email": email, "applied_position": "Software Engineer"},
+            files={
+                "cv_file": ("cv.docx", cv_file, "application/octet-stream"),
+                "jd_file": ("jd.docx", self.jd_files[index % len(self.jd_files)], "application/octet-stream"),
+            },
+        )
+        if response is None:
+            return
+        candidate_id = response.json()["candidate_id"]
+
+        response = await self.request(client, "interview-start", "POST", f"/api/interview/start/{candidate_id}", headers=headers)
+        if response is not None:
+            session_id = response.json()["session_id"]
+            question = response.json()["response"]
+            for turn in range(self.chat_turns):
+                answer = f"Tôi đã làm việc với {skills} trong dự án thứ {turn + 1}."
+                response = await self.request(
+                    client, "interview-chat", "POST", f"/api/interview/chat/{session_id}",
+                    headers=headers, json={"message": answer},
+                )
+                if response is None:
+                    break
+                question = response.json()["response"]
+            await self.request(client, "interview-evaluate", "POST", "/api/interview/evaluate", headers=headers, json={
+                "question": question, "candidate_answer": f"Tôi có kinh nghiệm với {skills}.", "candidate_id": candidate_id,
+            })
+
+        response = await self.request(
+            client, "test-start", "POST", f"/api/tests/start/{candidate_id}/{SKILL_CATEGORY}", headers=headers,
+        )
+        if response is not None:
+            body = response.json()
+            answers = [{"question_id": q["id"], "selected_answer": self.rng.choice(q["options"])} for q in body["questions"]]
+            await self.request(client, "test-submit", "POST", f"/api/tests/submit/{body['test_id']}", headers=headers, json=answers)
+
+    async def run(self, users: int, concurrency: int) -> float:
+        limits = httpx.Limits(max_connections=concurrency * 2)
+        async with httpx.AsyncClient(timeout=300, limits=limits) as client:
+            await self.seed_questions(client)
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def bounded(index: int):
+                async with semaphore:
+                    await self.user_flow(client, index)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(bounded(i) for i in range(users)))
+            return time.perf_counter() - started
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for name, values in self.latencies.items():
+            endpoints[name] = {
+                "requests": len(values),
+                "errors": self.errors[name],
+                "p50_ms": round(percentile(values, 50) * 1000, 1),
+                "p95_ms": round(percentile(values, 95) * 1000, 1),
+                "p99_ms": round(percentile(values, 99) * 1000, 1),
+                "throughput_rps": round(len(values) / elapsed, 2),
+            }
+        return {"elapsed_seconds": round(elapsed, 2), "endpoints": endpoints}
+
+def print_report(report: dict):
+    print(f"\nThời gian chạy: {report['elapsed_seconds']}s")
+    print(f"{'endpoint':<20}{'requests':>9}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}")
+    for name, row in report["endpoints"].items():
+        print(f"{name:<20}{row['requests']:>9}{row['errors']:>8}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}{row['throughput_rps']:>9}")
+
+async def wait_until_ready(url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.3)
+    raise RuntimeError(f"Không kết nối được tới {url}")
+
+def start_servers(args) -> List[subprocess.Popen]:
+    """Khởi động máy chủ LLM giả lập và ứng dụng (cơ sở dữ liệu SQLite tạm) dưới dạng tiến trình con."""
+    db_path = os.path.join(tempfile.mkdtemp(prefix="loadtest-"), "loadtest.db")
+    env = dict(
+        os.environ,
+        LLM_BACKEND="fake",
+        FAKE_LLM_PORT=str(args.fake_llm_port),
+        FAKE_LLM_LATENCY_MS=str(args.llm_latency_ms),
+        FAKE_LLM_LATENCY_SIGMA=str(args.llm_latency_sigma),
+        FAKE_LLM_ERROR_RATE=str(args.llm_error_rate),
+        FAKE_LLM_SEED=str(args.seed),
+        DATABASE_URL=f"sqlite:///{db_path}",
+        LLM_CACHE_PERSIST="false",
+    )
+    fake_llm = subprocess.Popen([sys.executable, "-m", "app.services.fake_llm"], env=env)
+    app = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.app_port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL,
+    )
+    return [fake_llm, app]
+
+async def main(args):
+    processes = []
+    base_url = args.base_url
+    if base_url is None:
+        processes = start_servers(args)
+        base_url = f"http://127.0.0.1:{args.app_port}"
+        await wait_until_ready(f"http://127.0.0.1:{args.fake_llm_port}/stats")
+        await wait_until_ready(base_url + "/docs")
+    try:
+        load_test = LoadTest(base_url, args.chat_turns, args.seed)
+        elapsed = await load_test.run(args.users, args.concurrency)
+        report = load_test.report(elapsed)
+        print_report(report)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="Tổng số người dùng ảo")
+    parser.add_argument("--concurrency", type=int, default=5, help="Số người dùng ảo chạy đồng thời")
+    parser.add_argument("--chat-turns", type=int, default=3, help="Số lượt chat trong mỗi buổi phỏng vấn")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--base-url", default=None, help="Dùng ứng dụng đang chạy sẵn thay vì tự khởi động")
+    parser.add_argument("--app-port", type=int, default=8098)
+    parser.add_argument("--fake-llm-port", type=int, default=8099)
+    parser.add_argument("--llm-latency-ms", type=float, default=800)
+    parser.add_argument("--llm-latency-sigma", type=float, default=0.5)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--output", default=None, help="Ghi kết quả ra file JSON")
+    asyncio.run(main(parser.parse_args()))